@@ -1,24 +1,237 @@
+import os
+import tempfile
+import zipfile
+
+from django import forms
+from django.conf import settings
 from django.contrib import admin
+from django.contrib.admin import helpers
+from django.contrib.admin.views.main import ChangeList, ORDER_VAR
+from django.core.exceptions import PermissionDenied
+from django.db import models
+from django.db.models.functions import Substr
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404, redirect
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
+from blog.bulk_actions import ACTIONS, create_import_job, create_job
 from blog.forms import BlogAdminForm
-from blog.models import Blog, Comment
+from blog.models import Blog, BlogAttachment, BulkActionJob, Comment, MediaBlob
+from blog.pagination import EstimatedCountPaginator
+from blog.uploads import LimitedFileField
+
+CURSOR_VAR = 'after'
+PREVIEW_LENGTH = 80
+
+
+class KeysetChangeList(ChangeList):
+    """
+        Список объектов админки с пагинацией по ключу.
+
+        При сортировке по умолчанию страницы строятся условием pk < курсор вместо OFFSET,
+        при явной сортировке по колонке используется обычная постраничная навигация.
+    """
+
+    def __init__(self, request, *args, **kwargs):
+        self.cursor = request.GET.get(CURSOR_VAR)
+        self.keyset = ORDER_VAR not in request.GET
+        self.next_cursor_url = None
+        super().__init__(request, *args, **kwargs)
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(CURSOR_VAR, None)
+        return lookup_params
+
+    def get_query_string(self, new_params=None, remove=None):
+        # Курсор относится только к текущей выборке: смена фильтра или поиска начинает список заново
+        return super().get_query_string(new_params, [*(remove or []), CURSOR_VAR])
+
+    def get_ordering(self, request, queryset):
+        if self.keyset:
+            return ['-pk']
+        return super().get_ordering(request, queryset)
+
+    def get_queryset(self, request):
+        queryset = self.filtered_queryset = super().get_queryset(request)
+        if self.keyset and self.cursor:
+            try:
+                queryset = queryset.filter(pk__lt=int(self.cursor))
+            except ValueError:
+                pass
+        return queryset
+
+    def get_results(self, request):
+        if not self.keyset:
+            return super().get_results(request)
+
+        self.paginator = self.model_admin.get_paginator(request, self.filtered_queryset, self.list_per_page)
+        self.result_count = self.paginator.count
+        self.full_result_count = None
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.can_show_all = False
+        self.multi_page = False
+
+        # Срез остается QuerySet, чтобы с ним работали list_editable и действия админки
+        self.result_list = self.queryset[:self.list_per_page]
+        rows = list(self.result_list)
+        if len(rows) == self.list_per_page and self.queryset.filter(pk__lt=rows[-1].pk).exists():
+            self.next_cursor_url = self.get_query_string({CURSOR_VAR: rows[-1].pk})
+
+
+class BulkPriceForm(forms.Form):
+    """
+        Форма ввода новой стоимости для пакетного действия.
+    """
+    price = forms.IntegerField(min_value=0, label='Новая стоимость')
+
+
+class BlogImportForm(forms.Form):
+    """
+        Форма загрузки архива для импорта записей блога.
+    """
+    archive = LimitedFileField(label='Архив ZIP', help_text='manifest.jsonl и изображения, на которые он ссылается')
+
+    def clean_archive(self):
+        archive = self.cleaned_data['archive']
+        if not zipfile.is_zipfile(archive):
+            raise forms.ValidationError('Загрузите ZIP-архив')
+        archive.seek(0)
+        return archive
+
+
+class BlogAttachmentInline(admin.TabularInline):
+    """
+        Вложения записи блога на странице редактирования записи.
+    """
+    model = BlogAttachment
+    fields = ('title', 'file', 'is_free', 'size', 'content_type',)
+    readonly_fields = ('size', 'content_type',)
+    formfield_overrides = {models.FileField: {'form_class': LimitedFileField}}
+    extra = 0
+
+
+class PerformanceAdminMixin:
+    """
+        Миксин для админки больших таблиц.
+
+        Подключает пагинацию по ключу, оценку количества строк вместо COUNT(*)
+        и отключает подсчет полного количества записей.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
 
 
 @admin.register(Blog)
-class BlogAdmin(admin.ModelAdmin):
+class BlogAdmin(PerformanceAdminMixin, admin.ModelAdmin):
     """
         Административное представление для модели Blog.
 
         Определены следующие атрибуты:
             - list_display: Поля, отображаемые в списке записей модели.
+            - list_select_related: Связи, загружаемые одним запросом со списком.
+            - search_fields: Поля для поиска по префиксу, покрытые индексами.
+            - autocomplete_fields: Внешние ключи, выбираемые через автодополнение.
             - prepopulated_fields: Поля, автоматически заполняемые при создании записи.
             - form: Форма, используемая для администрирования записей.
 
-        Определено действие republish для пакетного обновления поля published_on.
+        Пакетные действия (публикация, снятие с публикации, изменение стоимости, удаление)
+        и импорт записей из архива выполняются в фоне через BulkActionJob.
     """
-    list_display = ('id', 'title', 'slug', 'description', 'image', 'published_on', 'user', 'price',)
+    list_display = ('id', 'title', 'slug', 'description_preview', 'image', 'published_on', 'user', 'price',)
+    list_select_related = ('user',)
+    search_fields = ('title__startswith', 'slug__startswith',)
+    autocomplete_fields = ('user',)
     prepopulated_fields = {"slug": ("title",)}
     form = BlogAdminForm
+    inlines = (BlogAttachmentInline,)
+    actions = ['republish', 'unpublish', 'change_price', 'delete_in_background']
 
+    def get_queryset(self, request):
+        """
+            Загружает в список только начало описания вместо полного текста.
+        """
+        queryset = super().get_queryset(request)
+        if request.resolver_match and request.resolver_match.url_name.endswith('_changelist'):
+            queryset = queryset.defer('description').annotate(
+                description_start=Substr('description', 1, PREVIEW_LENGTH))
+        return queryset
+
+    @admin.display(description='Описание контента')
+    def description_preview(self, obj):
+        return obj.description_start
+
+    def get_urls(self):
+        urls = [
+            path('bulk-jobs/<int:pk>/', self.admin_site.admin_view(self.bulk_job_status_view),
+                 name='blog_bulkactionjob_status'),
+            path('import/', self.admin_site.admin_view(self.import_view), name='blog_blog_import'),
+        ]
+        return urls + super().get_urls()
+
+    def start_bulk_action(self, request, queryset, action, params=None):
+        """
+            Ставит пакетное действие в очередь и перенаправляет на страницу прогресса.
+
+            Args:
+                request (HttpRequest): Запрос от администратора.
+                queryset (QuerySet): Выборка записей.
+                action (str): Имя зарегистрированного действия.
+                params (dict, optional): Параметры действия.
+
+            Returns:
+                HttpResponseRedirect: Перенаправление на страницу статуса операции.
+        """
+        job = create_job(action, queryset, user=request.user, params=params)
+        self.message_user(request, f"Операция «{ACTIONS[action][0]}» поставлена в очередь: {job.total} записей")
+        return redirect(reverse('admin:blog_bulkactionjob_status', args=[job.pk]))
+
+    def bulk_job_status_view(self, request, pk):
+        """
+            Страница прогресса пакетной операции. С параметром format=json возвращает прогресс в JSON.
+        """
+        job = get_object_or_404(BulkActionJob, pk=pk)
+        if request.GET.get('format') == 'json':
+            return JsonResponse({'status': job.status, 'processed': job.processed, 'total': job.total,
+                                 'progress': job.progress, 'error': job.error})
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': f'Пакетная операция «{ACTIONS[job.action][0]}»',
+            'job': job,
+            'finished': job.status in (BulkActionJob.STATUS_DONE, BulkActionJob.STATUS_FAILED),
+        }
+        return TemplateResponse(request, 'admin/blog/bulk_job_status.html', context)
+
+    def import_view(self, request):
+        """
+            Загрузка архива для импорта записей. Архив сохраняется на диск по частям,
+            импорт выполняется в фоне, а администратор перенаправляется на страницу прогресса.
+        """
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+        form = BlogImportForm(request.POST or None, request.FILES or None)
+        if form.is_valid():
+            fd, archive_path = tempfile.mkstemp(suffix='.zip', dir=settings.BLOG_IMPORT_DIR)
+            with os.fdopen(fd, 'wb') as destination:
+                for chunk in form.cleaned_data['archive'].chunks():
+                    destination.write(chunk)
+            job = create_import_job(archive_path, user=request.user)
+            self.message_user(request, f"Импорт поставлен в очередь: {job.total} строк")
+            return redirect(reverse('admin:blog_bulkactionjob_status', args=[job.pk]))
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Импорт записей',
+            'form': form,
+        }
+        return TemplateResponse(request, 'admin/blog/import_form.html', context)
+
+    @admin.action(description="Повторная публикация выбранных записей", permissions=["change"])
     def republish(self, request, queryset):
         """
             Действие повторной публикации выбранных записей.
@@ -28,19 +241,87 @@ class BlogAdmin(admin.ModelAdmin):
                 queryset (QuerySet): Выборка записей для публикации.
 
             Returns:
-                None
+                HttpResponseRedirect: Перенаправление на страницу статуса операции.
         """
-        queryset.update(published_on=True)
-        self.message_user(request, "Выбранные записи были переизданы")
+        return self.start_bulk_action(request, queryset, 'republish')
 
-    republish.short_description = "Повторная публикация выбранных записей"
-    actions = [republish]
+    @admin.action(description="Снять выбранные записи с публикации", permissions=["change"])
+    def unpublish(self, request, queryset):
+        return self.start_bulk_action(request, queryset, 'unpublish')
+
+    @admin.action(description="Удалить выбранные записи в фоне", permissions=["delete"])
+    def delete_in_background(self, request, queryset):
+        return self.start_bulk_action(request, queryset, 'delete')
+
+    @admin.action(description="Изменить стоимость выбранных записей", permissions=["change"])
+    def change_price(self, request, queryset):
+        """
+            Действие изменения стоимости. Сначала показывает форму ввода новой стоимости.
+        """
+        form = BulkPriceForm(request.POST if 'apply' in request.POST else None)
+        if form.is_valid():
+            return self.start_bulk_action(request, queryset, 'set_price', {'price': form.cleaned_data['price']})
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Изменение стоимости',
+            'form': form,
+            'queryset': queryset,
+            'selected': request.POST.getlist(helpers.ACTION_CHECKBOX_NAME),
+            'select_across': request.POST.get('select_across', '0'),
+        }
+        return TemplateResponse(request, 'admin/blog/bulk_price_form.html', context)
+
+
+@admin.register(BulkActionJob)
+class BulkActionJobAdmin(admin.ModelAdmin):
+    """
+        Административное представление истории пакетных операций.
+    """
+    list_display = ('id', 'action', 'status', 'processed', 'total', 'user', 'created_at', 'finished_at',)
+    list_select_related = ('user',)
+    list_filter = ('status', 'action',)
+    exclude = ('object_ids',)
+    readonly_fields = ('action', 'params', 'chunk_size', 'total', 'processed', 'status', 'error', 'user',
+                       'created_at', 'finished_at', 'heartbeat_at',)
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(MediaBlob)
+class MediaBlobAdmin(admin.ModelAdmin):
+    """
+        Административное представление файлов хранилища и счетчиков ссылок на них.
+    """
+    list_display = ('name', 'size', 'ref_count', 'updated_at',)
+    list_filter = ('ref_count',)
+    search_fields = ('name__startswith',)
+    readonly_fields = ('name', 'size', 'ref_count', 'updated_at',)
+
+    def has_add_permission(self, request):
+        return False
 
 
 @admin.register(Comment)
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(PerformanceAdminMixin, admin.ModelAdmin):
     """
         Административное представление для модели Comment.
         Определено поле list_display для отображения в списке записей модели.
     """
-    list_display = ('id', 'comment', 'user',)
+    list_display = ('id', 'comment_preview', 'user',)
+    list_select_related = ('user',)
+    autocomplete_fields = ('user',)
+
+    def get_queryset(self, request):
+        """
+            Загружает в список только начало текста комментария.
+        """
+        queryset = super().get_queryset(request)
+        if request.resolver_match and request.resolver_match.url_name.endswith('_changelist'):
+            queryset = queryset.defer('comment').annotate(comment_start=Substr('comment', 1, PREVIEW_LENGTH))
+        return queryset
+
+    @admin.display(description='Коммент')
+    def comment_preview(self, obj):
+        return obj.comment_start
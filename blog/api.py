@@ -0,0 +1,158 @@
+from functools import wraps
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+from django.db.models.functions import Substr
+from django.http import JsonResponse, Http404
+from django.views.decorators.http import require_GET
+from blog.models import Blog, Comment
+from blog.pagination import keyset_page
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+MAX_SLUGS = 100
+
+# Поля ответа и выражения, которыми они выбираются (None - одноименное поле модели).
+# Сериализуются словари из values(), экземпляры моделей не создаются
+BLOG_LIST_FIELDS = {
+    'id': None,
+    'slug': None,
+    'title': None,
+    'excerpt': Substr('description', 1, 100),
+    'image': None,
+    'views': None,
+    'price': None,
+    'is_paid': None,
+    'created_date': None,
+    'author': F('user_id'),
+}
+BLOG_DETAIL_FIELDS = {**BLOG_LIST_FIELDS, 'description': None}
+COMMENT_FIELDS = {
+    'id': None,
+    'comment': None,
+    'created_date': None,
+    'author': F('user__username'),
+}
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def api_view(view_func):
+    """
+        Декоратор JSON-представлений API: только GET, только для вошедших пользователей,
+        ошибки ApiError отдаются в виде {"error": ...}.
+    """
+    @require_GET
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({'error': 'Требуется вход'}, status=401)
+        try:
+            return view_func(request, *args, **kwargs)
+        except ApiError as e:
+            return JsonResponse({'error': str(e)}, status=e.status)
+        except Http404:
+            return JsonResponse({'error': 'Не найдено'}, status=404)
+    return wrapper
+
+
+def select_fields(request, available):
+    """
+        Возвращает выражения для запрошенных полей (?fields=id,title). Поле id выбирается всегда:
+        по нему строится курсор.
+    """
+    requested = request.GET.get('fields')
+    if not requested:
+        return available
+    names = [name.strip() for name in requested.split(',') if name.strip()]
+    unknown = set(names) - set(available)
+    if unknown:
+        raise ApiError(f"Неизвестные поля: {', '.join(sorted(unknown))}")
+    return {name: available[name] for name in ['id', *names]}
+
+
+def page_params(request):
+    try:
+        per_page = min(int(request.GET.get('limit', PAGE_SIZE)), MAX_PAGE_SIZE)
+        after = request.GET.get('after')
+        return max(per_page, 1), int(after) if after else None
+    except ValueError:
+        raise ApiError('Параметры limit и after должны быть числами')
+
+
+def project(queryset, fields):
+    """
+        Выбирает только нужные поля: одноименные поля модели позиционно, вычисляемые - выражениями.
+    """
+    names = [name for name, expression in fields.items() if expression is None]
+    expressions = {name: expression for name, expression in fields.items() if expression is not None}
+    return queryset.values(*names, **expressions)
+
+
+def media_urls(rows, field='image'):
+    for row in rows:
+        if row.get(field):
+            row[field] = settings.MEDIA_URL + row[field]
+        elif field in row:
+            row[field] = None
+    return rows
+
+
+def paginated_response(request, queryset, fields):
+    """
+        Отдает страницу выборки с курсором следующей страницы (пагинация по ключу, как в админке).
+    """
+    per_page, after = page_params(request)
+    rows, next_after = keyset_page(project(queryset, fields), after=after, per_page=per_page, field='id')
+    next_url = None
+    if next_after is not None:
+        query = request.GET.copy()
+        query['after'] = next_after
+        next_url = f'{request.path}?{query.urlencode()}'
+    return JsonResponse({'results': media_urls(rows), 'next': next_url}, encoder=DjangoJSONEncoder)
+
+
+@api_view
+def blog_list(request):
+    """
+        Список опубликованных блогов.
+
+        Параметры: fields - выбираемые поля, slugs - выборка нескольких блогов по слагам,
+        limit - размер страницы, after - курсор.
+    """
+    queryset = Blog.objects.filter(published_on=True)
+    slugs = request.GET.get('slugs')
+    if slugs:
+        slugs = [slug for slug in slugs.split(',') if slug]
+        if len(slugs) > MAX_SLUGS:
+            raise ApiError(f'Можно запросить не более {MAX_SLUGS} блогов')
+        queryset = queryset.filter(slug__in=slugs)
+    return paginated_response(request, queryset, select_fields(request, BLOG_LIST_FIELDS))
+
+
+@api_view
+def blog_detail(request, slug):
+    """
+        Блог по слагу с полным описанием.
+    """
+    fields = select_fields(request, BLOG_DETAIL_FIELDS)
+    row = project(Blog.objects.filter(slug=slug), fields).first()
+    if row is None:
+        raise Http404
+    return JsonResponse(media_urls([row])[0], encoder=DjangoJSONEncoder)
+
+
+@api_view
+def comment_list(request, slug):
+    """
+        Комментарии блога, от новых к старым.
+    """
+    blog_id = Blog.objects.filter(slug=slug).values_list('pk', flat=True).first()
+    if blog_id is None:
+        raise Http404
+    queryset = Comment.objects.filter(blog=blog_id)
+    return paginated_response(request, queryset, select_fields(request, COMMENT_FIELDS))
@@ -5,3 +5,10 @@ class BlogConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'blog'
     #verbose_name = 'блог'
+
+    def ready(self):
+        import blog.signals  # noqa: F401
+        from blog.models import Blog, BlogAttachment
+        from blog.storage import track_references
+        track_references(Blog, 'image')
+        track_references(BlogAttachment, 'file')
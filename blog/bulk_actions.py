@@ -0,0 +1,291 @@
+import logging
+import os
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F, Q
+from django.db.models.signals import post_save, pre_save
+from django.utils import timezone
+
+from blog.importer import count_manifest_lines, import_archive
+from blog.models import Blog, BulkActionJob
+
+logger = logging.getLogger(__name__)
+
+ACTIONS = {}
+RUNNERS = {}
+
+
+def bulk_action(name, label):
+    """
+        Регистрирует пакетное действие над записями блога.
+
+        Функция действия получает выборку одной пачки и параметры операции
+        и выполняется внутри транзакции этой пачки.
+    """
+    def decorator(func):
+        ACTIONS[name] = (label, func)
+        return func
+    return decorator
+
+
+def job_runner(name, label):
+    """
+        Регистрирует операцию, которая выполняется целиком своей функцией, а не по пачкам выбранных записей.
+        Функция получает объект операции и сама сохраняет прогресс в поле processed.
+    """
+    def decorator(func):
+        ACTIONS[name] = (label, None)
+        RUNNERS[name] = func
+        return func
+    return decorator
+
+
+def update_with_signals(queryset, **values):
+    """
+        Обновляет записи пачки одним запросом и отправляет те же сигналы, что и Blog.save(),
+        чтобы срабатывали обработчики сброса кэша и другие подписчики.
+    """
+    fields = frozenset(values)
+    objects = list(queryset)
+    for obj in objects:
+        for field, value in values.items():
+            setattr(obj, field, value)
+        pre_save.send(sender=Blog, instance=obj, raw=False, using=queryset.db, update_fields=fields)
+    Blog.objects.bulk_update(objects, list(fields))
+    for obj in objects:
+        post_save.send(sender=Blog, instance=obj, created=False, raw=False, using=queryset.db, update_fields=fields)
+
+
+@bulk_action('republish', 'Опубликовать')
+def republish(queryset, params):
+    update_with_signals(queryset, published_on=True)
+
+
+@bulk_action('unpublish', 'Снять с публикации')
+def unpublish(queryset, params):
+    update_with_signals(queryset, published_on=False)
+
+
+@bulk_action('set_price', 'Изменить стоимость')
+def set_price(queryset, params):
+    update_with_signals(queryset, price=params['price'])
+
+
+@bulk_action('delete', 'Удалить')
+def delete(queryset, params):
+    # QuerySet.delete() отправляет pre_delete/post_delete для каждого объекта
+    queryset.delete()
+
+
+@job_runner('import', 'Импорт записей')
+def import_blogs(job):
+    """
+        Импортирует записи из архива, сохраненного при постановке операции в очередь.
+        При возобновлении уже импортированные строки манифеста пропускаются.
+    """
+    def progress(processed):
+        BulkActionJob.objects.filter(pk=job.pk).update(processed=processed)
+
+    report = import_archive(job.params['archive'], user=job.user, batch_size=job.chunk_size,
+                            progress=progress, skip=job.processed)
+    job.params.update(created=job.params.get('created', 0) + report.created,
+                      failed=job.params.get('failed', 0) + report.failed,
+                      errors=job.params.get('errors', []) + report.errors)
+    BulkActionJob.objects.filter(pk=job.pk).update(params=job.params)
+    os.remove(job.params['archive'])
+
+
+def create_import_job(archive_path, user=None):
+    """
+        Ставит в очередь импорт записей из архива.
+
+        Args:
+            archive_path (str): Путь к архиву на диске; после успешного импорта файл удаляется.
+            user (User, optional): Автор импортируемых записей.
+
+        Returns:
+            BulkActionJob: Созданная операция.
+    """
+    job = BulkActionJob.objects.create(
+        action='import',
+        params={'archive': archive_path},
+        total=count_manifest_lines(archive_path),
+        chunk_size=getattr(settings, 'BLOG_IMPORT_BATCH_SIZE', 1000),
+        user=user,
+    )
+    start_job(job)
+    return job
+
+
+def create_job(action, queryset, user=None, params=None):
+    """
+        Создает пакетную операцию над выборкой и ставит ее в очередь.
+
+        Returns:
+            BulkActionJob: Созданная операция.
+    """
+    object_ids = list(queryset.order_by('pk').values_list('pk', flat=True))
+    job = BulkActionJob.objects.create(
+        action=action,
+        params=params or {},
+        object_ids=object_ids,
+        total=len(object_ids),
+        chunk_size=getattr(settings, 'BULK_ACTION_CHUNK_SIZE', 500),
+        user=user,
+    )
+    start_job(job)
+    return job
+
+
+def start_job(job):
+    """
+        Запускает операцию после фиксации транзакции запроса.
+        При BULK_ACTIONS_INLINE операция выполняется синхронно (тесты, отладка).
+    """
+    transaction.on_commit(lambda: dispatch_job(job.pk))
+
+
+def dispatch_job(job_id):
+    if getattr(settings, 'BULK_ACTIONS_INLINE', False):
+        run_job(job_id)
+    else:
+        threading.Thread(target=_run_in_thread, args=(job_id,), daemon=True).start()
+
+
+def _run_in_thread(job_id):
+    try:
+        run_with_heartbeat(job_id)
+    finally:
+        close_old_connections()
+
+
+def run_with_heartbeat(job_id):
+    """
+        Выполняет операцию, отмечая в heartbeat_at, что ее исполнитель жив.
+
+        Returns:
+            BulkActionJob: Операция после выполнения.
+    """
+    stop = threading.Event()
+    heartbeat = threading.Thread(target=_heartbeat, args=(job_id, stop), name='bulk-job-heartbeat', daemon=True)
+    heartbeat.start()
+    try:
+        return run_job(job_id)
+    finally:
+        stop.set()
+        heartbeat.join()
+
+
+def _heartbeat(job_id, stop):
+    """
+        Отмечает в базе, что исполнитель операции жив, пока операция выполняется.
+    """
+    interval = getattr(settings, 'BULK_ACTION_HEARTBEAT_INTERVAL', 30)
+    try:
+        while not stop.wait(interval):
+            BulkActionJob.objects.filter(pk=job_id, status=BulkActionJob.STATUS_RUNNING).update(
+                heartbeat_at=timezone.now())
+    finally:
+        close_old_connections()
+
+
+def claim_stale_jobs(statuses=(BulkActionJob.STATUS_PENDING, BulkActionJob.STATUS_RUNNING)):
+    """
+        Захватывает операции, исполнитель которых пропал: воркер перезапущен (например, сторожем памяти)
+        или завершился до запуска операции после фиксации транзакции.
+
+        Ожидающая операция считается зависшей, если создана раньше BULK_ACTION_STALE_AFTER, выполняющаяся -
+        если heartbeat_at не обновлялся столько же; операция с ошибкой исполнителя не имеет.
+        Операция захватывается условным UPDATE отметки heartbeat_at, поэтому при одновременной проверке
+        в нескольких процессах (воркеры, команда run_bulk_actions) ее получит только один.
+
+        Args:
+            statuses (iterable): Статусы проверяемых операций.
+
+        Yields:
+            int: Идентификаторы захваченных операций, по одной: следующая захватывается, когда вызывающий
+            код запросит ее.
+    """
+    cutoff = timezone.now() - timedelta(seconds=getattr(settings, 'BULK_ACTION_STALE_AFTER', 120))
+    conditions = {
+        BulkActionJob.STATUS_PENDING: Q(status=BulkActionJob.STATUS_PENDING, created_at__lt=cutoff),
+        BulkActionJob.STATUS_RUNNING: Q(status=BulkActionJob.STATUS_RUNNING) & (
+            Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True)),
+        BulkActionJob.STATUS_FAILED: Q(status=BulkActionJob.STATUS_FAILED),
+    }
+    stale = Q(pk__in=[])
+    for status in statuses:
+        stale |= conditions[status]
+    for job in list(BulkActionJob.objects.filter(stale).order_by('pk').only('pk', 'status', 'heartbeat_at')):
+        claimed = BulkActionJob.objects.filter(pk=job.pk, status=job.status, heartbeat_at=job.heartbeat_at) \
+            .update(heartbeat_at=timezone.now())
+        if claimed:
+            yield job.pk
+
+
+def resume_stale_jobs():
+    """
+        Продолжает зависшие операции (см. claim_stale_jobs) в фоновых потоках.
+
+        Returns:
+            int: Количество возобновленных операций.
+    """
+    resumed = 0
+    for job_id in claim_stale_jobs():
+        dispatch_job(job_id)
+        resumed += 1
+    return resumed
+
+
+def _watch_stale_jobs():
+    interval = getattr(settings, 'BULK_ACTION_HEARTBEAT_INTERVAL', 30)
+    while True:
+        try:
+            resume_stale_jobs()
+        except Exception:
+            logger.warning('Не удалось проверить зависшие пакетные операции', exc_info=True)
+        finally:
+            close_old_connections()
+        time.sleep(interval)
+
+
+def start_stale_job_watcher():
+    """
+        Запускает в процессе фоновую проверку зависших операций (вызывается хуком gunicorn при запуске воркера).
+    """
+    threading.Thread(target=_watch_stale_jobs, name='bulk-job-watcher', daemon=True).start()
+
+
+def run_job(job_id):
+    """
+        Выполняет операцию пачками, каждая пачка в отдельной короткой транзакции.
+
+        Прогресс сохраняется после каждой пачки, поэтому прерванную операцию с места остановки продолжит
+        проверка зависших операций (resume_stale_jobs) или команда run_bulk_actions --resume.
+    """
+    job = BulkActionJob.objects.get(pk=job_id)
+    if job.status == BulkActionJob.STATUS_DONE:
+        return job
+    _, func = ACTIONS[job.action]
+    BulkActionJob.objects.filter(pk=job.pk).update(status=BulkActionJob.STATUS_RUNNING, heartbeat_at=timezone.now())
+
+    try:
+        if job.action in RUNNERS:
+            RUNNERS[job.action](job)
+        else:
+            for start in range(job.processed, job.total, job.chunk_size):
+                chunk_ids = job.object_ids[start:start + job.chunk_size]
+                with transaction.atomic():
+                    func(Blog.objects.filter(pk__in=chunk_ids).select_for_update(), job.params)
+                    BulkActionJob.objects.filter(pk=job.pk).update(processed=F('processed') + len(chunk_ids))
+    except Exception as e:
+        BulkActionJob.objects.filter(pk=job.pk).update(status=BulkActionJob.STATUS_FAILED, error=str(e),
+                                                        finished_at=timezone.now())
+    else:
+        BulkActionJob.objects.filter(pk=job.pk).update(status=BulkActionJob.STATUS_DONE, finished_at=timezone.now())
+    job.refresh_from_db()
+    return job
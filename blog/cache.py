@@ -0,0 +1,69 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+def version_key(namespace, pk):
+    return f'version:{namespace}:{pk}'
+
+
+def fragment_key(namespace, name, pk):
+    return f'fragment:{namespace}:{name}:{pk}'
+
+
+def new_version():
+    # Версия - отметка времени, а не счетчик: если ключ версии вытеснен из кэша,
+    # новая версия все равно не совпадет ни с одной из сохраненных во фрагментах
+    return time.time_ns()
+
+
+def bump_version(namespace, pk):
+    """
+        Увеличивает версию объекта, после чего все его закэшированные фрагменты считаются устаревшими.
+    """
+    cache.set(version_key(namespace, pk), new_version(), None)
+
+
+def bump_versions(namespace, pks):
+    """
+        Увеличивает версии нескольких объектов за одно обращение к кэшу.
+    """
+    version = new_version()
+    cache.set_many({version_key(namespace, pk): version for pk in pks}, None)
+
+
+def fetch_fragments(namespace, name, pks):
+    """
+        Получает версии объектов и их закэшированные фрагменты за одно обращение к кэшу.
+
+        Фрагмент хранится как словарь {'version': версия, вариант: html, ...}, поэтому ключи известны
+        заранее, независимо от того, в каком варианте (например, для гостя или подписчика) выводится объект.
+
+        Args:
+            namespace (str): Пространство версий ('blog', 'comments').
+            name (str): Имя фрагмента.
+            pks (iterable): Идентификаторы объектов.
+
+        Returns:
+            dict: {pk: (текущая версия, сохраненный фрагмент или None)}.
+    """
+    pks = list(pks)
+    keys = [version_key(namespace, pk) for pk in pks] + [fragment_key(namespace, name, pk) for pk in pks]
+    found = cache.get_many(keys)
+
+    result, missing_versions = {}, {}
+    for pk in pks:
+        version = found.get(version_key(namespace, pk))
+        if version is None:
+            version = missing_versions[version_key(namespace, pk)] = new_version()
+        entry = found.get(fragment_key(namespace, name, pk))
+        result[pk] = (version, entry if entry and entry.get('version') == version else None)
+    if missing_versions:
+        cache.set_many(missing_versions, None)
+    return result
+
+
+def store_fragment(namespace, name, pk, version, entry):
+    cache.set(fragment_key(namespace, name, pk), dict(entry, version=version),
+              getattr(settings, 'FRAGMENT_CACHE_TIMEOUT', 24 * 60 * 60))
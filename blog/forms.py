@@ -1,5 +1,6 @@
 from django import forms
-from blog.models import Blog, Comment
+from blog.models import Blog, BlogAttachment, Comment
+from blog.uploads import ChunkedUploadFormMixin, LimitedFileField, LimitedImageField
 
 
 class StyleFormMixin:
@@ -12,14 +13,19 @@ class StyleFormMixin:
             field.widget.attrs['class'] = 'form-control'
 
 
-class BlogForm(StyleFormMixin, forms.ModelForm):
+class BlogForm(StyleFormMixin, ChunkedUploadFormMixin, forms.ModelForm):
     """
         Форма для модели Blog.
+
+        Изображение проверяется по размеру и разрешению до декодирования и может быть загружено заранее по частям.
     """
+    chunked_upload_fields = ('image',)
+
     class Meta:
         model = Blog
         fields = ['title', 'description', 'image', 'published_on', 'price', 'is_paid']
         exclude = ('slug', 'views', 'user', 'comments')
+        field_classes = {'image': LimitedImageField}
 
 
 class BlogAdminForm(forms.ModelForm):
@@ -29,6 +35,7 @@ class BlogAdminForm(forms.ModelForm):
     class Meta:
         model = Blog
         exclude = ['comments']
+        field_classes = {'image': LimitedImageField}
 
 
 class CommentForm(StyleFormMixin, forms.ModelForm):
@@ -38,3 +45,15 @@ class CommentForm(StyleFormMixin, forms.ModelForm):
     class Meta:
         model = Comment
         fields = ['comment']
+
+
+class BlogAttachmentForm(StyleFormMixin, ChunkedUploadFormMixin, forms.ModelForm):
+    """
+        Форма для модели BlogAttachment. Большой файл можно загрузить заранее по частям.
+    """
+    chunked_upload_fields = ('file',)
+
+    class Meta:
+        model = BlogAttachment
+        fields = ['title', 'file', 'is_free']
+        field_classes = {'file': LimitedFileField}
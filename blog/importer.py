@@ -0,0 +1,238 @@
+import io
+import json
+import os
+import zipfile
+from dataclasses import dataclass, field
+
+from django.core.files import File
+from django.db import IntegrityError, transaction
+
+from blog.models import Blog, make_slug
+from blog.storage import change_references
+
+MANIFEST_NAME = 'manifest.jsonl'
+MAX_REPORTED_ERRORS = 1000
+SLUG_MAX_LENGTH = Blog._meta.get_field('slug').max_length
+TITLE_MAX_LENGTH = Blog._meta.get_field('title').max_length
+
+
+@dataclass
+class ImportReport:
+    """
+        Результат импорта: количество созданных записей и ошибки по номерам строк манифеста.
+    """
+    created: int = 0
+    failed: int = 0
+    errors: list = field(default_factory=list)
+
+    def add_error(self, line_no, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line_no, message))
+
+
+def iter_manifest(archive):
+    """
+        Построчно читает манифест из архива, не распаковывая архив целиком.
+
+        Yields:
+            tuple: (номер строки, словарь записи или None, сообщение об ошибке или None).
+    """
+    with archive.open(MANIFEST_NAME) as raw:
+        for line_no, line in enumerate(io.TextIOWrapper(raw, encoding='utf-8'), start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield line_no, None, f'Некорректный JSON: {e}'
+                continue
+            yield line_no, row, None
+
+
+def build_blog(row, archive_names, user):
+    """
+        Проверяет запись манифеста и создает несохраненный объект Blog.
+
+        Raises:
+            ValueError: Если запись некорректна.
+    """
+    if not isinstance(row, dict):
+        raise ValueError('Запись должна быть объектом')
+    title = str(row.get('title') or '').strip()
+    if not title:
+        raise ValueError('Не указан заголовок')
+    if len(title) > TITLE_MAX_LENGTH:
+        raise ValueError(f'Заголовок длиннее {TITLE_MAX_LENGTH} символов')
+    description = str(row.get('description') or '').strip()
+    if not description:
+        raise ValueError('Не указано описание')
+    price = row.get('price', 0)
+    if not isinstance(price, int) or isinstance(price, bool) or price < 0:
+        raise ValueError('Стоимость должна быть неотрицательным целым числом')
+    image = row.get('image')
+    if image and image not in archive_names:
+        raise ValueError(f'Изображение {image} не найдено в архиве')
+
+    blog = Blog(
+        title=title,
+        description=description,
+        price=price,
+        is_paid=bool(row.get('is_paid', price > 0)),
+        published_on=bool(row.get('published_on', False)),
+        user=user,
+    )
+    blog.import_image = image
+    return blog
+
+
+def allocate_slugs(blogs):
+    """
+        Назначает уникальные slug пачке записей.
+
+        Занятые slug проверяются одним запросом на всю пачку; для совпавших подбираются суффиксы -2, -3...
+        и проверяются следующим запросом, пока конфликты не закончатся.
+    """
+    pending = {}
+    for blog in blogs:
+        base = (make_slug(blog.title) or 'post')[:SLUG_MAX_LENGTH - 8].strip('-')
+        blog.slug_base, blog.slug_suffix = base, 1
+        pending.setdefault(base, []).append(blog)
+
+    taken = set()
+    while pending:
+        candidates = {}
+        for blogs_with_base in pending.values():
+            for blog in blogs_with_base:
+                slug = blog.slug_base if blog.slug_suffix == 1 else f'{blog.slug_base}-{blog.slug_suffix}'
+                candidates.setdefault(slug, []).append(blog)
+
+        taken |= set(Blog.objects.filter(slug__in=list(candidates)).values_list('slug', flat=True))
+        pending = {}
+        for slug, blogs_with_slug in candidates.items():
+            if slug not in taken:
+                first, *rest = blogs_with_slug
+                first.slug = slug
+                taken.add(slug)
+            else:
+                rest = blogs_with_slug
+            for blog in rest:
+                blog.slug_suffix += 1
+                pending.setdefault(blog.slug_base, []).append(blog)
+
+
+def attach_images(blogs, archive):
+    """
+        Копирует изображения из архива в хранилище потоково, по одному файлу.
+    """
+    for blog in blogs:
+        if blog.import_image:
+            with archive.open(blog.import_image) as member:
+                name = os.path.basename(blog.import_image)
+                blog.image.save(name, File(member, name=name), save=False)
+
+
+def insert_one(blog, report):
+    """
+        Сохраняет одну запись в своей точке сохранения.
+
+        Slug мог занять параллельный импорт или автор после allocate_slugs: тогда slug подбирается заново
+        и запись сохраняется еще раз, а повторная ошибка попадает в отчет по номеру строки.
+
+        Returns:
+            bool: Запись сохранена.
+    """
+    for attempt in range(2):
+        try:
+            with transaction.atomic():
+                Blog.objects.bulk_create([blog])
+            return True
+        except IntegrityError as e:
+            error = e
+            allocate_slugs([blog])
+    report.add_error(blog.import_line, f'Не удалось сохранить запись: {error}')
+    return False
+
+
+def save_batch(batch, archive, report, progress=None, processed=None):
+    """
+        Сохраняет пачку записей одной транзакцией.
+
+        progress(processed) вызывается внутри той же транзакции, поэтому сохраненный прогресс операции
+        всегда соответствует созданным записям и при возобновлении пачка не создается повторно.
+    """
+    allocate_slugs(batch)
+    attach_images(batch, archive)
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                Blog.objects.bulk_create(batch)
+            created = batch
+        except IntegrityError:
+            created = [blog for blog in batch if insert_one(blog, report)]
+        # bulk_create не отправляет post_save, поэтому ссылки на файлы учитываются явно
+        for blog in created:
+            change_references(blog.image.name, 1)
+        if progress:
+            progress(processed)
+    report.created += len(created)
+
+
+def import_archive(path_or_file, user=None, batch_size=1000, progress=None, skip=0):
+    """
+        Импортирует записи блога из ZIP-архива с манифестом manifest.jsonl и изображениями.
+
+        Каждая строка манифеста - JSON-объект с полями title, description, price, is_paid,
+        published_on и image (путь изображения внутри архива). Записи создаются через bulk_create
+        пачками по batch_size, некорректные строки и записи, которые не удалось сохранить,
+        пропускаются и попадают в отчет.
+
+        Args:
+            path_or_file: Путь к архиву или файловый объект.
+            user (User, optional): Автор импортируемых записей.
+            batch_size (int): Размер пачки bulk_create.
+            progress (callable, optional): Вызывается с количеством обработанных строк в транзакции каждой пачки.
+            skip (int): Количество уже импортированных строк, которые нужно пропустить при возобновлении.
+
+        Returns:
+            ImportReport: Отчет об импорте.
+    """
+    report = ImportReport()
+    with zipfile.ZipFile(path_or_file) as archive:
+        names = set(archive.namelist())
+        if MANIFEST_NAME not in names:
+            report.add_error(0, f'В архиве нет {MANIFEST_NAME}')
+            return report
+
+        batch, processed = [], 0
+        for line_no, row, error in iter_manifest(archive):
+            processed += 1
+            if processed <= skip:
+                continue
+            if error is None:
+                try:
+                    blog = build_blog(row, names, user)
+                    blog.import_line = line_no
+                    batch.append(blog)
+                except ValueError as e:
+                    error = str(e)
+            if error is not None:
+                report.add_error(line_no, error)
+
+            if len(batch) >= batch_size:
+                save_batch(batch, archive, report, progress, processed)
+                batch = []
+
+        if batch:
+            save_batch(batch, archive, report, progress, processed)
+        elif progress:
+            progress(processed)
+    return report
+
+
+def count_manifest_lines(path_or_file):
+    with zipfile.ZipFile(path_or_file) as archive:
+        if MANIFEST_NAME not in archive.namelist():
+            return 0
+        with archive.open(MANIFEST_NAME) as raw:
+            return sum(1 for line in raw if line.strip())
@@ -1,7 +1,11 @@
 from django.core.management import BaseCommand, call_command
 
+from users.models import backfill_normalized_phones
+
 
 class Command(BaseCommand):
     """Команда для загрузки фикстуры"""
     def handle(self, *args, **options):
         call_command('loaddata', 'fixtures.json')
+        # loaddata сохраняет объекты без вызова save(), номер в формате E.164 заполняется отдельно
+        backfill_normalized_phones()
@@ -0,0 +1,27 @@
+from django.core.management import BaseCommand, CommandError
+
+from blog.importer import import_archive
+from users.models import User
+
+
+class Command(BaseCommand):
+    """Команда для импорта записей блога из архива"""
+    help = 'Импортирует записи блога из ZIP-архива с manifest.jsonl и изображениями'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archive', help='Путь к ZIP-архиву')
+        parser.add_argument('--user', help='Телефон автора импортируемых записей')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Размер пачки bulk_create')
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            user = User.objects.filter(phone=options['user']).first()
+            if user is None:
+                raise CommandError(f'Пользователь {options["user"]} не найден')
+
+        report = import_archive(options['archive'], user=user, batch_size=options['batch_size'],
+                                progress=lambda processed: self.stdout.write(f'Обработано строк: {processed}'))
+        for line_no, message in report.errors:
+            self.stderr.write(f'Строка {line_no}: {message}')
+        self.stdout.write(self.style.SUCCESS(f'Создано записей: {report.created}, пропущено строк: {report.failed}'))
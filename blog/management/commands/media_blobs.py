@@ -0,0 +1,30 @@
+from datetime import timedelta
+
+from django.core.management import BaseCommand
+
+from blog.storage import GC_GRACE_PERIOD, adopt_legacy_files, collect_garbage, recount_references
+from blog.uploads import remove_stale_uploads
+
+
+class Command(BaseCommand):
+    """Команда для обслуживания хранилища файлов с адресацией по содержимому"""
+    help = 'Переносит старые файлы в блобы, пересчитывает ссылки и удаляет файлы без ссылок'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--adopt', action='store_true',
+                            help='Перенести файлы, загруженные до появления хранилища, в блобы')
+        parser.add_argument('--recount', action='store_true', help='Пересчитать счетчики ссылок')
+        parser.add_argument('--gc', action='store_true',
+                            help='Удалить файлы без ссылок и загрузки по частям старше суток')
+        parser.add_argument('--grace-hours', type=float, default=GC_GRACE_PERIOD.total_seconds() / 3600,
+                            help='Не удалять файлы, изменявшиеся за последние N часов')
+
+    def handle(self, *args, **options):
+        if options['adopt']:
+            self.stdout.write(f'Перенесено ссылок: {adopt_legacy_files()}')
+        if options['recount']:
+            self.stdout.write(f'Файлов со ссылками: {len(recount_references())}')
+        if options['gc']:
+            removed = collect_garbage(timedelta(hours=options['grace_hours']))
+            self.stdout.write(f'Удалено файлов: {removed}')
+            self.stdout.write(f'Удалено незавершенных загрузок: {remove_stale_uploads()}')
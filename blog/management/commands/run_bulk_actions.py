@@ -0,0 +1,25 @@
+from django.core.management import BaseCommand
+
+from blog.bulk_actions import claim_stale_jobs, run_with_heartbeat
+from blog.models import BulkActionJob
+
+
+class Command(BaseCommand):
+    """Команда для выполнения пакетных операций из очереди"""
+    help = 'Выполняет зависшие пакетные операции админки (не начатые за BULK_ACTION_STALE_AFTER секунд)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--resume', action='store_true',
+                            help='Продолжить прерванные операции (статус "Выполняется" без отметок исполнителя '
+                                 'за BULK_ACTION_STALE_AFTER секунд и статус "Ошибка")')
+
+    def handle(self, *args, **options):
+        statuses = [BulkActionJob.STATUS_PENDING]
+        if options['resume']:
+            statuses += [BulkActionJob.STATUS_RUNNING, BulkActionJob.STATUS_FAILED]
+
+        # Операции захватываются так же, как проверкой зависших операций в воркерах gunicorn,
+        # поэтому одну операцию не выполнят одновременно команда и воркер
+        for job_id in claim_stale_jobs(statuses):
+            job = run_with_heartbeat(job_id)
+            self.stdout.write(f'{job}: {job.get_status_display()}')
@@ -0,0 +1,204 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_http_date_safe
+
+from subscriptions.models import Subscription
+
+
+def has_blog_access(user, blog):
+    """
+        Проверяет право пользователя на платное содержимое блога.
+
+        Доступ есть у автора и персонала, а к опубликованному блогу - у всех, если он бесплатный,
+        и у подписчиков с активной подпиской, если платный.
+
+        Args:
+            user (User): Пользователь запроса (может быть анонимным).
+            blog (Blog): Блог.
+
+        Returns:
+            bool: Есть ли доступ.
+    """
+    if user.is_authenticated and (user.is_staff or user.pk == blog.user_id):
+        return True
+    if not blog.published_on:
+        return False
+    if blog.is_free:
+        return True
+    return user.is_authenticated and blog.pk in entitled_blog_ids(user)
+
+
+def entitled_blog_ids(user):
+    """
+        Возвращает множество идентификаторов блогов с активной подпиской пользователя.
+
+        Выборка кэшируется до изменения таблицы подписок, поэтому проверка доступа к каждому
+        файлу на странице не обращается к базе.
+    """
+    return set(Subscription.objects.filter(user=user, status=True).values_list('blog_id', flat=True).cached())
+
+
+def media_path(name):
+    """
+        Возвращает путь файла внутри MEDIA_ROOT, не допуская выхода за его пределы.
+
+        Raises:
+            Http404: Если путь некорректен или файла нет.
+    """
+    try:
+        path = safe_join(settings.MEDIA_ROOT, name)
+    except ValueError:
+        raise Http404
+    if not os.path.isfile(path):
+        raise Http404
+    return path
+
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+RANGE_CHUNK_SIZE = 64 * 1024
+
+
+def parse_range(header, size):
+    """
+        Разбирает заголовок Range с одним диапазоном байт.
+
+        Args:
+            header (str): Значение заголовка Range.
+            size (int): Размер файла.
+
+        Returns:
+            tuple: (начало, конец включительно), None для неподдерживаемого заголовка (отдается весь файл)
+            или False для диапазона за пределами файла.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        # Несколько диапазонов и прочие единицы не поддерживаются: по RFC 9110 можно отдать весь файл
+        return None
+    start, end = match.groups()
+    if start:
+        start = int(start)
+        end = min(int(end), size - 1) if end else size - 1
+    else:
+        start, end = max(size - int(end), 0), size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def if_range_matches(header, etag, last_modified):
+    """
+        Проверяет If-Range: диапазон отдается, только если файл не изменился с момента первой загрузки.
+    """
+    if not header:
+        return True
+    if header.startswith(('"', 'W/')):
+        return header == etag
+    modified_since = parse_http_date_safe(header)
+    return modified_since is not None and int(last_modified) <= modified_since
+
+
+def iter_file_range(file, start, length, chunk_size=RANGE_CHUNK_SIZE):
+    """
+        Читает диапазон файла частями, не загружая его в память целиком.
+    """
+    with file:
+        file.seek(start)
+        while length > 0:
+            data = file.read(min(chunk_size, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+
+
+async def aiter_sync(iterator):
+    """
+        Отдает элементы синхронного итератора, вызывая next() в потоке через sync_to_async.
+
+        Под ASGI Django собирает синхронное содержимое StreamingHttpResponse в список целиком
+        и только потом отправляет его, поэтому крупные файлы отдаются асинхронным итератором.
+    """
+    sentinel = object()
+    try:
+        while (item := await sync_to_async(next)(iterator, sentinel)) is not sentinel:
+            yield item
+    finally:
+        await sync_to_async(iterator.close)()
+
+
+def file_response(request, path, content_type, etag):
+    """
+        Отдает файл с диска с поддержкой Range и If-Range.
+
+        Returns:
+            HttpResponse: 200 с файлом целиком, 206 с диапазоном или 416.
+    """
+    stat = os.stat(path)
+    byte_range = None
+    if request.headers.get('Range') and if_range_matches(request.headers.get('If-Range'), etag, stat.st_mtime):
+        byte_range = parse_range(request.headers['Range'], stat.st_size)
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{stat.st_size}'
+    elif byte_range:
+        start, end = byte_range
+        content = iter_file_range(open(path, 'rb'), start, end - start + 1)
+        if isinstance(request, ASGIRequest):
+            content = aiter_sync(content)
+        response = StreamingHttpResponse(content, status=206, content_type=content_type)
+        response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+        response['Content-Length'] = end - start + 1
+    elif isinstance(request, ASGIRequest):
+        response = StreamingHttpResponse(aiter_sync(iter_file_range(open(path, 'rb'), 0, stat.st_size)),
+                                         content_type=content_type)
+        response['Content-Length'] = stat.st_size
+    else:
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    return response
+
+
+def serve_file(request, name, public=False, filename=None, content_type=None):
+    """
+        Отдает файл из MEDIA_ROOT после проверки прав.
+
+        С MEDIA_ACCEL_REDIRECT передача поручается nginx через X-Accel-Redirect во внутренний location:
+        Django отвечает только заголовками, а файл, в том числе диапазоны Range, отправляет nginx через sendfile.
+        Без nginx (разработка, тесты) файл читается с диска по частям с поддержкой Range,
+        под ASGI - асинхронным итератором, чтобы Django не собирал файл в памяти перед отправкой.
+
+        Args:
+            request (HttpRequest): Запрос, заголовки Range и If-Range которого учитываются.
+            name (str): Имя файла в хранилище.
+            public (bool): Разрешить кэширование общими кэшами.
+            filename (str, optional): Имя файла для скачивания (Content-Disposition: attachment).
+            content_type (str, optional): Тип содержимого; по умолчанию определяется по расширению.
+
+        Returns:
+            HttpResponse: Ответ с файлом или с заголовком X-Accel-Redirect.
+    """
+    path = media_path(name)
+    content_type = content_type or mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+    if getattr(settings, 'MEDIA_ACCEL_REDIRECT', False):
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_PREFIX + quote(name)
+    else:
+        # Имя блоба - хэш содержимого, поэтому служит стабильным ETag
+        etag = '"%s"' % os.path.splitext(os.path.basename(name))[0]
+        response = file_response(request, path, content_type, etag)
+    if filename:
+        response['Content-Disposition'] = f"attachment; filename*=UTF-8''{quote(filename)}"
+    response['Cache-Control'] = 'public, max-age=86400' if public else 'private, max-age=3600'
+    return response
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.4 on 2026-10-19 12:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0008_remove_blog_comments_blog_comments'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='blog',
+            name='title',
+            field=models.CharField(db_index=True, max_length=150, verbose_name='Заголовок'),
+        ),
+    ]
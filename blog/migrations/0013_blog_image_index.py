@@ -0,0 +1,19 @@
+# Generated by Django 4.2.4 on 2026-10-19 12:40
+
+import blog.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0012_chunkedupload'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='blog',
+            name='image',
+            field=models.ImageField(blank=True, db_index=True, null=True, storage=blog.storage.ContentAddressedStorage(), upload_to='blog/', verbose_name='Изображение'),
+        ),
+    ]
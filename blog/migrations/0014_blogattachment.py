@@ -0,0 +1,38 @@
+# Generated by Django 4.2.4 on 2026-10-19 12:42
+
+import blog.storage
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0013_blog_image_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chunkedupload',
+            name='kind',
+            field=models.CharField(choices=[('image', 'Изображение'), ('file', 'Файл')], default='image', max_length=10, verbose_name='Тип'),
+        ),
+        migrations.CreateModel(
+            name='BlogAttachment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=150, verbose_name='Название')),
+                ('file', models.FileField(storage=blog.storage.ContentAddressedStorage(), upload_to='attachments/', verbose_name='Файл')),
+                ('size', models.BigIntegerField(default=0, verbose_name='Размер')),
+                ('content_type', models.CharField(blank=True, max_length=100, verbose_name='Тип содержимого')),
+                ('is_free', models.BooleanField(default=False, verbose_name='Доступен без подписки')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Добавлен')),
+                ('blog', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attachments', to='blog.blog', verbose_name='Контент')),
+            ],
+            options={
+                'verbose_name': 'Вложение',
+                'verbose_name_plural': 'Вложения',
+                'ordering': ('pk',),
+            },
+        ),
+    ]
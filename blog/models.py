@@ -1,12 +1,28 @@
+import mimetypes
+import uuid
+
 from django.conf import settings
 from django.db import models
 from django.urls import reverse
 from django.utils.text import slugify
-from transliterate import translit
+
+from blog.querycache import CachingManager
+from blog.storage import media_storage
 
 NULLABLE = {'blank': True, 'null': True}
 
 
+def make_slug(title):
+    """
+        Возвращает транслитерированный slug для заголовка.
+    """
+    # transliterate загружает языковые пакеты при импорте, а нужен только при сохранении блога
+    from transliterate import translit
+
+    transliterated_title = translit(title, 'ru', reversed=True)
+    return slugify(transliterated_title, allow_unicode=True)
+
+
 class Comment(models.Model):
     """
         Модель для хранения комментариев к блогам.
@@ -27,10 +43,11 @@ class Blog(models.Model):
     """
         Модель для представления контента блога.
     """
-    title = models.CharField(max_length=150, verbose_name='Заголовок')
+    title = models.CharField(max_length=150, db_index=True, verbose_name='Заголовок')
     slug = models.SlugField(max_length=150, unique=True, verbose_name='Slug')
     description = models.TextField(verbose_name='Описание контента')
-    image = models.ImageField(upload_to='blog/', **NULLABLE, verbose_name='Изображение')
+    image = models.ImageField(upload_to='blog/', storage=media_storage, db_index=True, **NULLABLE,
+                              verbose_name='Изображение')
     created_date = models.DateField(auto_now_add=True, verbose_name='Дата публикации')
     views = models.IntegerField(verbose_name='Количество просмотров', default=0, **NULLABLE)
     published_on = models.BooleanField(default=False, verbose_name='Признак публикации')
@@ -40,6 +57,8 @@ class Blog(models.Model):
     is_paid = models.BooleanField(default=False, verbose_name='Платный контент')
     comments = models.ManyToManyField(Comment, blank=True, verbose_name='Комментарии')
 
+    objects = CachingManager()
+
     class Meta:
         verbose_name = 'Контент'
         verbose_name_plural = 'Контенты'
@@ -53,8 +72,7 @@ class Blog(models.Model):
             Если у объекта нет slug, то генерируется транслитерированный slug из заголовка.
         """
         if not self.slug:
-            transliterated_title = translit(self.title, 'ru', reversed=True)
-            self.slug = slugify(transliterated_title, allow_unicode=True)
+            self.slug = make_slug(self.title)
         super().save(*args, **kwargs)
 
     def get_absolute_url(self):
@@ -70,8 +88,158 @@ class Blog(models.Model):
         self.published_on = not self.published_on
         self.save()
 
+    @property
+    def is_free(self):
+        """
+            Признак бесплатного контента, доступного без подписки.
+        """
+        return not self.is_paid and not self.price
+
     def get_display_price(self):
         """
             Возвращает цену в формате с двумя десятичными знаками.
         """
         return "{0:.2f}".format(self.price / 100)
+
+
+class BulkActionJob(models.Model):
+    """
+        Модель фоновой пакетной операции над записями блога из админки.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUSES = (
+        (STATUS_PENDING, 'В очереди'),
+        (STATUS_RUNNING, 'Выполняется'),
+        (STATUS_DONE, 'Завершена'),
+        (STATUS_FAILED, 'Ошибка'),
+    )
+
+    action = models.CharField(max_length=50, verbose_name='Действие')
+    params = models.JSONField(default=dict, blank=True, verbose_name='Параметры')
+    object_ids = models.JSONField(default=list, verbose_name='Идентификаторы записей')
+    chunk_size = models.PositiveIntegerField(default=500, verbose_name='Размер пачки')
+    total = models.PositiveIntegerField(default=0, verbose_name='Всего записей')
+    processed = models.PositiveIntegerField(default=0, verbose_name='Обработано записей')
+    status = models.CharField(max_length=10, choices=STATUSES, default=STATUS_PENDING, verbose_name='Статус')
+    error = models.TextField(blank=True, verbose_name='Ошибка')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, **NULLABLE,
+                             verbose_name='Инициатор')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Создана')
+    finished_at = models.DateTimeField(**NULLABLE, verbose_name='Завершена')
+    heartbeat_at = models.DateTimeField(**NULLABLE, verbose_name='Последний сигнал исполнителя')
+
+    class Meta:
+        verbose_name = 'Пакетная операция'
+        verbose_name_plural = 'Пакетные операции'
+
+    def __str__(self):
+        return f'{self.action}: {self.processed}/{self.total}'
+
+    @property
+    def progress(self):
+        """
+            Возвращает процент выполнения операции.
+        """
+        return int(self.processed * 100 / self.total) if self.total else 100
+
+
+class MediaBlob(models.Model):
+    """
+        Модель файла в хранилище с адресацией по содержимому и счетчиком ссылок на него.
+    """
+    name = models.CharField(max_length=255, unique=True, verbose_name='Имя файла')
+    size = models.BigIntegerField(default=0, verbose_name='Размер')
+    ref_count = models.IntegerField(default=0, db_index=True, verbose_name='Количество ссылок')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Изменен')
+
+    class Meta:
+        verbose_name = 'Файл'
+        verbose_name_plural = 'Файлы'
+
+    def __str__(self):
+        return self.name
+
+
+class ChunkedUpload(models.Model):
+    """
+        Модель возобновляемой загрузки изображения по частям.
+    """
+    KIND_IMAGE = 'image'
+    KIND_FILE = 'file'
+    KINDS = (
+        (KIND_IMAGE, 'Изображение'),
+        (KIND_FILE, 'Файл'),
+    )
+    STATUS_UPLOADING = 'uploading'
+    STATUS_COMPLETE = 'complete'
+    STATUS_FAILED = 'failed'
+    STATUSES = (
+        (STATUS_UPLOADING, 'Загружается'),
+        (STATUS_COMPLETE, 'Загружена'),
+        (STATUS_FAILED, 'Ошибка'),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, verbose_name='Пользователь')
+    filename = models.CharField(max_length=255, verbose_name='Имя файла')
+    kind = models.CharField(max_length=10, choices=KINDS, default=KIND_IMAGE, verbose_name='Тип')
+    size = models.BigIntegerField(verbose_name='Размер')
+    offset = models.BigIntegerField(default=0, verbose_name='Получено байт')
+    status = models.CharField(max_length=10, choices=STATUSES, default=STATUS_UPLOADING, verbose_name='Статус')
+    sha256 = models.CharField(max_length=64, blank=True, verbose_name='SHA-256')
+    error = models.TextField(blank=True, verbose_name='Ошибка')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Создана')
+
+    class Meta:
+        verbose_name = 'Загрузка по частям'
+        verbose_name_plural = 'Загрузки по частям'
+
+    def __str__(self):
+        return f'{self.filename}: {self.offset}/{self.size}'
+
+    def as_file(self):
+        """
+            Возвращает загруженный файл для присвоения полю изображения.
+        """
+        from blog.uploads import ChunkedUploadWriter
+        return ChunkedUploadWriter(self).open()
+
+
+class BlogAttachment(models.Model):
+    """
+        Модель файла, прикрепленного к записи блога (PDF, аудио, видео).
+
+        Доступ к файлу проверяется так же, как к платному содержимому блога; отдельные файлы
+        автор может открыть без подписки как ознакомительные.
+    """
+    blog = models.ForeignKey(Blog, related_name='attachments', on_delete=models.CASCADE, verbose_name='Контент')
+    title = models.CharField(max_length=150, verbose_name='Название')
+    file = models.FileField(upload_to='attachments/', storage=media_storage, verbose_name='Файл')
+    size = models.BigIntegerField(default=0, verbose_name='Размер')
+    content_type = models.CharField(max_length=100, blank=True, verbose_name='Тип содержимого')
+    is_free = models.BooleanField(default=False, verbose_name='Доступен без подписки')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Добавлен')
+
+    class Meta:
+        verbose_name = 'Вложение'
+        verbose_name_plural = 'Вложения'
+        ordering = ('pk',)
+
+    def __str__(self):
+        return self.title
+
+    def save(self, *args, **kwargs):
+        """
+            Переопределение метода сохранения объекта.
+            Запоминает размер и тип файла, чтобы не обращаться к диску при выводе списка вложений.
+        """
+        if self.file and not self.file._committed:
+            self.size = self.file.size
+            self.content_type = mimetypes.guess_type(self.file.name)[0] or 'application/octet-stream'
+        super().save(*args, **kwargs)
+
+    def get_absolute_url(self):
+        return reverse('blog:attachment_download', kwargs={'slug': self.blog.slug, 'pk': self.pk})
@@ -0,0 +1,176 @@
+import random
+import threading
+import time
+from collections import defaultdict
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_cache_key, learn_cache_key, patch_response_headers, patch_vary_headers
+
+OUTCOMES = ('hits', 'misses', 'early', 'regenerated', 'stale_served', 'coalesced')
+
+stats = defaultdict(lambda: dict.fromkeys(OUTCOMES, 0))
+_stats_lock = threading.Lock()
+
+
+def count(view, outcome):
+    with _stats_lock:
+        stats[view][outcome] += 1
+
+
+def get_stats():
+    """
+        Возвращает счетчики кэша страниц текущего процесса по представлениям.
+    """
+    with _stats_lock:
+        return {view: dict(counters) for view, counters in stats.items()}
+
+
+class SingleFlight:
+    """
+        Объединение одинаковых одновременных вычислений внутри процесса.
+
+        Первый поток с данным ключом выполняет функцию, остальные ждут его результат
+        (или исключение) вместо того, чтобы повторять ту же работу.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, func):
+        """
+            Выполняет func один раз для всех одновременных вызовов с одним ключом.
+
+            Returns:
+                tuple: (результат, признак того, что результат получен от другого потока).
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = {'done': threading.Event()}
+        if not leader:
+            call['done'].wait()
+            if 'error' in call:
+                raise call['error']
+            return call['result'], True
+        try:
+            call['result'] = func()
+        except BaseException as error:
+            call['error'] = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call['done'].set()
+        return call['result'], False
+
+
+flights = SingleFlight()
+
+
+def should_recompute_early(entry, beta, now=None):
+    """
+        Вероятностное досрочное обновление (XFetch): чем ближе истечение и чем дольше страница
+        строилась в прошлый раз, тем выше шанс, что запрос обновит ее заранее, до массового промаха.
+    """
+    now = time.time() if now is None else now
+    return now + entry['delta'] * beta * random.expovariate(1.0) >= entry['expires']
+
+
+def is_cacheable(request, response):
+    if response.streaming or response.status_code != 200:
+        return False
+    if 'private' in response.get('Cache-Control', ''):
+        return False
+    # Ответ, устанавливающий cookie, отдавать другим клиентам нельзя (как в CacheMiddleware)
+    return not (response.cookies and not request.COOKIES)
+
+
+def stampede_cache_page(timeout, stale_timeout=None, beta=None, lock_timeout=None, key_prefix=''):
+    """
+        Замена cache_page, защищающая от лавины пересчетов при истечении страницы.
+
+        Страница хранится в кэше дольше своего срока (на stale_timeout) вместе со временем построения.
+        Запросы к свежей странице изредка обновляют ее досрочно; после истечения страницу перестраивает
+        только взявший блокировку в кэше воркер, а остальные в это время получают устаревшую копию.
+        Одинаковые одновременные промахи внутри процесса объединяются в одно вычисление.
+
+        Args:
+            timeout (int): Срок свежести страницы в секундах.
+            stale_timeout (int, optional): Сколько еще отдавать устаревшую страницу; по умолчанию PAGE_CACHE_STALE_TIMEOUT.
+            beta (float, optional): Коэффициент досрочного обновления; по умолчанию PAGE_CACHE_BETA, 0 отключает.
+            lock_timeout (int, optional): Время жизни блокировки пересчета; по умолчанию PAGE_CACHE_LOCK_TIMEOUT.
+            key_prefix (str): Префикс ключей, как у cache_page.
+    """
+
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view_func(request, *args, **kwargs)
+
+            stale = stale_timeout if stale_timeout is not None else getattr(settings, 'PAGE_CACHE_STALE_TIMEOUT', 300)
+            coefficient = beta if beta is not None else getattr(settings, 'PAGE_CACHE_BETA', 1.0)
+            lock_ttl = lock_timeout or getattr(settings, 'PAGE_CACHE_LOCK_TIMEOUT', 30)
+            view = request.resolver_match.view_name if request.resolver_match else request.path
+
+            def build():
+                started = time.monotonic()
+                response = view_func(request, *args, **kwargs)
+                if hasattr(response, 'render') and callable(response.render):
+                    response = response.render()
+                if not is_cacheable(request, response):
+                    return response
+                if getattr(request, 'session', None) is not None and request.session.accessed:
+                    # Страница зависит от сессии (пользователя): SessionMiddleware добавит Vary: Cookie позже,
+                    # а ключ кэша вычисляется уже здесь
+                    patch_vary_headers(response, ('Cookie',))
+                patch_response_headers(response, timeout)
+                key = learn_cache_key(request, response, timeout + stale, key_prefix, cache=cache)
+                cache.set(key, {
+                    'response': response,
+                    'expires': time.time() + timeout,
+                    'delta': time.monotonic() - started,
+                }, timeout + stale)
+                return response
+
+            key = get_cache_key(request, key_prefix, 'GET', cache=cache)
+            entry = cache.get(key) if key else None
+
+            if entry is not None:
+                now = time.time()
+                expired = now >= entry['expires']
+                if not expired and not (coefficient and should_recompute_early(entry, coefficient, now)):
+                    count(view, 'hits')
+                    return entry['response']
+                lock_key = f'{key}:lock'
+                if not cache.add(lock_key, 1, lock_ttl):
+                    # Страницу уже перестраивает другой воркер
+                    count(view, 'stale_served' if expired else 'hits')
+                    return entry['response']
+                count(view, 'regenerated' if expired else 'early')
+                try:
+                    return build()
+                finally:
+                    cache.delete(lock_key)
+
+            if key is None:
+                # Заголовки Vary еще неизвестны, объединять запросы разных пользователей нельзя
+                count(view, 'misses')
+                return build()
+            response, shared = flights.do(key, build)
+            entry = cache.get(key) if shared else None
+            if entry is None:
+                count(view, 'misses')
+                # Ответ другого потока не попал в кэш (например, не кэшируемый) - у запроса свой ответ
+                return build() if shared else response
+            # Каждый запрос получает свою копию ответа из кэша: middleware дописывают в него заголовки
+            count(view, 'coalesced')
+            return entry['response']
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,77 @@
+import json
+
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+# Ниже этого порога оценка планировщика заменяется точным COUNT(*): на малых таблицах он дешев
+ESTIMATE_THRESHOLD = 10000
+
+
+def estimate_count(queryset):
+    """
+        Оценивает количество строк выборки без COUNT(*).
+
+        Для выборки без условий берется reltuples из pg_class, для отфильтрованной - оценка
+        планировщика из EXPLAIN. На других СУБД оценка недоступна.
+
+        Returns:
+            int | None: Оценка количества строк или None.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+
+    with connection.cursor() as cursor:
+        if not queryset.query.where:
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                           [queryset.model._meta.db_table])
+            row = cursor.fetchone()
+            return max(row[0], 0) if row else None
+
+        sql, params = queryset.order_by().values('pk').query.sql_with_params()
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+        Пагинатор, использующий оценку количества строк на больших таблицах вместо COUNT(*).
+    """
+
+    @cached_property
+    def count(self):
+        estimate = estimate_count(self.object_list) if hasattr(self.object_list, 'query') else None
+        if estimate is not None and estimate >= ESTIMATE_THRESHOLD:
+            return estimate
+        return super().count
+
+
+def keyset_page(queryset, after=None, per_page=50, field='pk'):
+    """
+        Возвращает страницу выборки по ключу вместо OFFSET.
+
+        Выборка упорядочивается по убыванию field, следующая страница начинается после последнего
+        ключа текущей, поэтому стоимость запроса не растет с номером страницы.
+
+        Args:
+            queryset (QuerySet): Исходная выборка.
+            after: Ключ последнего объекта предыдущей страницы.
+            per_page (int): Размер страницы.
+            field (str): Уникальное поле, по которому строится ключ.
+
+        Returns:
+            tuple: (объекты страницы, ключ для следующей страницы или None).
+    """
+    queryset = queryset.order_by(f'-{field}')
+    if after is not None:
+        queryset = queryset.filter(**{f'{field}__lt': after})
+    rows = list(queryset[:per_page + 1])
+    if len(rows) <= per_page:
+        return rows, None
+    rows = rows[:per_page]
+    last = rows[-1]
+    return rows, last[field] if isinstance(last, dict) else getattr(last, field)
@@ -0,0 +1,104 @@
+import asyncio
+import json
+import threading
+from contextlib import asynccontextmanager
+
+from django.conf import settings
+
+
+class InProcessBroker:
+    """
+        Брокер сообщений в памяти процесса. Подходит для одного узла с одним ASGI-процессом.
+
+        Публикация может вызываться из синхронного кода (потока представления),
+        сообщения передаются в очереди подписчиков через их event loop.
+    """
+
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self.subscribers = {}
+        self.lock = threading.Lock()
+
+    def publish(self, channel, message):
+        with self.lock:
+            subscribers = list(self.subscribers.get(channel, ()))
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(self._put, queue, message)
+
+    @staticmethod
+    def _put(queue, message):
+        # Медленный читатель теряет сообщения, а не память процесса; пропуск восполнит Last-Event-ID
+        if not queue.full():
+            queue.put_nowait(message)
+
+    @asynccontextmanager
+    async def subscribe(self, channel):
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue(self.queue_size))
+        with self.lock:
+            self.subscribers.setdefault(channel, set()).add(subscriber)
+        try:
+            yield subscriber[1]
+        finally:
+            with self.lock:
+                channel_subscribers = self.subscribers.get(channel, set())
+                channel_subscribers.discard(subscriber)
+                if not channel_subscribers:
+                    self.subscribers.pop(channel, None)
+
+
+class RedisBroker:
+    """
+        Брокер сообщений на Redis pub/sub для нескольких процессов и узлов.
+    """
+
+    def __init__(self, url):
+        import redis
+
+        self.url = url
+        self.client = redis.Redis.from_url(url)
+
+    def publish(self, channel, message):
+        self.client.publish(channel, json.dumps(message))
+
+    @asynccontextmanager
+    async def subscribe(self, channel):
+        import redis.asyncio
+
+        client = redis.asyncio.Redis.from_url(self.url)
+        pubsub = client.pubsub(ignore_subscribe_messages=True)
+        await pubsub.subscribe(channel)
+        queue = asyncio.Queue(100)
+
+        async def reader():
+            async for raw in pubsub.listen():
+                if not queue.full():
+                    queue.put_nowait(json.loads(raw['data']))
+
+        task = asyncio.create_task(reader())
+        try:
+            yield queue
+        finally:
+            task.cancel()
+            await pubsub.unsubscribe(channel)
+            await pubsub.close()
+            await client.close()
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """
+        Возвращает брокер: Redis, если задан PUBSUB_REDIS_URL, иначе брокер в памяти процесса.
+    """
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            url = getattr(settings, 'PUBSUB_REDIS_URL', None)
+            _broker = RedisBroker(url) if url else InProcessBroker()
+        return _broker
+
+
+def comments_channel(blog_id):
+    return f'blog:{blog_id}:comments'
@@ -0,0 +1,225 @@
+import hashlib
+import threading
+from collections import defaultdict
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.db import connections, models, transaction
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from blog.cache import new_version
+
+stats = defaultdict(lambda: {'hits': 0, 'misses': 0, 'bypassed': 0})
+_lock = threading.Lock()
+
+
+def _count(label, outcome):
+    with _lock:
+        stats[label][outcome] += 1
+
+
+def get_stats():
+    """
+        Возвращает счетчики кэша запросов текущего процесса по моделям.
+
+        Returns:
+            dict: {модель: {'hits', 'misses', 'bypassed', 'hit_rate'}}.
+    """
+    with _lock:
+        result = {label: dict(counters) for label, counters in stats.items()}
+    for counters in result.values():
+        lookups = counters['hits'] + counters['misses']
+        counters['hit_rate'] = round(counters['hits'] / lookups, 3) if lookups else None
+    return result
+
+
+def is_enabled():
+    return getattr(settings, 'QUERYSET_CACHE_ENABLED', False)
+
+
+def table_version_key(table):
+    return f'qc:table:{table}'
+
+
+_tracked_models = set()
+
+
+def bump_tables(tables, using='default'):
+    """
+        Увеличивает версии таблиц, после чего все закэшированные выборки из них считаются устаревшими.
+
+        Внутри транзакции версии меняются сразу и повторно после ее фиксации: до фиксации параллельный
+        запрос видит старые данные и мог бы закэшировать их уже с новой версией.
+    """
+    if not is_enabled():
+        return
+    versions = {table_version_key(table): new_version() for table in tables}
+    cache.set_many(versions, None)
+    if connections[using].in_atomic_block:
+        transaction.on_commit(
+            lambda: cache.set_many({key: new_version() for key in versions}, None), using=using)
+
+
+def tracked_tables():
+    """
+        Возвращает таблицы моделей с CachingManager вместе с их промежуточными таблицами многие-ко-многим.
+    """
+    tables = set()
+    for model in _tracked_models:
+        tables.add(model._meta.db_table)
+        for field in model._meta.local_many_to_many:
+            tables.add(field.remote_field.through._meta.db_table)
+    return tables
+
+
+def all_tables():
+    return {model._meta.db_table for model in apps.get_models(include_auto_created=True)}
+
+
+class CachingQuerySet(models.QuerySet):
+    """
+        QuerySet с кэшированием результатов по SQL и версиям таблиц.
+
+        Чтение из кэша включается явно методом cached(). Ключ кэша - хэш SQL с параметрами, а вместе
+        с результатом хранятся версии всех таблиц запроса; любая запись в эти таблицы через QuerySet
+        (update, delete, bulk_create, bulk_update) или сохранение/удаление объекта меняет версию,
+        и результат перестает использоваться. Запросы к таблицам моделей без такого QuerySet,
+        с prefetch_related, select_for_update и внутри транзакций не кэшируются.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._cache_timeout = None
+
+    def cached(self, timeout=None):
+        """
+            Включает чтение результата этой выборки из кэша.
+
+            Args:
+                timeout (int, optional): Время жизни результата; по умолчанию QUERYSET_CACHE_TIMEOUT.
+        """
+        clone = self._chain()
+        clone._cache_timeout = timeout or getattr(settings, 'QUERYSET_CACHE_TIMEOUT', 300)
+        return clone
+
+    def _clone(self):
+        clone = super()._clone()
+        clone._cache_timeout = self._cache_timeout
+        return clone
+
+    def _cache_tables(self, sql):
+        quote = connections[self.db].ops.quote_name
+        tables = {table for table in all_tables() if quote(table) in sql}
+        if not tables or not tables <= tracked_tables():
+            return None
+        return sorted(tables)
+
+    def _fetch_all(self):
+        if self._result_cache is not None or not self._cache_timeout or not is_enabled():
+            return super()._fetch_all()
+
+        label = self.model._meta.label
+        connection = connections[self.db]
+        if self._prefetch_related_lookups or self.query.select_for_update or connection.in_atomic_block:
+            _count(label, 'bypassed')
+            return super()._fetch_all()
+        try:
+            sql, params = self.query.get_compiler(using=self.db).as_sql()
+        except EmptyResultSet:
+            return super()._fetch_all()
+        tables = self._cache_tables(sql)
+        if tables is None:
+            _count(label, 'bypassed')
+            return super()._fetch_all()
+
+        result_key = 'qc:result:' + hashlib.sha1(
+            f'{self.db}:{self._iterable_class.__name__}:{sql}:{params!r}'.encode()).hexdigest()
+        version_keys = [table_version_key(table) for table in tables]
+        found = cache.get_many(version_keys + [result_key])
+        versions = [found.get(key) for key in version_keys]
+        stored = found.get(result_key)
+
+        if stored is not None and None not in versions and stored[0] == versions:
+            _count(label, 'hits')
+            self._result_cache = stored[1]
+            # Объекты из кэша создаются без __init__: обработчики post_init (снимки состояния для подсчета
+            # ссылок на файлы и агрегатов выручки) вызываются явно
+            for obj in self._result_cache:
+                if isinstance(obj, models.Model):
+                    post_init.send(sender=obj.__class__, instance=obj)
+            return
+
+        _count(label, 'misses')
+        missing = {key: new_version() for key, version in zip(version_keys, versions) if version is None}
+        if missing:
+            cache.set_many(missing, None)
+            versions = [found.get(key) or missing[key] for key in version_keys]
+        super()._fetch_all()
+        cache.set(result_key, (versions, self._result_cache), self._cache_timeout)
+
+    def _bump(self):
+        bump_tables([self.model._meta.db_table], using=self.db)
+
+    def update(self, **kwargs):
+        rows = super().update(**kwargs)
+        self._bump()
+        return rows
+
+    update.alters_data = True
+
+    def delete(self):
+        result = super().delete()
+        self._bump()
+        return result
+
+    delete.alters_data = True
+
+    def bulk_create(self, *args, **kwargs):
+        objs = super().bulk_create(*args, **kwargs)
+        self._bump()
+        return objs
+
+    def bulk_update(self, *args, **kwargs):
+        rows = super().bulk_update(*args, **kwargs)
+        self._bump()
+        return rows
+
+    bulk_update.alters_data = True
+
+
+class CachingManager(models.Manager.from_queryset(CachingQuerySet)):
+    """
+        Менеджер с кэшированием выборок. Подключает сброс версий таблицы модели
+        при сохранении и удалении объектов.
+    """
+
+    def contribute_to_class(self, cls, name):
+        super().contribute_to_class(cls, name)
+        if not cls._meta.abstract:
+            track_model(cls)
+
+
+def _model_changed(sender, using='default', **kwargs):
+    bump_tables([sender._meta.db_table], using=using)
+
+
+def track_model(model):
+    """
+        Включает отслеживание изменений таблицы модели.
+    """
+    _tracked_models.add(model)
+    uid = f'querycache-{model._meta.label_lower}'
+    post_save.connect(_model_changed, sender=model, weak=False, dispatch_uid=uid)
+    post_delete.connect(_model_changed, sender=model, weak=False, dispatch_uid=uid)
+
+
+@receiver(m2m_changed)
+def relations_changed(sender, action, using='default', **kwargs):
+    """
+        Сбрасывает версию промежуточной таблицы при изменении связей многие-ко-многим отслеживаемых моделей.
+    """
+    if action in ('post_add', 'post_remove', 'post_clear') and sender._meta.db_table in tracked_tables():
+        bump_tables([sender._meta.db_table], using=using)
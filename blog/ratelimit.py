@@ -0,0 +1,248 @@
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.http import HttpResponse
+
+from users.models import normalize_phone
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+# Атомарный token bucket: состояние корзины хранится в hash, время берется с сервера Redis,
+# чтобы у всех воркеров были одинаковые часы
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    retry_after = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(retry_after)}
+"""
+
+stats = defaultdict(int)
+_stats_lock = threading.Lock()
+
+
+def count(name, value=1):
+    with _stats_lock:
+        stats[name] += value
+
+
+def get_stats():
+    """
+        Возвращает счетчики ограничителя текущего процесса.
+    """
+    with _stats_lock:
+        return dict(stats)
+
+
+def parse_rate(rate):
+    """
+        Разбирает ограничение вида '10/m' в (емкость корзины, скорость пополнения в секунду).
+    """
+    amount, period = rate.split('/')
+    amount = int(amount)
+    return amount, amount / PERIODS[period[0]]
+
+
+class LocalTokenBucket:
+    """
+        Token bucket в памяти процесса. Используется, если Redis не настроен или недоступен.
+        Количество корзин ограничено, самые давние вытесняются.
+    """
+
+    def __init__(self, max_keys=10000):
+        self.max_keys = max_keys
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def consume(self, key, capacity, rate):
+        now = time.monotonic()
+        with self.lock:
+            tokens, ts = self.buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - ts) * rate)
+            allowed = tokens >= 1
+            retry_after = 0 if allowed else (1 - tokens) / rate
+            self.buckets[key] = (tokens - 1 if allowed else tokens, now)
+            if len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+        return allowed, retry_after
+
+    def reset(self):
+        with self.lock:
+            self.buckets.clear()
+
+
+class RedisTokenBucket:
+    """
+        Распределенный token bucket на Redis, общий для всех воркеров.
+    """
+
+    def __init__(self, url):
+        import redis
+
+        self.client = redis.Redis.from_url(url, socket_timeout=0.05, socket_connect_timeout=0.05)
+        self.script = self.client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    def consume(self, key, capacity, rate):
+        allowed, retry_after = self.script(keys=[key], args=[capacity, rate])
+        return bool(allowed), float(retry_after)
+
+
+class RateLimiter:
+    """
+        Ограничитель частоты запросов: Redis, а при его отсутствии или ошибке - корзины в памяти процесса.
+    """
+
+    # После ошибки Redis не опрашивается столько секунд, чтобы не платить таймаутом за каждый запрос
+    retry_remote_after = 5
+
+    def __init__(self):
+        self.local = LocalTokenBucket()
+        self._remote = None
+        self._remote_url = None
+        self._remote_down_until = 0
+
+    @property
+    def remote(self):
+        url = getattr(settings, 'RATELIMIT_REDIS_URL', None)
+        if url != self._remote_url:
+            self._remote_url = url
+            self._remote = RedisTokenBucket(url) if url else None
+        return self._remote
+
+    def consume(self, key, rate):
+        """
+            Списывает один токен из корзины key.
+
+            Returns:
+                tuple: (разрешен ли запрос, через сколько секунд повторить).
+        """
+        capacity, refill = parse_rate(rate)
+        if self.remote is not None and time.monotonic() >= self._remote_down_until:
+            try:
+                return self.remote.consume(key, capacity, refill)
+            except Exception:
+                count('backend_errors')
+                self._remote_down_until = time.monotonic() + self.retry_remote_after
+        count('local_fallback')
+        return self.local.consume(key, capacity, refill)
+
+
+limiter = RateLimiter()
+
+
+def client_ip(request):
+    # Прокси дописывает адрес клиента в конец X-Forwarded-For, начало заголовка задает сам клиент.
+    # Берем адрес, записанный RATELIMIT_PROXY_COUNT-м доверенным прокси с конца
+    proxies = getattr(settings, 'RATELIMIT_PROXY_COUNT', 0)
+    if proxies:
+        forwarded = [hop.strip() for hop in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if hop.strip()]
+        if forwarded:
+            return forwarded[-min(proxies, len(forwarded))]
+    return request.META.get('REMOTE_ADDR')
+
+
+def session_user(request):
+    # Берем id из сессии, а не request.user: проверка не должна загружать пользователя из базы
+    session = getattr(request, 'session', None)
+    return session.get(SESSION_KEY) if session is not None else None
+
+
+def request_phone(request):
+    return normalize_phone(request.POST.get('phone') or request.POST.get('username')) or None
+
+
+KEY_FUNCTIONS = {
+    'ip': client_ip,
+    'user': session_user,
+    'phone': request_phone,
+}
+
+
+def check_limits(request, name, limits):
+    """
+        Проверяет все ограничения для запроса.
+
+        Args:
+            request (HttpRequest): Запрос.
+            name (str): Имя ограничиваемого маршрута.
+            limits (list): Пары (тип ключа, ограничение), например ('ip', '10/m').
+
+        Returns:
+            HttpResponse | None: Ответ 429, если ограничение превышено.
+    """
+    for kind, rate in limits:
+        value = KEY_FUNCTIONS[kind](request)
+        if value is None:
+            continue
+        allowed, retry_after = limiter.consume(f'rl:{name}:{kind}:{value}', rate)
+        if not allowed:
+            count(f'rejected:{name}')
+            response = HttpResponse('Слишком много запросов, попробуйте позже', status=429)
+            response['Retry-After'] = max(1, int(retry_after + 0.999))
+            return response
+    count(f'allowed:{name}')
+    return None
+
+
+def ratelimit(*limits, name=None, methods=('POST',)):
+    """
+        Декоратор ограничения частоты запросов для функции-представления.
+
+        Пример: @ratelimit(('ip', '10/m'), ('user', '5/m'))
+    """
+    def decorator(view_func):
+        limit_name = name or view_func.__name__
+
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if getattr(settings, 'RATELIMIT_ENABLED', True) and request.method in methods:
+                rejected = check_limits(request, limit_name, limits)
+                if rejected is not None:
+                    return rejected
+            return view_func(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class RateLimitMiddleware:
+    """
+        Ограничивает частоту запросов к маршрутам из настройки RATELIMITS.
+
+        Проверка выполняется в process_view, до вызова представления, поэтому отклоненный запрос
+        не доходит до хеширования пароля, запросов к базе и вызовов Stripe.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not getattr(settings, 'RATELIMIT_ENABLED', True):
+            return None
+        if request.method not in getattr(settings, 'RATELIMIT_METHODS', ('POST',)):
+            return None
+        name = request.resolver_match.view_name
+        limits = getattr(settings, 'RATELIMITS', {}).get(name)
+        if not limits:
+            return None
+        return check_limits(request, name, limits)
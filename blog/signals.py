@@ -0,0 +1,67 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from blog.cache import bump_version, bump_versions
+from blog.models import Blog, Comment
+from users.models import User
+
+# Поля автора, которые выводятся в списке комментариев (аватар и User.__str__)
+COMMENT_AUTHOR_FIELDS = {'avatar', 'username', 'email', 'phone'}
+
+
+@receiver(post_save, sender=Blog)
+@receiver(post_delete, sender=Blog)
+def blog_changed(sender, instance, **kwargs):
+    """
+        Сбрасывает закэшированные карточки блога.
+    """
+    bump_version('blog', instance.pk)
+
+
+@receiver(m2m_changed, sender=Blog.comments.through)
+def blog_comments_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+        Сбрасывает закэшированный список комментариев при добавлении или удалении комментария из блога.
+    """
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        bump_version('comments', instance.pk)
+    else:
+        for blog_id in pk_set or ():
+            bump_version('comments', blog_id)
+
+
+@receiver(pre_delete, sender=Comment)
+def comment_deleting(sender, instance, **kwargs):
+    # После удаления связи с блогами уже не найти, поэтому запоминаем их заранее
+    instance._blog_ids = list(Blog.objects.filter(comments=instance).values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_changed(sender, instance, **kwargs):
+    """
+        Сбрасывает закэшированные списки комментариев блогов, в которых есть измененный комментарий.
+    """
+    if kwargs.get('created'):
+        # Новый комментарий еще не связан с блогом, список сбросит m2m_changed
+        return
+    blog_ids = getattr(instance, '_blog_ids', None)
+    if blog_ids is None:
+        blog_ids = Blog.objects.filter(comments=instance).values_list('pk', flat=True)
+    for blog_id in blog_ids:
+        bump_version('comments', blog_id)
+
+
+@receiver(post_save, sender=User)
+def comment_author_changed(sender, instance, created, update_fields=None, **kwargs):
+    """
+        Сбрасывает закэшированные списки комментариев блогов, где комментировал пользователь, после смены его
+        аватара или данных, выводимых рядом с комментарием. Обновление last_login при входе их не затрагивает.
+    """
+    if created or (update_fields is not None and not COMMENT_AUTHOR_FIELDS & set(update_fields)):
+        return
+    blog_ids = set(Blog.objects.filter(comments__user=instance).values_list('pk', flat=True))
+    if blog_ids:
+        bump_versions('comments', blog_ids)
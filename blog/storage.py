@@ -0,0 +1,213 @@
+import hashlib
+import os
+import tempfile
+from datetime import timedelta
+
+from django.apps import apps
+from django.core.files.storage import FileSystemStorage
+from django.db.models import DEFERRED, F
+from django.db.models.signals import post_delete, post_init, post_save
+from django.utils import timezone
+from django.utils.deconstruct import deconstructible
+
+BLOB_DIR = 'blobs'
+GC_GRACE_PERIOD = timedelta(hours=1)
+
+
+def blob_model():
+    # Модель берется из реестра приложений: модуль хранилища импортируется при загрузке моделей
+    return apps.get_model('blog', 'MediaBlob')
+
+
+def blob_name(digest, extension):
+    """
+        Возвращает путь блоба по SHA-256 содержимого: blobs/ab/cd/abcd...ext.
+    """
+    return f'{BLOB_DIR}/{digest[:2]}/{digest[2:4]}/{digest}{extension.lower()}'
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+        Файловое хранилище с адресацией по содержимому.
+
+        Имя файла - SHA-256 его содержимого, поэтому одинаковые файлы, загруженные в разные поля
+        и разными пользователями, хранятся на диске один раз. Для каждого блоба ведется счетчик ссылок
+        (MediaBlob), а файлы без ссылок удаляются сборщиком мусора (команда media_blobs --gc).
+    """
+
+    def _save(self, name, content):
+        """
+            Потоково пишет содержимое во временный файл, одновременно считая хэш,
+            и атомарно переносит его на место блоба, если такого блоба еще нет.
+        """
+        directory = self.path(BLOB_DIR)
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.part')
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                if hasattr(content, 'seek') and content.seekable():
+                    content.seek(0)
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    temp_file.write(chunk)
+                    size += len(chunk)
+
+            name = blob_name(digest.hexdigest(), os.path.splitext(name)[1])
+            full_path = self.path(name)
+            if os.path.exists(full_path):
+                os.remove(temp_path)
+            else:
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                os.chmod(temp_path, self.file_permissions_mode or 0o644)
+                os.replace(temp_path, full_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        # Отметка времени защищает свежий блоб от сборщика мусора, пока запись с ссылкой на него не сохранена
+        blob, created = blob_model().objects.get_or_create(name=name, defaults={'size': size})
+        if not created:
+            blob_model().objects.filter(pk=blob.pk).update(updated_at=timezone.now())
+        return name
+
+    def get_available_name(self, name, max_length=None):
+        # Итоговое имя определяется содержимым в _save, исходное имя нужно только ради расширения
+        return name
+
+    def delete(self, name):
+        """
+            Удаляет файл, только если на него не осталось ссылок.
+        """
+        if name and not blob_model().objects.filter(name=name, ref_count__gt=0).exists():
+            super().delete(name)
+
+
+media_storage = ContentAddressedStorage()
+
+
+def change_references(name, delta):
+    """
+        Изменяет счетчик ссылок на файл.
+
+        Args:
+            name (str): Имя файла в хранилище.
+            delta (int): Изменение счетчика.
+    """
+    if not name:
+        return
+    MediaBlob = blob_model()
+    if not MediaBlob.objects.filter(name=name).update(ref_count=F('ref_count') + delta, updated_at=timezone.now()):
+        MediaBlob.objects.create(name=name, ref_count=max(delta, 0))
+
+
+def track_references(model, field_name):
+    """
+        Подключает подсчет ссылок на файлы поля модели.
+
+        Как и для агрегатов выручки, при загрузке объекта запоминается имя файла,
+        а при сохранении и удалении к счетчикам применяется только разница.
+    """
+    uid = f'media-refs-{model._meta.label_lower}-{field_name}'
+    stored = f'_{field_name}_stored'
+
+    def loaded(sender, instance, **kwargs):
+        # Отложенное поле не читаем, чтобы не делать лишний запрос на каждый объект
+        value = instance.__dict__.get(field_name, DEFERRED) if instance.pk else None
+        instance.__dict__[stored] = getattr(value, 'name', value) or None
+
+    def saved(sender, instance, **kwargs):
+        previous = instance.__dict__.get(stored)
+        if previous is DEFERRED:
+            return
+        current = getattr(instance, field_name).name or None
+        if previous != current:
+            change_references(previous, -1)
+            change_references(current, 1)
+        instance.__dict__[stored] = current
+
+    def deleted(sender, instance, **kwargs):
+        previous = instance.__dict__.get(stored)
+        if previous is not DEFERRED:
+            change_references(previous, -1)
+
+    post_init.connect(loaded, sender=model, weak=False, dispatch_uid=uid)
+    post_save.connect(saved, sender=model, weak=False, dispatch_uid=uid)
+    post_delete.connect(deleted, sender=model, weak=False, dispatch_uid=uid)
+
+
+def tracked_fields():
+    """
+        Возвращает пары (модель, имя поля) всех файловых полей, использующих хранилище с адресацией по содержимому.
+    """
+    return [
+        (model, field.name)
+        for model in apps.get_models()
+        for field in model._meta.get_fields()
+        if isinstance(getattr(field, 'storage', None), ContentAddressedStorage)
+    ]
+
+
+def recount_references():
+    """
+        Пересчитывает счетчики ссылок по фактическим значениям полей.
+        Нужен после массовых изменений в обход сигналов (update, bulk_create, миграции).
+    """
+    counts = {}
+    for model, field_name in tracked_fields():
+        names = model._default_manager.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+        for name in names.values_list(field_name, flat=True).iterator():
+            counts[name] = counts.get(name, 0) + 1
+
+    MediaBlob = blob_model()
+    MediaBlob.objects.exclude(name__in=list(counts)).update(ref_count=0)
+    for name, count in counts.items():
+        MediaBlob.objects.update_or_create(name=name, defaults={'ref_count': count})
+    return counts
+
+
+def adopt_legacy_files(storage=media_storage):
+    """
+        Переносит файлы, загруженные до появления хранилища, в блобы и обновляет ссылки на них.
+        Одинаковые файлы из разных каталогов превращаются в один блоб.
+
+        Returns:
+            int: Количество перенесенных ссылок.
+    """
+    adopted = 0
+    for model, field_name in tracked_fields():
+        rows = model._default_manager.exclude(**{f'{field_name}__startswith': f'{BLOB_DIR}/'}).exclude(
+            **{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+        for pk, name in rows.values_list('pk', field_name).iterator():
+            if not storage.exists(name):
+                continue
+            with storage.open(name) as legacy_file:
+                new_name = storage.save(name, legacy_file)
+            model._default_manager.filter(pk=pk).update(**{field_name: new_name})
+            # Старый файл остается без ссылок и будет удален сборщиком мусора
+            blob_model().objects.get_or_create(name=name)
+            adopted += 1
+    recount_references()
+    return adopted
+
+
+def collect_garbage(grace_period=GC_GRACE_PERIOD, storage=media_storage):
+    """
+        Удаляет блобы без ссылок, которые не менялись дольше grace_period.
+
+        Returns:
+            int: Количество удаленных файлов.
+    """
+    MediaBlob = blob_model()
+    threshold = timezone.now() - grace_period
+    removed = 0
+    for blob in MediaBlob.objects.filter(ref_count__lte=0, updated_at__lt=threshold).iterator():
+        # Условное удаление: если за это время на блоб сослались, строка останется
+        deleted, _ = MediaBlob.objects.filter(pk=blob.pk, ref_count__lte=0, updated_at__lt=threshold).delete()
+        if deleted:
+            storage.delete(blob.name)
+            removed += 1
+    return removed
@@ -0,0 +1,75 @@
+from django import template
+
+from blog.cache import fetch_fragments, store_fragment
+
+register = template.Library()
+
+PREFETCHED = 'prefetched_fragments'
+
+
+class PrefetchFragmentsNode(template.Node):
+
+    def __init__(self, namespace, objects, name):
+        self.namespace, self.objects, self.name = namespace, objects, name
+
+    def render(self, context):
+        namespace, name = self.namespace.resolve(context), self.name.resolve(context)
+        pks = [obj.pk for obj in self.objects.resolve(context) or ()]
+        prefetched = context.render_context.setdefault(PREFETCHED, {})
+        prefetched[(namespace, name)] = fetch_fragments(namespace, name, pks)
+        return ''
+
+
+class FragmentNode(template.Node):
+
+    def __init__(self, nodelist, namespace, pk, name, vary):
+        self.nodelist = nodelist
+        self.namespace, self.pk, self.name, self.vary = namespace, pk, name, vary
+
+    def render(self, context):
+        namespace, pk, name = self.namespace.resolve(context), self.pk.resolve(context), self.name.resolve(context)
+        variant = ':'.join(str(var.resolve(context)) for var in self.vary) or 'default'
+
+        prefetched = context.render_context.setdefault(PREFETCHED, {}).setdefault((namespace, name), {})
+        if pk not in prefetched:
+            prefetched.update(fetch_fragments(namespace, name, [pk]))
+        version, entry = prefetched[pk]
+        if entry and variant in entry:
+            return entry[variant]
+
+        html = self.nodelist.render(context)
+        entry = dict(entry or {}, **{variant: html})
+        store_fragment(namespace, name, pk, version, entry)
+        prefetched[pk] = (version, entry)
+        return html
+
+
+@register.tag
+def prefetch_fragments(parser, token):
+    """
+        Загружает версии и фрагменты для списка объектов одним обращением к кэшу.
+
+        Использование: {% prefetch_fragments 'blog' object_list 'list_card' %} перед циклом,
+        в котором выводятся фрагменты {% fragment 'blog' object.pk 'list_card' ... %}.
+    """
+    bits = token.split_contents()
+    if len(bits) != 4:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' принимает пространство версий, список объектов и имя фрагмента")
+    return PrefetchFragmentsNode(*(parser.compile_filter(bit) for bit in bits[1:]))
+
+
+@register.tag
+def fragment(parser, token):
+    """
+        Кэширует фрагмент шаблона до изменения версии объекта.
+
+        Использование: {% fragment 'blog' object.pk 'list_card' user.is_authenticated %}...{% endfragment %}.
+        Дополнительные аргументы задают вариант фрагмента (например, для гостя и для вошедшего пользователя).
+    """
+    bits = token.split_contents()
+    if len(bits) < 4:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' принимает пространство версий, идентификатор и имя фрагмента")
+    nodelist = parser.parse(('endfragment',))
+    parser.delete_first_token()
+    namespace, pk, name, *vary = (parser.compile_filter(bit) for bit in bits[1:])
+    return FragmentNode(nodelist, namespace, pk, name, vary)
@@ -1,6 +1,40 @@
+import asyncio
+import io
+import json
+import tempfile
+import threading
+import time
+import zipfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+from asgiref.sync import async_to_sync, sync_to_async
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.http import HttpResponse
+from django.core.cache import cache
+from django.template import Context, Template
+from django.test import AsyncClient, Client, RequestFactory, SimpleTestCase, TransactionTestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.cache import get_cache_key
+from PIL import Image
+from blog import importer, pagecache, querycache, tiered_cache
+from blog.admin import BlogAdmin
+from blog.bulk_actions import resume_stale_jobs
 from blog.forms import BlogForm
-from blog.models import Blog, Comment
+from blog.importer import import_archive
+from blog.pagecache import SingleFlight, should_recompute_early, stampede_cache_page
+from blog.models import Blog, BlogAttachment, BulkActionJob, ChunkedUpload, Comment, MediaBlob
+from blog.pubsub import InProcessBroker
+from blog.storage import collect_garbage, media_storage, recount_references
+from blog.tiered_cache import MISSING, LocalCache, LocalTier, TieredRedisCache
+from blog.uploads import HEADER_PROBE_SIZE
+from blog.views import comment_events, create_comment
+from subscriptions.models import Subscription
+from users.models import User
 from users.tests import SetupTestCase
 
 
@@ -39,6 +73,12 @@ class BlogListViewTest(SetupTestCase):
         self.assertEqual(response.status_code, 200)
         self.assertTemplateUsed(response, 'blog/blog_list.html')
 
+    def test_blog_list_view_for_anonymous(self):
+        Blog.objects.create(title='Blog 1', description='Description 1', published_on=True)
+        response = self.client.get(reverse('blog:blog_list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Description 1')
+
 
 class BlogDetailViewTest(SetupTestCase):
 
@@ -139,3 +179,839 @@ class BlogDeleteViewTest(SetupTestCase):
         response = self.client.post(self.url)
         self.assertEqual(response.status_code, 302)
         self.assertTrue(Blog.objects.filter(pk=self.blog.pk).exists())
+
+
+class BlogAdminChangeListTest(SetupTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.login(phone='123456789', password='testpass123')
+        self.blogs = [Blog.objects.create(title=f'Blog {i}', description='x' * 500, user=self.user) for i in range(3)]
+        self.url = reverse('admin:blog_blog_changelist')
+
+    def test_keyset_pagination(self):
+        with mock.patch.object(BlogAdmin, 'list_per_page', 2):
+            response = self.client.get(self.url)
+            self.assertEqual(response.status_code, 200)
+            cl = response.context['cl']
+            self.assertEqual([blog.pk for blog in cl.result_list], [self.blogs[2].pk, self.blogs[1].pk])
+            self.assertIn(f'after={self.blogs[1].pk}', cl.next_cursor_url)
+
+            response = self.client.get(self.url, {'after': self.blogs[1].pk})
+            cl = response.context['cl']
+            self.assertEqual([blog.pk for blog in cl.result_list], [self.blogs[0].pk])
+            self.assertIsNone(cl.next_cursor_url)
+
+    def test_description_is_truncated(self):
+        response = self.client.get(self.url)
+        self.assertNotContains(response, 'x' * 500)
+
+    def test_prefix_search(self):
+        response = self.client.get(self.url, {'q': '"Blog 1"'})
+        self.assertEqual([blog.pk for blog in response.context['cl'].result_list], [self.blogs[1].pk])
+
+
+@override_settings(BULK_ACTIONS_INLINE=True, BULK_ACTION_CHUNK_SIZE=2)
+class BulkActionTest(SetupTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.login(phone='123456789', password='testpass123')
+        self.blogs = [Blog.objects.create(title=f'Blog {i}', user=self.user) for i in range(5)]
+        self.url = reverse('admin:blog_blog_changelist')
+
+    def run_action(self, action, **extra):
+        data = {'action': action, '_selected_action': [blog.pk for blog in self.blogs], **extra}
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(self.url, data)
+
+    def test_republish_runs_in_chunks(self):
+        saved = []
+        handler = lambda sender, instance, **kwargs: saved.append(instance.pk)  # noqa: E731
+        post_save.connect(handler, sender=Blog)
+        try:
+            response = self.run_action('republish')
+        finally:
+            post_save.disconnect(handler, sender=Blog)
+
+        job = BulkActionJob.objects.get()
+        self.assertRedirects(response, reverse('admin:blog_bulkactionjob_status', args=[job.pk]))
+        self.assertEqual(job.status, BulkActionJob.STATUS_DONE)
+        self.assertEqual(job.processed, 5)
+        self.assertEqual(Blog.objects.filter(published_on=True).count(), 5)
+        self.assertEqual(sorted(saved), sorted(blog.pk for blog in self.blogs))
+
+    def test_change_price_asks_for_price(self):
+        response = self.client.post(self.url, {'action': 'change_price',
+                                               '_selected_action': [blog.pk for blog in self.blogs]})
+        self.assertTemplateUsed(response, 'admin/blog/bulk_price_form.html')
+
+        self.run_action('change_price', apply='1', price=42)
+        self.assertEqual(Blog.objects.filter(price=42).count(), 5)
+
+    def test_delete_in_background(self):
+        self.run_action('delete_in_background')
+        self.assertFalse(Blog.objects.exists())
+
+    def test_stale_running_job_is_resumed(self):
+        job = BulkActionJob.objects.create(action='republish', object_ids=[blog.pk for blog in self.blogs],
+                                           total=5, processed=2, chunk_size=2, status=BulkActionJob.STATUS_RUNNING,
+                                           heartbeat_at=timezone.now())
+        self.assertEqual(resume_stale_jobs(), 0)
+
+        BulkActionJob.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - timedelta(minutes=10))
+        self.assertEqual(resume_stale_jobs(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, BulkActionJob.STATUS_DONE)
+        self.assertEqual(job.processed, 5)
+        self.assertEqual(Blog.objects.filter(published_on=True).count(), 3)
+        self.assertEqual(resume_stale_jobs(), 0)
+
+    def test_resume_command_skips_jobs_with_live_worker(self):
+        job = BulkActionJob.objects.create(action='republish', object_ids=[blog.pk for blog in self.blogs],
+                                           total=5, processed=2, chunk_size=2, status=BulkActionJob.STATUS_RUNNING,
+                                           heartbeat_at=timezone.now())
+        call_command('run_bulk_actions', resume=True, stdout=StringIO())
+        job.refresh_from_db()
+        self.assertEqual(job.status, BulkActionJob.STATUS_RUNNING)
+        self.assertEqual(job.processed, 2)
+
+        BulkActionJob.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - timedelta(minutes=10))
+        call_command('run_bulk_actions', resume=True, stdout=StringIO())
+        job.refresh_from_db()
+        self.assertEqual(job.status, BulkActionJob.STATUS_DONE)
+        self.assertEqual(job.processed, 5)
+
+    def test_status_page(self):
+        self.run_action('unpublish')
+        job = BulkActionJob.objects.get()
+        url = reverse('admin:blog_bulkactionjob_status', args=[job.pk])
+        self.assertContains(self.client.get(url), '100%')
+        self.assertEqual(self.client.get(url, {'format': 'json'}).json()['processed'], 5)
+
+
+def make_archive(rows, files=None):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        archive.writestr('manifest.jsonl', '\n'.join(row if isinstance(row, str) else json.dumps(row) for row in rows))
+        for name, content in (files or {}).items():
+            archive.writestr(name, content)
+    buffer.seek(0)
+    return buffer
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), BULK_ACTIONS_INLINE=True)
+class BlogImportTest(SetupTestCase):
+
+    def test_import_creates_blogs_with_unique_slugs(self):
+        Blog.objects.create(title='Привет', user=self.user)
+        archive = make_archive([
+            {'title': 'Привет', 'description': 'Текст', 'price': 10},
+            {'title': 'Привет', 'description': 'Текст', 'image': 'images/cover.png'},
+        ], {'images/cover.png': b'png'})
+
+        report = import_archive(archive, user=self.user, batch_size=1)
+
+        self.assertEqual(report.created, 2)
+        self.assertEqual(sorted(Blog.objects.values_list('slug', flat=True)), ['privet', 'privet-2', 'privet-3'])
+        imported = Blog.objects.get(slug='privet-3')
+        self.assertEqual(imported.user, self.user)
+        self.assertEqual(imported.image.read(), b'png')
+        self.assertTrue(Blog.objects.get(slug='privet-2').is_paid)
+
+    def test_invalid_rows_are_reported(self):
+        archive = make_archive([
+            '{broken',
+            {'description': 'Без заголовка'},
+            {'title': 'Отрицательная цена', 'description': 'Текст', 'price': -1},
+            {'title': 'Без картинки', 'description': 'Текст', 'image': 'missing.png'},
+            {'title': 'Верная запись', 'description': 'Текст'},
+        ])
+
+        report = import_archive(archive)
+
+        self.assertEqual(report.created, 1)
+        self.assertEqual([line_no for line_no, _ in report.errors], [1, 2, 3, 4])
+
+    def test_progress_is_saved_with_batch(self):
+        archive = make_archive([{'title': f'Запись {i}', 'description': 'Текст'} for i in range(3)])
+
+        def progress(processed):
+            self.assertTrue(transaction.get_connection().in_atomic_block)
+            if processed == 2:
+                raise RuntimeError('crash')
+
+        with self.assertRaises(RuntimeError):
+            import_archive(archive, batch_size=1, progress=progress)
+        # Пачка, прогресс которой не сохранен, не создана
+        self.assertEqual(Blog.objects.filter(title__startswith='Запись').count(), 1)
+
+    def test_slug_taken_concurrently_is_retried_per_row(self):
+        archive = make_archive([{'title': 'Гонка', 'description': 'Текст'}, {'title': 'Другая', 'description': 'Текст'}])
+        allocate = importer.allocate_slugs
+
+        def allocate_then_take(blogs):
+            allocate(blogs)
+            if not Blog.objects.filter(slug='gonka').exists():
+                Blog.objects.create(title='Гонка', user=self.user)
+
+        with mock.patch('blog.importer.allocate_slugs', allocate_then_take):
+            report = import_archive(archive)
+
+        self.assertEqual(report.created, 2)
+        self.assertEqual(report.errors, [])
+        self.assertEqual(sorted(Blog.objects.values_list('slug', flat=True)), ['drugaja', 'gonka', 'gonka-2'])
+
+    def test_admin_import_runs_in_background(self):
+        self.client.login(phone='123456789', password='testpass123')
+        upload = SimpleUploadedFile('posts.zip', make_archive([{'title': 'Импорт', 'description': 'Текст'}]).read())
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('admin:blog_blog_import'), {'archive': upload})
+
+        job = BulkActionJob.objects.get(action='import')
+        self.assertRedirects(response, reverse('admin:blog_bulkactionjob_status', args=[job.pk]))
+        job.refresh_from_db()
+        self.assertEqual(job.status, BulkActionJob.STATUS_DONE)
+        self.assertEqual(job.params['created'], 1)
+        self.assertTrue(Blog.objects.filter(title='Импорт').exists())
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ContentAddressedStorageTest(SetupTestCase):
+
+    def upload(self, name, content=b'image'):
+        return SimpleUploadedFile(name, content)
+
+    def test_identical_files_are_stored_once(self):
+        blog = Blog.objects.create(title='Первый', user=self.user, image=self.upload('a.JPG'))
+        self.user.avatar = self.upload('b.jpg')
+        self.user.save()
+
+        self.assertEqual(blog.image.name, self.user.avatar.name)
+        self.assertTrue(blog.image.name.startswith('blobs/'))
+        self.assertTrue(blog.image.name.endswith('.jpg'))
+        self.assertEqual(MediaBlob.objects.get(name=blog.image.name).ref_count, 2)
+
+    def test_unreferenced_blobs_are_collected(self):
+        blog = Blog.objects.create(title='Первый', user=self.user, image=self.upload('a.jpg', b'old'))
+        old_name = blog.image.name
+        blog = Blog.objects.get(pk=blog.pk)
+        blog.image = self.upload('a.jpg', b'new')
+        blog.save()
+
+        self.assertEqual(MediaBlob.objects.get(name=old_name).ref_count, 0)
+        self.assertEqual(collect_garbage(grace_period=timedelta(hours=1)), 0)
+        self.assertEqual(collect_garbage(grace_period=timedelta(0)), 1)
+        self.assertFalse(media_storage.exists(old_name))
+        self.assertTrue(media_storage.exists(blog.image.name))
+
+        Blog.objects.get(pk=blog.pk).delete()
+        self.assertEqual(collect_garbage(grace_period=timedelta(0)), 1)
+        self.assertFalse(media_storage.exists(blog.image.name))
+
+    def test_recount_references(self):
+        blog = Blog.objects.create(title='Первый', user=self.user, image=self.upload('a.jpg'))
+        MediaBlob.objects.update(ref_count=5)
+        self.assertEqual(recount_references(), {blog.image.name: 1, 'avatar.jpg': 1})
+        self.assertEqual(MediaBlob.objects.get(name=blog.image.name).ref_count, 1)
+
+
+def make_png(width=10, height=10):
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height)).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), UPLOAD_MAX_IMAGE_SIDE=100, UPLOAD_MAX_IMAGE_SIZE=HEADER_PROBE_SIZE * 2)
+class ImageUploadTest(SetupTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.login(phone='123456789', password='testpass123')
+
+    def post_blog(self, image):
+        return self.client.post(reverse('blog:blog_create'), {
+            'title': 'С картинкой', 'description': 'Текст', 'price': 0, 'image': image})
+
+    def test_valid_image_is_streamed_and_saved(self):
+        response = self.post_blog(SimpleUploadedFile('a.png', make_png(), content_type='image/png'))
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(Blog.objects.get(title='С картинкой').image.name.startswith('blobs/'))
+
+    def test_oversized_dimensions_are_rejected_from_header(self):
+        response = self.post_blog(SimpleUploadedFile('a.png', make_png(1000, 10), content_type='image/png'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Слишком большое разрешение', str(response.context['form'].errors['image']))
+        self.assertFalse(Blog.objects.exists())
+
+    def test_oversized_file_is_rejected(self):
+        content = make_png() + b'0' * HEADER_PROBE_SIZE * 2
+        response = self.post_blog(SimpleUploadedFile('a.png', content, content_type='image/png'))
+        self.assertIn('Размер файла превышает', str(response.context['form'].errors['image']))
+
+    def test_chunked_upload_with_resume(self):
+        content = make_png()
+        response = self.client.post(reverse('blog:upload_create'), {'filename': 'a.png', 'size': len(content)},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        url = response.json()['url']
+
+        self.client.post(url, content[:20], content_type='application/octet-stream', HTTP_UPLOAD_OFFSET='0')
+        # Повтор части с устаревшим смещением отклоняется, клиент узнает текущее смещение
+        response = self.client.post(url, content, content_type='application/octet-stream', HTTP_UPLOAD_OFFSET='0')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.client.get(url).json()['offset'], 20)
+
+        response = self.client.post(url, content[20:], content_type='application/octet-stream',
+                                    HTTP_UPLOAD_OFFSET='20')
+        self.assertEqual(response.json()['status'], ChunkedUpload.STATUS_COMPLETE)
+
+        upload = ChunkedUpload.objects.get()
+        data = {'title': 'По частям', 'description': 'Текст', 'price': 0, 'image_upload': upload.pk}
+        other = User.objects.create(phone='+79990000003')
+        self.assertFalse(BlogForm(data=data, user=other).is_valid())
+
+        form = BlogForm(data=data, user=self.user)
+        self.assertTrue(form.is_valid(), form.errors)
+        form.instance.user = self.user
+        blog = form.save()
+        self.assertEqual(blog.image.read(), content)
+        # Загрузка использована и не может быть прикреплена повторно
+        self.assertFalse(ChunkedUpload.objects.exists())
+        self.assertFalse(BlogForm(data=data, user=self.user).is_valid())
+
+    def test_chunked_upload_rejects_bad_image(self):
+        response = self.client.post(reverse('blog:upload_create'), {'filename': 'a.png', 'size': 10},
+                                    content_type='application/json')
+        response = self.client.post(response.json()['url'], b'0' * 10, content_type='application/octet-stream',
+                                    HTTP_UPLOAD_OFFSET='0')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(ChunkedUpload.objects.get().status, ChunkedUpload.STATUS_FAILED)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ProtectedMediaTest(SetupTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.author = User(phone='+79990000001')
+        self.author.save()
+        self.reader = User(phone='+79990000002')
+        self.reader.set_password('readerpass123')
+        self.reader.save()
+        self.paid = Blog.objects.create(title='Платный', user=self.author, published_on=True, is_paid=True, price=10,
+                                        image=SimpleUploadedFile('paid.png', make_png(10, 10)))
+        self.free = Blog.objects.create(title='Бесплатный', user=self.author, published_on=True,
+                                        image=SimpleUploadedFile('free.png', make_png(20, 20)))
+        self.client.login(phone='+79990000002', password='readerpass123')
+
+    def test_paid_image_requires_subscription(self):
+        url = self.paid.image.url
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        Subscription.objects.create(user=self.reader, blog=self.paid, status=True)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), make_png(10, 10))
+        self.assertIn('private', response['Cache-Control'])
+
+    def test_free_image_and_unknown_files(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(self.free.image.url).status_code, 200)
+        self.assertEqual(self.client.get('/media/blobs/unknown.png').status_code, 404)
+        self.assertEqual(self.client.get('/media/../config/settings.py').status_code, 404)
+
+    @override_settings(MEDIA_ACCEL_REDIRECT=True)
+    def test_transfer_is_delegated_to_nginx(self):
+        self.client.force_login(self.author)
+        response = self.client.get(self.paid.image.url)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.paid.image.name}')
+        self.assertEqual(response.content, b'')
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class BlogAttachmentTest(SetupTestCase):
+
+    content = bytes(range(256)) * 4
+
+    def setUp(self):
+        super().setUp()
+        self.reader = User(phone='+79990000002')
+        self.reader.save()
+        self.blog = Blog.objects.create(title='Курс', user=self.user, published_on=True, is_paid=True, price=10)
+        self.attachment = BlogAttachment.objects.create(
+            blog=self.blog, title='Урок 1', file=SimpleUploadedFile('lesson.mp4', self.content))
+        self.url = self.attachment.get_absolute_url()
+
+    def test_metadata_and_entitlement(self):
+        self.assertEqual(self.attachment.size, len(self.content))
+        self.assertEqual(self.attachment.content_type, 'video/mp4')
+
+        self.client.force_login(self.reader)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        BlogAttachment.objects.filter(pk=self.attachment.pk).update(is_free=True)
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    def test_range_requests(self):
+        self.client.force_login(self.user)
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(self.content)}')
+        self.assertEqual(b''.join(response.streaming_content), self.content[10:20])
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-4')
+        self.assertEqual(b''.join(response.streaming_content), self.content[-4:])
+
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={len(self.content)}-')
+        self.assertEqual(response.status_code, 416)
+
+    def test_asgi_response_streams_file_in_chunks(self):
+        async def download(headers=None):
+            client = AsyncClient()
+            await sync_to_async(client.force_login)(self.user)
+            response = await client.get(self.url, headers=headers)
+            return response, b''.join([chunk async for chunk in response.streaming_content])
+
+        response, content = async_to_sync(download)()
+        self.assertTrue(response.is_async)
+        self.assertEqual(response['Content-Length'], str(len(self.content)))
+        self.assertEqual(content, self.content)
+
+        response, content = async_to_sync(download)({'Range': 'bytes=10-19'})
+        self.assertEqual(response.status_code, 206)
+        self.assertTrue(response.is_async)
+        self.assertEqual(content, self.content[10:20])
+
+    def test_if_range_with_stale_etag_returns_whole_file(self):
+        self.client.force_login(self.user)
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=etag)
+        self.assertEqual(response.status_code, 206)
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+
+    def test_author_adds_attachment_from_chunked_upload(self):
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('blog:upload_create'),
+                                    {'filename': 'book.pdf', 'size': 5, 'kind': 'file'}, content_type='application/json')
+        self.client.post(response.json()['url'], b'%PDF-', content_type='application/octet-stream',
+                         HTTP_UPLOAD_OFFSET='0')
+        upload = ChunkedUpload.objects.get()
+
+        response = self.client.post(reverse('blog:attachment_create', args=[self.blog.slug]),
+                                    {'title': 'Книга', 'file_upload': upload.pk})
+        self.assertRedirects(response, self.blog.get_absolute_url(), fetch_redirect_response=False)
+        attachment = BlogAttachment.objects.get(title='Книга')
+        self.assertEqual(attachment.content_type, 'application/pdf')
+        self.assertEqual(attachment.file.read(), b'%PDF-')
+
+    def post_attachment(self, name, content, content_type, client=None):
+        client = client or self.client
+        client.force_login(self.user)
+        return client.post(reverse('blog:attachment_create', args=[self.blog.slug]), {
+            'title': 'Книга', 'file': SimpleUploadedFile(name, content, content_type=content_type)})
+
+    @override_settings(UPLOAD_MAX_ATTACHMENT_SIZE=1024)
+    def test_oversized_attachment_is_rejected(self):
+        response = self.post_attachment('book.pdf', b'%PDF-' + b'0' * 2048, 'application/pdf')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Размер файла превышает', str(response.context['form'].errors['file']))
+        self.assertFalse(BlogAttachment.objects.filter(title='Книга').exists())
+
+    @override_settings(UPLOAD_MAX_FILE_SIZE=1024, UPLOAD_MAX_IMAGE_SIZE=1024, UPLOAD_MAX_IMAGE_SIDE=100,
+                       UPLOAD_MAX_ATTACHMENT_SIZE=HEADER_PROBE_SIZE)
+    def test_attachment_uses_attachment_limit(self):
+        content = b'%PDF-' + b'0' * 2048
+        response = self.post_attachment('book.pdf', content, 'application/pdf')
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(BlogAttachment.objects.get(title='Книга').file.read(), content)
+
+        # Изображение во вложении - обычный файл: ограничения размеров изображения к нему не применяются
+        image = make_png(1000, 10)
+        response = self.post_attachment('scan.png', image, 'image/png')
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(BlogAttachment.objects.get(content_type='image/png').size, len(image))
+
+    def test_attachment_form_checks_csrf(self):
+        response = self.post_attachment('book.pdf', b'%PDF-', 'application/pdf', Client(enforce_csrf_checks=True))
+        self.assertEqual(response.status_code, 403)
+
+
+class FragmentCacheTest(SetupTestCase):
+
+    template = Template(
+        "{% load fragments %}{% prefetch_fragments 'blog' blogs 'test' %}"
+        "{% for blog in blogs %}{% fragment 'blog' blog.pk 'test' %}{{ blog.title }};{% endfragment %}{% endfor %}")
+
+    def setUp(self):
+        super().setUp()
+        self.blogs = [Blog.objects.create(title=f'Blog {i}', user=self.user) for i in range(3)]
+
+    def render(self):
+        return self.template.render(Context({'blogs': list(Blog.objects.order_by('pk'))}))
+
+    def test_fragment_is_reused_until_version_bump(self):
+        self.assertEqual(self.render(), 'Blog 0;Blog 1;Blog 2;')
+        Blog.objects.filter(pk=self.blogs[0].pk).update(title='Changed')
+        self.assertEqual(self.render(), 'Blog 0;Blog 1;Blog 2;')
+
+        blog = Blog.objects.get(pk=self.blogs[0].pk)
+        blog.toggle_published()
+        self.assertEqual(self.render(), 'Changed;Blog 1;Blog 2;')
+
+    def test_page_of_fragments_is_one_cache_round_trip(self):
+        self.render()
+        with mock.patch.object(cache, 'get_many', wraps=cache.get_many) as get_many, \
+                mock.patch.object(cache, 'set', wraps=cache.set) as cache_set:
+            self.render()
+        self.assertEqual(get_many.call_count, 1)
+        self.assertEqual(cache_set.call_count, 0)
+
+    def test_new_comment_invalidates_comment_list(self):
+        self.client.login(phone='123456789', password='testpass123')
+        url = reverse('blog:blog_detail', args=[self.blogs[0].slug])
+        self.client.get(url)
+        create_comment(self.blogs[0], self.user, 'Свежий комментарий')
+        self.assertContains(self.client.get(url), 'Свежий комментарий')
+
+    def test_author_change_invalidates_comment_list(self):
+        self.client.login(phone='123456789', password='testpass123')
+        url = reverse('blog:blog_detail', args=[self.blogs[0].slug])
+        create_comment(self.blogs[0], self.user, 'Комментарий')
+        self.client.get(url)
+
+        user = User.objects.get(pk=self.user.pk)
+        user.email = 'renamed@example.com'
+        user.save()
+        self.assertContains(self.client.get(url), 'renamed@example.com')
+
+
+@override_settings(QUERYSET_CACHE_ENABLED=True)
+class QuerySetCacheTest(TransactionTestCase):
+    # Внутри транзакции кэш выборок не используется, поэтому тесты работают без обертки TestCase
+
+    def setUp(self):
+        cache.clear()
+        querycache.stats.clear()
+        self.user = User.objects.create(phone='123456789')
+        self.blog = Blog.objects.create(title='Кэш', user=self.user, published_on=True)
+
+    def published_titles(self):
+        return [blog.title for blog in Blog.objects.filter(published_on=True).cached()]
+
+    def test_repeated_query_is_served_from_cache(self):
+        self.assertEqual(self.published_titles(), ['Кэш'])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.published_titles(), ['Кэш'])
+        self.assertEqual(querycache.get_stats()['blog.Blog'], {'hits': 1, 'misses': 1, 'bypassed': 0, 'hit_rate': 0.5})
+
+    def test_writes_bump_table_version(self):
+        self.published_titles()
+        Blog.objects.filter(pk=self.blog.pk).update(title='Обновлен')
+        self.assertEqual(self.published_titles(), ['Обновлен'])
+
+        Blog.objects.bulk_create([Blog(title='Второй', slug='second', published_on=True)])
+        self.assertEqual(sorted(self.published_titles()), ['Второй', 'Обновлен'])
+
+        self.blog.delete()
+        self.assertEqual(self.published_titles(), ['Второй'])
+
+    def test_related_table_write_invalidates_join(self):
+        subscribed = Blog.objects.filter(subscriptions__user=self.user).cached()
+        self.assertEqual(list(subscribed), [])
+        Subscription.objects.create(user=self.user, blog=self.blog, status=True)
+        self.assertEqual(list(subscribed.all()), [self.blog])
+
+    def test_uncached_and_untracked_queries_hit_database(self):
+        self.published_titles()
+        with self.assertNumQueries(1):
+            list(Blog.objects.filter(published_on=True))
+        with self.assertNumQueries(2):
+            # Таблица комментариев не отслеживается, результат с ней не кэшируется
+            list(Blog.objects.filter(comments__comment='x').cached())
+            list(Blog.objects.filter(comments__comment='x').cached())
+        with transaction.atomic(), self.assertNumQueries(1):
+            self.published_titles()
+        self.assertEqual(querycache.get_stats()['blog.Blog']['bypassed'], 3)
+
+
+class StampedeCachePageTest(SetupTestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.calls = 0
+
+        @stampede_cache_page(60, stale_timeout=60, beta=0)
+        def view(request):
+            self.calls += 1
+            return HttpResponse(f'page {self.calls}')
+
+        self.view = view
+
+    def get(self):
+        return self.view(RequestFactory().get('/stampede/')).content
+
+    def expire(self):
+        key = get_cache_key(RequestFactory().get('/stampede/'), '', 'GET', cache=cache)
+        entry = cache.get(key)
+        entry['expires'] = time.time() - 1
+        cache.set(key, entry)
+        return key
+
+    def test_fresh_page_is_served_from_cache(self):
+        self.assertEqual(self.get(), b'page 1')
+        self.assertEqual(self.get(), b'page 1')
+        self.assertEqual(self.calls, 1)
+
+    def test_stale_page_is_served_while_other_worker_regenerates(self):
+        self.get()
+        key = self.expire()
+        cache.add(f'{key}:lock', 1)
+        self.assertEqual(self.get(), b'page 1')
+
+        cache.delete(f'{key}:lock')
+        self.assertEqual(self.get(), b'page 2')
+        self.assertEqual(self.get(), b'page 2')
+        self.assertEqual(pagecache.get_stats()['/stampede/']['stale_served'], 1)
+
+    def test_early_recompute_probability_grows_near_expiry(self):
+        entry = {'expires': 100, 'delta': 2}
+        with mock.patch('blog.pagecache.random.expovariate', return_value=1.0):
+            self.assertFalse(should_recompute_early(entry, 1.0, now=90))
+            self.assertTrue(should_recompute_early(entry, 1.0, now=98))
+
+    def test_concurrent_calls_are_coalesced(self):
+        flight, started, release = SingleFlight(), threading.Event(), threading.Event()
+        calls, results = [], []
+
+        def compute():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return 'page'
+
+        leader = threading.Thread(target=lambda: results.append(flight.do('key', compute)))
+        leader.start()
+        started.wait(5)
+        follower = threading.Thread(target=lambda: results.append(flight.do('key', compute)))
+        follower.start()
+        time.sleep(0.05)
+        release.set()
+        leader.join(5)
+        follower.join(5)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(results), [('page', False), ('page', True)])
+
+
+class FakeRedisClient:
+    # Минимальная замена RedisCacheClient: значения в словаре, публикации записываются
+
+    def __init__(self):
+        self.data, self.published = {}, []
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    def get_many(self, keys):
+        return {key: self.data[key] for key in keys if key in self.data}
+
+    def set(self, key, value, timeout):
+        self.data[key] = value
+
+    def get_client(self, key=None, *, write=False):
+        return mock.Mock(publish=lambda channel, message: self.published.append(json.loads(message)))
+
+
+class TieredCacheTest(SimpleTestCase):
+
+    def setUp(self):
+        # Поток слушателя не подписывается на Redis, подписка считается установленной
+        patcher = mock.patch.object(LocalTier, '_listen', lambda tier: setattr(tier, 'connected', True))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(tiered_cache._tiers.clear)
+        tiered_cache._tiers.clear()
+        self.redis = FakeRedisClient()
+        self.backend = self.make_backend()
+        self.backend.tier._listener.join(5)
+
+    def make_backend(self):
+        backend = TieredRedisCache('redis://localhost', {'LOCAL': {'KEY_PREFIXES': ('qc:',)}})
+        backend.__dict__['_cache'] = self.redis
+        return backend
+
+    def test_hot_keys_are_served_locally(self):
+        self.backend.set('qc:table:blog_blog', 1)
+        self.assertEqual(self.backend.get('qc:table:blog_blog'), 1)
+        self.redis.data[':1:qc:table:blog_blog'] = 2
+        self.assertEqual(self.backend.get('qc:table:blog_blog'), 1)
+        self.assertEqual(self.backend.get_many(['qc:table:blog_blog']), {'qc:table:blog_blog': 1})
+        self.assertEqual(self.backend.stats['local_hits'], 2)
+
+    def test_write_publishes_invalidation(self):
+        self.backend.get('qc:a')
+        self.backend.set('qc:a', 1)
+        self.backend.set('other', 1)
+        self.assertEqual(self.redis.published, [[':1:qc:a']])
+
+        self.backend.get('qc:a')
+        self.redis.data[':1:qc:a'] = 2
+        self.backend.local.invalidate([':1:qc:a'])
+        self.assertEqual(self.backend.get('qc:a'), 2)
+
+    def test_value_read_during_invalidation_is_not_stored(self):
+        generation = self.backend.local.generation
+        self.backend.local.invalidate([':1:qc:a'])
+        self.backend.local.set(':1:qc:a', 1, generation)
+        self.assertEqual(len(self.backend.local), 0)
+
+    def test_local_tier_is_bounded(self):
+        local = LocalCache(max_entries=2, max_item_size=100)
+        for key in 'abc':
+            local.set(key, key, local.generation)
+        local.set('big', 'x' * 200, local.generation)
+        self.assertEqual(len(local), 2)
+        self.assertIs(local.get('a'), MISSING)
+        self.assertEqual(local.get('c'), 'c')
+
+    def test_local_tier_is_shared_by_backend_instances(self):
+        # Django создает экземпляр бэкенда на каждый поток и каждую задачу ASGI
+        self.backend.set('qc:a', 1)
+        self.backend.get('qc:a')
+        backends = []
+
+        def load():
+            backend = self.make_backend()
+            backends.append((backend, backend.get('qc:a')))
+
+        async def load_in_tasks():
+            await asyncio.gather(*(asyncio.to_thread(load) for _ in range(3)))
+
+        threads = [threading.Thread(target=load) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        asyncio.run(load_in_tasks())
+
+        self.assertEqual(len(backends), 8)
+        self.assertEqual({value for _, value in backends}, {1})
+        self.assertTrue(all(backend.tier is self.backend.tier for backend, _ in backends))
+        self.assertEqual(len(tiered_cache._tiers), 1)
+        self.assertEqual(self.backend.stats['local_hits'], 8)
+        listeners = [thread for thread in threading.enumerate() if thread.name == 'cache-invalidation']
+        self.assertLessEqual(len(listeners), 1)
+
+    def test_local_tier_is_bypassed_without_subscription(self):
+        self.backend.tier.connected = False
+        self.redis.data[':1:qc:a'] = 1
+        self.backend.get('qc:a')
+        self.assertEqual(len(self.backend.local), 0)
+
+
+class LiveCommentsTest(SetupTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.blog = Blog.objects.create(title='Test Blog', description='Test Description')
+        self.client.login(phone='123456789', password='testpass123')
+
+    def test_json_comment_create(self):
+        url = reverse('blog:comment_create', args=[self.blog.slug])
+        with mock.patch('blog.views.get_broker') as get_broker, self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url, {'comment': 'Live comment'})
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['comment'], 'Live comment')
+        self.assertEqual(list(self.blog.comments.values_list('comment', flat=True)), ['Live comment'])
+        get_broker.return_value.publish.assert_called_once()
+        self.blog.refresh_from_db()
+        self.assertEqual(self.blog.views, 0)
+
+    def test_json_comment_requires_login(self):
+        self.client.logout()
+        response = self.client.post(reverse('blog:comment_create', args=[self.blog.slug]), {'comment': 'x'})
+        self.assertEqual(response.status_code, 401)
+
+    def test_in_process_broker(self):
+        broker = InProcessBroker()
+
+        async def receive():
+            async with broker.subscribe('channel') as queue:
+                threading.Thread(target=broker.publish, args=('channel', {'id': 1})).start()
+                return await asyncio.wait_for(queue.get(), timeout=1)
+
+        self.assertEqual(asyncio.run(receive()), {'id': 1})
+        self.assertEqual(broker.subscribers, {})
+
+    def test_stream_replays_missed_comments(self):
+        comment = Comment.objects.create(user=self.user, comment='Missed')
+        self.blog.comments.add(comment)
+
+        response = self.client.get(reverse('blog:comment_stream', args=[self.blog.slug]))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+
+        async def first_events():
+            events = comment_events(self.blog.pk, last_event_id='0')
+            try:
+                return [await anext(events), await anext(events)]
+            finally:
+                await events.aclose()
+
+        retry, replayed = async_to_sync(first_events)()
+        self.assertEqual(retry, 'retry: 3000\n\n')
+        self.assertTrue(replayed.startswith(f'id: {comment.pk}\nevent: comment\n'))
+        self.assertIn('Missed', replayed)
+
+
+@override_settings(AUTH_USER_CACHE_ENABLED=True)
+class BlogApiTest(SetupTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.login(phone='123456789', password='testpass123')
+        self.blogs = [Blog.objects.create(title=f'Blog {i}', description='d' * 300, published_on=True, user=self.user)
+                      for i in range(60)]
+        self.client.get(reverse('blog:api_blog_list'))
+
+    def test_list_page_is_one_query(self):
+        # Сессия загружается отдельно, пользователь - из кэша, сама страница - одним запросом
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('blog:api_blog_list'))
+        data = response.json()
+        self.assertEqual(len(data['results']), 50)
+        self.assertEqual(data['results'][0]['id'], self.blogs[-1].pk)
+        self.assertEqual(len(data['results'][0]['excerpt']), 100)
+
+        next_page = self.client.get(data['next']).json()
+        self.assertEqual(len(next_page['results']), 10)
+        self.assertIsNone(next_page['next'])
+
+    def test_sparse_fieldset(self):
+        data = self.client.get(reverse('blog:api_blog_list'), {'fields': 'title', 'limit': 1}).json()
+        self.assertEqual(data['results'], [{'id': self.blogs[-1].pk, 'title': 'Blog 59'}])
+
+        response = self.client.get(reverse('blog:api_blog_list'), {'fields': 'password'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_batch_fetch_by_slugs(self):
+        slugs = ','.join(blog.slug for blog in self.blogs[:3])
+        data = self.client.get(reverse('blog:api_blog_list'), {'slugs': slugs, 'fields': 'slug'}).json()
+        self.assertEqual(sorted(row['slug'] for row in data['results']), sorted(b.slug for b in self.blogs[:3]))
+
+    def test_detail_and_comments(self):
+        blog = self.blogs[0]
+        comment = Comment.objects.create(user=self.user, comment='Hello')
+        blog.comments.add(comment)
+
+        detail = self.client.get(reverse('blog:api_blog_detail', args=[blog.slug])).json()
+        self.assertEqual(detail['description'], 'd' * 300)
+        comments = self.client.get(reverse('blog:api_comment_list', args=[blog.slug])).json()
+        self.assertEqual([row['comment'] for row in comments['results']], ['Hello'])
+        self.assertEqual(self.client.get(reverse('blog:api_blog_detail', args=['missing'])).status_code, 404)
+
+    def test_requires_login(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('blog:api_blog_list')).status_code, 401)
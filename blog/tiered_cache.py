@@ -0,0 +1,333 @@
+import json
+import logging
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.redis import RedisCache
+
+logger = logging.getLogger(__name__)
+
+MISSING = object()
+
+
+class LocalCache:
+    """
+        Ограниченный LRU-кэш процесса с коротким временем жизни записей.
+
+        Значения хранятся сериализованными: так учитывается их размер, а вызывающий код
+        получает собственную копию и не может изменить общую.
+
+        Attributes:
+            timeout (float): Время жизни записи в секундах.
+            max_entries (int): Максимальное число записей.
+            max_bytes (int): Максимальный суммарный размер значений.
+            max_item_size (int): Значения крупнее не кэшируются.
+            generation (int): Номер поколения, увеличивается при каждой инвалидации.
+    """
+
+    def __init__(self, timeout=5, max_entries=10000, max_bytes=16 * 1024 * 1024, max_item_size=16 * 1024):
+        self.timeout = timeout
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_item_size = max_item_size
+        self.generation = 0
+        self.size = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return MISSING
+            expires, data = item
+            if expires <= time.monotonic():
+                self._pop(key)
+                return MISSING
+            self._data.move_to_end(key)
+        return pickle.loads(data)
+
+    def set(self, key, value, generation, timeout=None):
+        """
+            Сохраняет значение, прочитанное из Redis при поколении generation.
+
+            Если за время чтения пришла инвалидация, значение могло устареть и не сохраняется.
+        """
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if len(data) > self.max_item_size:
+            return
+        ttl = self.timeout if timeout is None else min(self.timeout, timeout)
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._pop(key)
+            self._data[key] = (time.monotonic() + ttl, data)
+            self.size += len(data)
+            while self._data and (len(self._data) > self.max_entries or self.size > self.max_bytes):
+                self._pop(next(iter(self._data)))
+
+    def _pop(self, key):
+        item = self._data.pop(key, None)
+        if item is not None:
+            self.size -= len(item[1])
+
+    def invalidate(self, keys=None):
+        """
+            Удаляет ключи (или все записи, если keys не задан) и начинает новое поколение.
+        """
+        with self._lock:
+            self.generation += 1
+            if keys is None:
+                self._data.clear()
+                self.size = 0
+            else:
+                for key in keys:
+                    self._pop(key)
+
+
+class LocalTier:
+    """
+        Локальный уровень процесса: LRU, подписка на инвалидации и счетчики.
+
+        Django создает отдельный экземпляр бэкенда для каждого потока и каждой задачи ASGI,
+        поэтому состояние уровня хранится здесь и одно на процесс: все экземпляры бэкенда
+        с тем же Redis и каналом используют общий LocalCache и один поток подписки.
+
+        Attributes:
+            local (LocalCache): Данные локального уровня.
+            channel (str): Канал Redis pub/sub для сообщений об инвалидации.
+            stats (dict): Счетчики попаданий и инвалидаций процесса.
+            connected (bool): Подписка установлена, локальному уровню можно доверять.
+            pid (int): Процесс, в котором работает поток подписки.
+    """
+
+    def __init__(self, client, channel, options):
+        self.local = LocalCache(
+            timeout=options.get('TIMEOUT', 5),
+            max_entries=options.get('MAX_ENTRIES', 10000),
+            max_bytes=options.get('MAX_BYTES', 16 * 1024 * 1024),
+            max_item_size=options.get('MAX_ITEM_SIZE', 16 * 1024),
+        )
+        self.channel = channel
+        self.stats = {'local_hits': 0, 'remote_hits': 0, 'misses': 0, 'invalidations': 0}
+        self.connected = False
+        self.pid = os.getpid()
+        self._client = client
+        self._listener = None
+
+    def start(self):
+        self._listener = threading.Thread(target=self._listen, name='cache-invalidation', daemon=True)
+        self._listener.start()
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self._client.get_client(write=False).pubsub()
+                pubsub.subscribe(self.channel)
+                for message in pubsub.listen():
+                    if message['type'] == 'subscribe':
+                        self.local.invalidate()
+                        self.connected = True
+                    elif message['type'] == 'message':
+                        keys = json.loads(message['data'])
+                        self.local.invalidate(keys)
+                        self.stats['invalidations'] += 1
+            except Exception:
+                logger.warning('Подписка на инвалидации кэша прервана', exc_info=True)
+            self.connected = False
+            self.local.invalidate()
+            time.sleep(1)
+
+
+_tiers = {}
+_tiers_lock = threading.Lock()
+
+
+def get_local_tier(backend):
+    """
+        Возвращает локальный уровень текущего процесса для бэкенда, создавая его и поток подписки при первом обращении.
+
+        После fork (gunicorn --preload) поток подписки не наследуется, а данные родителя могли устареть,
+        поэтому уровень ищется по pid и в дочернем процессе создается заново.
+    """
+    pid = os.getpid()
+    key = (pid, tuple(backend._servers), backend.channel)
+    tier = _tiers.get(key)
+    if tier is None:
+        with _tiers_lock:
+            tier = _tiers.get(key)
+            if tier is None:
+                for stale in [k for k in _tiers if k[0] != pid]:
+                    del _tiers[stale]
+                tier = _tiers[key] = LocalTier(backend._cache, backend.channel, backend.local_options)
+                tier.start()
+    return tier
+
+
+class TieredRedisCache(RedisCache):
+    """
+        Бэкенд кэша Redis с LRU-кэшем в памяти процесса для мелких горячих ключей.
+
+        В локальный уровень попадают только ключи с префиксами из LOCAL['KEY_PREFIXES'].
+        Запись таких ключей публикует в Redis pub/sub сообщение с их именами, и каждый процесс
+        удаляет их из своего локального уровня. Пока подписка не установлена (или после обрыва)
+        локальный уровень не используется и очищается, поэтому процесс не отдает значения,
+        об изменении которых мог не узнать. Короткое время жизни ограничивает расхождение
+        на время доставки сообщения. Сам уровень общий для процесса (см. LocalTier).
+
+        Пример настройки::
+
+            'default': {
+                'BACKEND': 'blog.tiered_cache.TieredRedisCache',
+                'LOCATION': 'redis://redis:6379/1',
+                'LOCAL': {'TIMEOUT': 5, 'MAX_ENTRIES': 10000, 'KEY_PREFIXES': ('qc:', 'version:')},
+            }
+    """
+
+    def __init__(self, server, params):
+        super().__init__(server, params)
+        self.local_options = params.get('LOCAL', {})
+        self.local_prefixes = tuple(self.local_options.get('KEY_PREFIXES', ()))
+        self.channel = self.local_options.get('CHANNEL', 'cache:invalidate')
+
+    @property
+    def tier(self):
+        return get_local_tier(self)
+
+    @property
+    def local(self):
+        return self.tier.local
+
+    @property
+    def stats(self):
+        return self.tier.stats
+
+    def _local_enabled(self):
+        """
+            Проверяет, что в этом процессе работает подписка на инвалидации.
+        """
+        return bool(self.local_prefixes) and self.tier.connected
+
+    def _is_local(self, key):
+        return key.startswith(self.local_prefixes)
+
+    def _publish(self, keys):
+        """
+            Удаляет ключи из локального уровня и сообщает об их изменении остальным процессам.
+        """
+        keys = list(keys)
+        if not keys:
+            return
+        self.local.invalidate(keys)
+        self._cache.get_client(write=True).publish(self.channel, json.dumps(keys))
+
+    def _local_keys(self, keys, version=None):
+        return [self.make_and_validate_key(key, version=version) for key in keys if self._is_local(key)]
+
+    # Чтение
+
+    def get(self, key, default=None, version=None):
+        if not self._is_local(key) or not self._local_enabled():
+            return super().get(key, default, version)
+        full_key = self.make_and_validate_key(key, version=version)
+        value = self.local.get(full_key)
+        if value is not MISSING:
+            self.stats['local_hits'] += 1
+            return value
+        generation = self.local.generation
+        value = self._cache.get(full_key, MISSING)
+        if value is MISSING:
+            self.stats['misses'] += 1
+            return default
+        self.stats['remote_hits'] += 1
+        self.local.set(full_key, value, generation)
+        return value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        result, remote = {}, []
+        local_enabled = self._local_enabled()
+        for key in keys:
+            value = MISSING
+            if local_enabled and self._is_local(key):
+                value = self.local.get(self.make_and_validate_key(key, version=version))
+            if value is MISSING:
+                remote.append(key)
+            else:
+                self.stats['local_hits'] += 1
+                result[key] = value
+        if remote:
+            generation = self.local.generation
+            found = super().get_many(remote, version=version)
+            for key, value in found.items():
+                if local_enabled and self._is_local(key):
+                    self.local.set(self.make_and_validate_key(key, version=version), value, generation)
+            self.stats['remote_hits'] += len(found)
+            self.stats['misses'] += len(remote) - len(found)
+            result.update(found)
+        return result
+
+    def has_key(self, key, version=None):
+        if self._is_local(key) and self._local_enabled():
+            if self.local.get(self.make_and_validate_key(key, version=version)) is not MISSING:
+                return True
+        return super().has_key(key, version)
+
+    # Запись
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = super().add(key, value, timeout, version)
+        if added:
+            self._publish(self._local_keys([key], version))
+        return added
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        super().set(key, value, timeout, version)
+        self._publish(self._local_keys([key], version))
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        result = super().set_many(data, timeout, version)
+        self._publish(self._local_keys(data, version))
+        return result
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        touched = super().touch(key, timeout, version)
+        self._publish(self._local_keys([key], version))
+        return touched
+
+    def delete(self, key, version=None):
+        deleted = super().delete(key, version)
+        self._publish(self._local_keys([key], version))
+        return deleted
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        super().delete_many(keys, version)
+        self._publish(self._local_keys(keys, version))
+
+    def incr(self, key, delta=1, version=None):
+        value = super().incr(key, delta, version)
+        self._publish(self._local_keys([key], version))
+        return value
+
+    def clear(self):
+        result = super().clear()
+        self.local.invalidate()
+        # Сообщение null означает очистку всего локального уровня
+        self._cache.get_client(write=True).publish(self.channel, json.dumps(None))
+        return result
+
+    def get_stats(self):
+        """
+            Возвращает счетчики попаданий по уровням и размер локального уровня текущего процесса.
+        """
+        tier = self.tier
+        return dict(tier.stats, local_entries=len(tier.local), local_bytes=tier.local.size,
+                    subscribed=tier.connected)
@@ -0,0 +1,393 @@
+import hashlib
+import io
+import os
+import tempfile
+import warnings
+from datetime import timedelta
+from functools import wraps
+
+from django import forms
+from django.conf import settings
+from django.core.files import File
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.utils import timezone
+from django.utils.functional import cached_property
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+
+from blog.models import ChunkedUpload
+
+HEADER_PROBE_SIZE = 256 * 1024
+
+
+def upload_limits():
+    """
+        Возвращает ограничения загрузки из настроек.
+
+        Returns:
+            dict: max_image_size, max_file_size и max_attachment_size (байты), max_image_pixels, max_image_side.
+    """
+    return {
+        'max_image_size': getattr(settings, 'UPLOAD_MAX_IMAGE_SIZE', 10 * 1024 * 1024),
+        'max_file_size': getattr(settings, 'UPLOAD_MAX_FILE_SIZE', 512 * 1024 * 1024),
+        'max_attachment_size': getattr(settings, 'UPLOAD_MAX_ATTACHMENT_SIZE', 2 * 1024 * 1024 * 1024),
+        'max_image_pixels': getattr(settings, 'UPLOAD_MAX_IMAGE_PIXELS', 40_000_000),
+        'max_image_side': getattr(settings, 'UPLOAD_MAX_IMAGE_SIDE', 10_000),
+    }
+
+
+def probe_image_header(data, complete=False):
+    """
+        Определяет размеры изображения по заголовку, не декодируя пиксели.
+
+        Args:
+            data (bytes): Начало файла.
+            complete (bool): Передан весь файл, больше данных не будет.
+
+        Returns:
+            tuple: (ширина, высота) или None, если для разбора заголовка нужно больше данных.
+
+        Raises:
+            forms.ValidationError: Файл не изображение или его размеры превышают ограничения.
+    """
+    # Pillow с модулями тегов EXIF и TIFF - заметная часть импорта воркера, а нужен только при загрузке
+    from PIL import Image
+
+    limits = upload_limits()
+    try:
+        with warnings.catch_warnings():
+            # DecompressionBombWarning превращается в ошибку: размеры проверяются ниже
+            warnings.simplefilter('error', Image.DecompressionBombWarning)
+            with Image.open(io.BytesIO(data)) as image:
+                width, height = image.size
+    except (Image.DecompressionBombError, Image.DecompressionBombWarning):
+        raise forms.ValidationError('Слишком большое разрешение изображения')
+    except Exception:
+        if complete or len(data) >= HEADER_PROBE_SIZE:
+            raise forms.ValidationError('Загрузите корректное изображение')
+        return None
+
+    if max(width, height) > limits['max_image_side'] or width * height > limits['max_image_pixels']:
+        raise forms.ValidationError(
+            f'Слишком большое разрешение изображения: {width}x{height}, '
+            f'допускается до {limits["max_image_side"]} точек по стороне и {limits["max_image_pixels"]} точек всего')
+    return width, height
+
+
+def check_image_file(file, size=None):
+    """
+        Проверяет размер файла и заголовок изображения, читая не больше HEADER_PROBE_SIZE байт.
+
+        Raises:
+            forms.ValidationError: Если ограничения нарушены.
+    """
+    limits = upload_limits()
+    size = file.size if size is None else size
+    if size > limits['max_image_size']:
+        raise forms.ValidationError(f'Размер файла превышает {limits["max_image_size"] // (1024 * 1024)} МБ')
+    position = file.tell()
+    file.seek(0)
+    header = file.read(HEADER_PROBE_SIZE)
+    file.seek(position)
+    probe_image_header(header, complete=True)
+
+
+class LimitedUploadHandler(TemporaryFileUploadHandler):
+    """
+        Обработчик загрузки, который пишет файл во временный файл по частям, одновременно считая SHA-256.
+
+        По умолчанию изображения ограничены UPLOAD_MAX_IMAGE_SIZE, остальные файлы - UPLOAD_MAX_FILE_SIZE;
+        представление может задать другое ограничение декоратором limit_uploads.
+        Для изображений размеры проверяются по заголовку, как только он получен, поэтому слишком большой файл
+        или «декомпрессионная бомба» отклоняются до дочитывания запроса и до полного декодирования Pillow.
+        Остаток отклоненного файла не записывается, а ошибка передается форме через атрибут upload_error,
+        который проверяют поля LimitedFileField и LimitedImageField.
+    """
+
+    # Ключ upload_limits() для всех файлов запроса; задается представлением через limit_uploads
+    limit = None
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        if self.limit:
+            self.is_image = False
+            self.max_size = upload_limits()[self.limit]
+        else:
+            self.is_image = (self.content_type or '').startswith('image/')
+            self.max_size = upload_limits()['max_image_size' if self.is_image else 'max_file_size']
+        self.sha256 = hashlib.sha256()
+        self.received = 0
+        self.header = b''
+        self.header_checked = not self.is_image
+        self.error = None
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.error:
+            return None
+        self.received += len(raw_data)
+        try:
+            if self.received > self.max_size:
+                raise forms.ValidationError(f'Размер файла превышает {self.max_size // (1024 * 1024)} МБ')
+            if not self.header_checked:
+                self.header += raw_data[:HEADER_PROBE_SIZE - len(self.header)]
+                self.header_checked = probe_image_header(self.header) is not None
+        except forms.ValidationError as e:
+            self.error = e.messages[0]
+            # Уже записанное не нужно: освобождаем диск сразу
+            self.file.seek(0)
+            self.file.truncate()
+            return None
+        self.sha256.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        if self.is_image and not self.header_checked and not self.error:
+            try:
+                probe_image_header(self.header, complete=True)
+            except forms.ValidationError as e:
+                self.error = e.messages[0]
+        file.sha256 = self.sha256.hexdigest()
+        file.upload_error = self.error
+        return file
+
+
+def limit_uploads(limit):
+    """
+        Декоратор представления: все файлы запроса ограничиваются размером upload_limits()[limit]
+        без проверки заголовков изображений (например, вложения до UPLOAD_MAX_ATTACHMENT_SIZE).
+
+        Обработчики загрузки настраиваются до разбора тела запроса, поэтому CSRF проверяется уже внутри
+        декоратора: CsrfViewMiddleware читает request.POST раньше и разобрал бы файлы с ограничениями по умолчанию.
+    """
+
+    def decorator(view):
+        protected = csrf_protect(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            for handler in request.upload_handlers:
+                if isinstance(handler, LimitedUploadHandler):
+                    handler.limit = limit
+            return protected(request, *args, **kwargs)
+
+        return csrf_exempt(wrapper)
+
+    return decorator
+
+
+class LimitedFileField(forms.FileField):
+    """
+        Поле файла, показывающее ошибки, найденные обработчиком загрузки, как ошибки поля.
+
+        Файл, отклоненный LimitedUploadHandler, приходит в форму пустым: без этой проверки он был бы сохранен.
+    """
+
+    def to_python(self, data):
+        if data not in self.empty_values and getattr(data, 'upload_error', None):
+            raise forms.ValidationError(data.upload_error, code='invalid')
+        return super().to_python(data)
+
+
+class LimitedImageField(forms.ImageField):
+    """
+        Поле изображения с ограничениями размера файла и разрешения.
+
+        Ошибки, найденные обработчиком загрузки, показываются как ошибки поля; файлы, пришедшие в обход
+        обработчика, проверяются по заголовку до того, как ImageField откроет их в Pillow.
+    """
+
+    def to_python(self, data):
+        if data in self.empty_values:
+            return super().to_python(data)
+        if getattr(data, 'upload_error', None):
+            raise forms.ValidationError(data.upload_error, code='invalid_image')
+        check_image_file(data)
+        return super().to_python(data)
+
+
+class ChunkedUploadFormMixin:
+    """
+        Миксин для форм, принимающих изображения, загруженные заранее по частям (возобновляемая загрузка).
+
+        Для каждого поля из chunked_upload_fields добавляется скрытое поле <имя>_upload с идентификатором
+        завершенной загрузки ChunkedUpload; если файл в самом поле не передан, используется загруженный.
+        В поле изображения принимаются только загрузки изображений, прошедшие проверку заголовка.
+        Принимаются только загрузки пользователя user (передается представлением, см. ChunkedUploadViewMixin);
+        после сохранения формы использованные загрузки удаляются вместе с файлами.
+    """
+    chunked_upload_fields = ()
+
+    def __init__(self, *args, user=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.user = user
+        self.chunked_uploads = []
+        self.required_uploads = set()
+        for name in self.chunked_upload_fields:
+            self.fields[f'{name}_upload'] = forms.UUIDField(required=False, widget=forms.HiddenInput())
+            # Обязательность проверяется в clean(): файл может прийти либо в поле, либо загрузкой по частям
+            if self.fields[name].required:
+                self.fields[name].required = False
+                self.required_uploads.add(name)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        for name in self.chunked_upload_fields:
+            upload_id = cleaned_data.get(f'{name}_upload')
+            if not upload_id or name in self.files:
+                if name in self.required_uploads and not cleaned_data.get(name) and name not in self.errors:
+                    self.add_error(name, forms.ValidationError(self.fields[name].error_messages['required'],
+                                                               code='required'))
+                continue
+            kind = ChunkedUpload.KIND_IMAGE if isinstance(self.fields[name], forms.ImageField) else ChunkedUpload.KIND_FILE
+            upload = None
+            if self.user is not None and self.user.is_authenticated:
+                upload = ChunkedUpload.objects.filter(pk=upload_id, user=self.user, kind=kind,
+                                                      status=ChunkedUpload.STATUS_COMPLETE).first()
+            if upload is None:
+                self.add_error(f'{name}_upload', 'Загрузка не найдена или не завершена')
+                continue
+            cleaned_data[name] = upload.as_file()
+            self.chunked_uploads.append((upload, cleaned_data[name]))
+        return cleaned_data
+
+    def full_clean(self):
+        super().full_clean()
+        if self.errors:
+            # Форма будет показана снова, загрузки остаются доступными для повторной отправки
+            self.release_chunked_uploads(delete=False)
+
+    def save(self, commit=True):
+        instance = super().save(commit)
+        if commit:
+            self.release_chunked_uploads()
+        return instance
+
+    def release_chunked_uploads(self, delete=True):
+        """
+            Закрывает файлы загрузок, взятые формой, и при delete удаляет сами загрузки.
+        """
+        for upload, file in self.chunked_uploads:
+            file.close()
+            if delete:
+                ChunkedUploadWriter(upload).remove()
+                upload.delete()
+        self.chunked_uploads = []
+
+
+class ChunkedUploadViewMixin:
+    """
+        Миксин для представлений с формами ChunkedUploadFormMixin: передает форме пользователя запроса.
+    """
+
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        kwargs['user'] = self.request.user
+        return kwargs
+
+
+class ChunkedUploadWriter:
+    """
+        Дописывает части возобновляемой загрузки в файл на диске.
+    """
+
+    def __init__(self, upload):
+        self.upload = upload
+
+    @cached_property
+    def path(self):
+        # Не внутри MEDIA_ROOT: недогруженные файлы не должны раздаваться как медиа
+        directory = getattr(settings, 'UPLOAD_CHUNK_DIR', None) or os.path.join(tempfile.gettempdir(), 'chunked_uploads')
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, f'{self.upload.pk}.part')
+
+    def append(self, stream, length, chunk_size=64 * 1024):
+        """
+            Дописывает часть из потока запроса, не загружая ее в память целиком.
+
+            Returns:
+                int: Количество записанных байт.
+        """
+        written = 0
+        with open(self.path, 'r+b' if os.path.exists(self.path) else 'wb') as destination:
+            # Недописанный хвост прерванной части отбрасывается, запись продолжается с подтвержденного смещения
+            destination.seek(self.upload.offset)
+            destination.truncate()
+            while written < length:
+                data = stream.read(min(chunk_size, length - written))
+                if not data:
+                    break
+                destination.write(data)
+                written += len(data)
+        return written
+
+    def header(self):
+        with open(self.path, 'rb') as source:
+            return source.read(HEADER_PROBE_SIZE)
+
+    def sha256(self, chunk_size=1024 * 1024):
+        digest = hashlib.sha256()
+        with open(self.path, 'rb') as source:
+            for data in iter(lambda: source.read(chunk_size), b''):
+                digest.update(data)
+        return digest.hexdigest()
+
+    def open(self):
+        return File(open(self.path, 'rb'), name=self.upload.filename)
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def receive_chunk(upload, stream, length):
+    """
+        Принимает очередную часть возобновляемой загрузки.
+
+        Заголовок изображения проверяется, как только получено HEADER_PROBE_SIZE байт, а хэш считается
+        по завершении, поэтому слишком большое изображение отклоняется уже на первых частях.
+
+        Args:
+            upload (ChunkedUpload): Загрузка, заблокированная на время записи.
+            stream: Поток тела запроса.
+            length (int): Длина части.
+
+        Raises:
+            forms.ValidationError: Часть не подходит или файл нарушает ограничения; загрузка помечается ошибочной.
+    """
+    writer = ChunkedUploadWriter(upload)
+    try:
+        if upload.offset + length > upload.size:
+            raise forms.ValidationError('Часть выходит за объявленный размер файла')
+
+        previous_offset = upload.offset
+        upload.offset += writer.append(stream, length)
+        complete = upload.offset == upload.size
+        is_image = upload.kind == ChunkedUpload.KIND_IMAGE
+        if is_image and (complete or previous_offset < HEADER_PROBE_SIZE <= upload.offset):
+            probe_image_header(writer.header(), complete=complete)
+        if complete:
+            upload.sha256 = writer.sha256()
+            upload.status = ChunkedUpload.STATUS_COMPLETE
+    except forms.ValidationError as e:
+        writer.remove()
+        upload.status, upload.error = ChunkedUpload.STATUS_FAILED, e.messages[0]
+        upload.save(update_fields=['status', 'error'])
+        raise
+    upload.save(update_fields=['offset', 'sha256', 'status'])
+    return upload
+
+
+def remove_stale_uploads(max_age=timedelta(days=1)):
+    """
+        Удаляет загрузки по частям старше max_age вместе с их файлами.
+
+        Returns:
+            int: Количество удаленных загрузок.
+    """
+    stale = ChunkedUpload.objects.filter(created_at__lt=timezone.now() - max_age)
+    removed = 0
+    for upload in stale.iterator():
+        ChunkedUploadWriter(upload).remove()
+        upload.delete()
+        removed += 1
+    return removed
@@ -1,19 +1,33 @@
 from django.urls import path
-from django.views.decorators.cache import cache_page
 
+from blog import api
 from blog.apps import BlogConfig
+from blog.pagecache import stampede_cache_page
 from blog.views import BlogListView, BlogCreateView, BlogDetailView, BlogUpdateView, BlogDeleteView, toggle_activity, \
-    HomePageView
+    HomePageView, ratelimit_stats, querycache_stats, pagecache_stats, comment_create, comment_stream, upload_create, upload_chunk, BlogAttachmentCreateView, \
+    attachment_download
 
 app_name = BlogConfig.name
 
 
 urlpatterns = [
     path('', HomePageView.as_view(), name='home'),
-    path('blog/', cache_page(60)(BlogListView.as_view()), name='blog_list'),
+    path('blog/', stampede_cache_page(60)(BlogListView.as_view()), name='blog_list'),
     path('blog/create/', BlogCreateView.as_view(), name='blog_create'),
     path('blog/<slug:slug>/', BlogDetailView.as_view(), name='blog_detail'),
+    path('blog/<slug:slug>/comments/', comment_create, name='comment_create'),
+    path('blog/<slug:slug>/comments/stream/', comment_stream, name='comment_stream'),
+    path('blog/<slug:slug>/attachments/add/', BlogAttachmentCreateView.as_view(), name='attachment_create'),
+    path('blog/<slug:slug>/attachments/<int:pk>/', attachment_download, name='attachment_download'),
     path('blog/update/<slug:slug>/', BlogUpdateView.as_view(), name='blog_update'),
     path('blog/delete/<slug:slug>/', BlogDeleteView.as_view(), name='blog_delete'),
     path('blog/toggle_activity/<slug:slug>/', toggle_activity, name='toggle_activity'),
+    path('uploads/', upload_create, name='upload_create'),
+    path('uploads/<uuid:pk>/', upload_chunk, name='upload_chunk'),
+    path('ratelimit/stats/', ratelimit_stats, name='ratelimit_stats'),
+    path('querycache/stats/', querycache_stats, name='querycache_stats'),
+    path('pagecache/stats/', pagecache_stats, name='pagecache_stats'),
+    path('api/blogs/', api.blog_list, name='api_blog_list'),
+    path('api/blogs/<slug:slug>/', api.blog_detail, name='api_blog_detail'),
+    path('api/blogs/<slug:slug>/comments/', api.comment_list, name='api_comment_list'),
 ]
@@ -1,11 +1,58 @@
+import asyncio
+import json
+import os
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.http import HttpResponseRedirect
+from django import forms
+from django.db import transaction
+from django.db.models import F
+from django.http import HttpResponseRedirect, JsonResponse, HttpResponse, StreamingHttpResponse, Http404
 from django.shortcuts import get_object_or_404, redirect
 from django.urls import reverse_lazy, reverse
+from django.utils.decorators import method_decorator
+from django.utils.formats import date_format
+from django.utils.timezone import localtime
+from django.views.decorators.http import require_POST
 from django.views.generic import ListView, CreateView, DetailView, UpdateView, DeleteView, TemplateView
-from blog.forms import BlogForm, CommentForm
-from blog.models import Blog, Comment
+from blog.forms import BlogAttachmentForm, BlogForm, CommentForm
+from blog.media import has_blog_access, serve_file
+from blog.models import Blog, BlogAttachment, ChunkedUpload, Comment
+from blog import pagecache, querycache
+from blog.pubsub import comments_channel, get_broker
+from blog.ratelimit import get_stats
+from blog.uploads import ChunkedUploadViewMixin, limit_uploads, receive_chunk, upload_limits
 from subscriptions.models import Subscription
+from users.models import User
+
+
+def comment_payload(comment):
+    """
+        Представление комментария для JSON-ответа и SSE-события.
+    """
+    return {
+        'id': comment.pk,
+        'user': str(comment.user),
+        'avatar': comment.user.avatar.url if comment.user.avatar else '',
+        'comment': comment.comment,
+        'created_date': date_format(localtime(comment.created_date), 'F d, Y H:i'),
+    }
+
+
+def create_comment(blog, user, text):
+    """
+        Создает комментарий к блогу и после фиксации транзакции публикует его читателям блога.
+
+        Returns:
+            tuple: (комментарий, его JSON-представление).
+    """
+    comment = Comment.objects.create(user=user, comment=text)
+    blog.comments.add(comment)
+    payload = comment_payload(comment)
+    transaction.on_commit(lambda: get_broker().publish(comments_channel(blog.pk), payload))
+    return comment, payload
 
 
 class HomePageView(TemplateView):
@@ -29,7 +76,7 @@ class HomePageView(TemplateView):
                 dict: Словарь с контекстными данными.
         """
         context_data = super().get_context_data(**kwargs)
-        context_data['blog'] = Blog.objects.filter(published_on=True).order_by('?')[:3]
+        context_data['blog'] = list(Blog.objects.filter(published_on=True).order_by('?')[:3])
 
         if self.request.user.is_authenticated:
             user = self.request.user
@@ -46,6 +93,11 @@ class HomePageView(TemplateView):
             context_data['unsubscribed_blogs'] = unsubscribed_blogs
             context_data['subscribed_blogs'] = subscribed_blogs
 
+            # Признак открытого доступа задает вариант закэшированной карточки
+            subscribed_ids = set(subscribed_blog_ids)
+            for item in context_data['blog']:
+                item.is_open = item.pk in subscribed_ids or item.user_id == user.pk
+
         return context_data
 
 
@@ -67,6 +119,8 @@ class BlogListView(ListView):
     def get_queryset(self):
 
         user = self.request.user
+        if not user.is_authenticated:
+            return Blog.objects.filter(published_on=True).cached()
 
         # Получение списка идентификаторов блогов, на которые подписан пользователь
         subscribed_blog_ids = Subscription.objects.filter(user=user, status=True).values_list('blog__id', flat=True)
@@ -74,10 +128,10 @@ class BlogListView(ListView):
         # Получаем блоги, на которые пользователь не подписан и не является их автором
         unsubscribed_blogs = Blog.objects.filter(published_on=True).exclude(id__in=subscribed_blog_ids).exclude(user=user)
 
-        return unsubscribed_blogs
+        return unsubscribed_blogs.cached()
 
 
-class BlogCreateView(LoginRequiredMixin, CreateView):
+class BlogCreateView(LoginRequiredMixin, ChunkedUploadViewMixin, CreateView):
     """
         Контроллер для создания нового объекта Blog.
 
@@ -123,30 +177,31 @@ class BlogDetailView(LoginRequiredMixin, DetailView):
 
     def get_object(self, queryset=None):
         obj = super().get_object(queryset=queryset)
+        # Счетчик увеличивается запросом UPDATE без сохранения всей записи и без сброса кэшированных карточек
+        # и выборок (базовый менеджер не меняет версию таблицы)
+        Blog._base_manager.filter(pk=obj.pk).update(views=F('views') + 1)
         obj.views += 1
-        obj.save()
         return obj
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['comments'] = Comment.objects.filter(blog=self.object)
+        context['comments'] = Comment.objects.filter(blog=self.object).select_related('user')
+        context['attachments'] = self.object.attachments.all()
+        context['has_access'] = has_blog_access(self.request.user, self.object)
         return context
 
     def post(self, request, *args, **kwargs):
         form = CommentForm(request.POST)
 
         if form.is_valid():
-            comment_content = form.cleaned_data['comment']
-            comment = Comment.objects.create(user=request.user, comment=comment_content)
-
-            blog = self.get_object()
-            blog.comments.add(comment)
-            blog.save()
+            # Запись загружается без get_object(), чтобы отправка комментария не считалась просмотром
+            blog = get_object_or_404(Blog, slug=self.kwargs['slug'])
+            create_comment(blog, request.user, form.cleaned_data['comment'])
 
         return HttpResponseRedirect(self.request.path_info)
 
 
-class BlogUpdateView(LoginRequiredMixin, UpdateView):
+class BlogUpdateView(LoginRequiredMixin, ChunkedUploadViewMixin, UpdateView):
     """
         Контроллер для обновления существующего объекта Blog.
 
@@ -180,6 +235,63 @@ class BlogDeleteView(LoginRequiredMixin, DeleteView):
     success_url = reverse_lazy('blog:blog_list')
 
 
+@method_decorator(limit_uploads('max_attachment_size'), name='dispatch')
+class BlogAttachmentCreateView(LoginRequiredMixin, ChunkedUploadViewMixin, CreateView):
+    """
+        Контроллер для добавления файла к записи блога. Доступен автору записи.
+        Файл ограничен размером UPLOAD_MAX_ATTACHMENT_SIZE, изображения принимаются как обычные файлы.
+
+        Атрибуты:
+            model (Model): Модель, используемая для этого контроллера.
+            form_class (Form): Класс формы, используемый для этого контроллера.
+            template_name (str): Путь к HTML-шаблону.
+    """
+
+    model = BlogAttachment
+    form_class = BlogAttachmentForm
+    template_name = 'blog/blog_form.html'
+
+    def dispatch(self, request, *args, **kwargs):
+        self.blog = get_object_or_404(Blog, slug=kwargs['slug'])
+        if request.user.is_authenticated and request.user.pk != self.blog.user_id and not request.user.is_staff:
+            raise Http404
+        return super().dispatch(request, *args, **kwargs)
+
+    def form_valid(self, form):
+        form.instance.blog = self.blog
+        return super().form_valid(form)
+
+    def get_success_url(self):
+        return self.blog.get_absolute_url()
+
+
+def attachment_download(request, slug, pk):
+    """
+        Отдает вложение записи блога после проверки прав.
+
+        Поддерживаются запросы Range и If-Range, поэтому аудио и видео можно перематывать,
+        а прерванное скачивание - продолжить. С параметром download=1 файл отдается для сохранения.
+
+        Args:
+            request (HttpRequest): Объект HTTP-запроса.
+            slug (str): Слаг объекта Blog.
+            pk (int): Идентификатор вложения.
+
+        Returns:
+            HttpResponse: Файл или диапазон файла, 403 без доступа.
+    """
+    attachment = get_object_or_404(BlogAttachment.objects.select_related('blog'), pk=pk, blog__slug=slug)
+    blog = attachment.blog
+    if not (attachment.is_free and blog.published_on) and not has_blog_access(request.user, blog):
+        return HttpResponse(status=403)
+
+    filename = None
+    if request.GET.get('download'):
+        filename = attachment.title + os.path.splitext(attachment.file.name)[1]
+    return serve_file(request, attachment.file.name, public=False, filename=filename,
+                      content_type=attachment.content_type)
+
+
 def toggle_activity(request, slug):
     """
         Переключает атрибут 'published_on' объекта Blog.
@@ -194,3 +306,236 @@ def toggle_activity(request, slug):
     record_item = get_object_or_404(Blog, slug=slug)
     record_item.toggle_published()
     return redirect(reverse('blog:blog_detail', args=[record_item.slug]))
+
+
+@staff_member_required
+def ratelimit_stats(request):
+    """
+        Возвращает счетчики ограничителя частоты запросов текущего процесса.
+
+        Args:
+            request (HttpRequest): Объект HTTP-запроса.
+
+        Returns:
+            JsonResponse: Количество пропущенных и отклоненных запросов по маршрутам и ошибки Redis.
+    """
+    return JsonResponse(get_stats())
+
+
+@staff_member_required
+def querycache_stats(request):
+    """
+        Возвращает счетчики кэша выборок текущего процесса.
+
+        Args:
+            request (HttpRequest): Объект HTTP-запроса.
+
+        Returns:
+            JsonResponse: Попадания, промахи, обходы кэша и доля попаданий по моделям.
+    """
+    return JsonResponse(querycache.get_stats())
+
+
+@staff_member_required
+def pagecache_stats(request):
+    """
+        Возвращает счетчики кэша страниц текущего процесса.
+
+        Args:
+            request (HttpRequest): Объект HTTP-запроса.
+
+        Returns:
+            JsonResponse: Попадания, промахи, досрочные и обычные пересчеты, отдачи устаревших страниц
+            и объединенные запросы по представлениям.
+    """
+    return JsonResponse(pagecache.get_stats())
+
+
+@require_POST
+def comment_create(request, slug):
+    """
+        Создает комментарий к блогу без перезагрузки страницы.
+
+        Args:
+            request (HttpRequest): Объект HTTP-запроса с полем comment (форма или JSON).
+            slug (str): Слаг объекта Blog.
+
+        Returns:
+            JsonResponse: Созданный комментарий (201) или ошибки формы (400).
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Требуется вход'}, status=401)
+
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body)
+        except ValueError:
+            return JsonResponse({'error': 'Некорректный JSON'}, status=400)
+    else:
+        data = request.POST
+
+    form = CommentForm(data)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+
+    blog = get_object_or_404(Blog.objects.only('pk'), slug=slug)
+    _, payload = create_comment(blog, request.user, form.cleaned_data['comment'])
+    return JsonResponse(payload, status=201)
+
+
+def format_event(payload):
+    return f"id: {payload['id']}\nevent: comment\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+async def comment_events(blog_id, last_event_id=None):
+    """
+        Асинхронный генератор SSE-событий с новыми комментариями блога.
+
+        Подписка оформляется до досылки пропущенных комментариев, поэтому между ними нет окна
+        потери сообщений; возможные повторы клиент отбрасывает по id. Поток закрывается
+        через COMMENT_STREAM_MAX_SECONDS, после чего EventSource переподключается с Last-Event-ID.
+    """
+    keepalive = getattr(settings, 'COMMENT_STREAM_KEEPALIVE', 15)
+    deadline = time.monotonic() + getattr(settings, 'COMMENT_STREAM_MAX_SECONDS', 300)
+
+    async with get_broker().subscribe(comments_channel(blog_id)) as queue:
+        yield 'retry: 3000\n\n'
+
+        if last_event_id and last_event_id.isdigit():
+            missed = Comment.objects.filter(blog=blog_id, pk__gt=int(last_event_id)).select_related('user')
+            for comment in await sync_to_async(list)(missed.order_by('pk')[:100]):
+                yield format_event(comment_payload(comment))
+
+        while time.monotonic() < deadline:
+            try:
+                payload = await asyncio.wait_for(queue.get(), timeout=keepalive)
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+            yield format_event(payload)
+
+
+async def comment_stream(request, slug):
+    """
+        Поток новых комментариев блога в формате Server-Sent Events. Работает под ASGI.
+
+        Args:
+            request (HttpRequest): Объект HTTP-запроса.
+            slug (str): Слаг объекта Blog.
+
+        Returns:
+            StreamingHttpResponse: Поток событий text/event-stream.
+    """
+    is_authenticated = await sync_to_async(lambda: request.user.is_authenticated)()
+    if not is_authenticated:
+        return HttpResponse(status=401)
+
+    try:
+        blog_id = await Blog.objects.filter(slug=slug).values_list('pk', flat=True).aget()
+    except Blog.DoesNotExist:
+        raise Http404
+
+    response = StreamingHttpResponse(comment_events(blog_id, request.headers.get('Last-Event-ID')),
+                                     content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def upload_state(upload):
+    return {'id': str(upload.pk), 'offset': upload.offset, 'size': upload.size, 'status': upload.status,
+            'error': upload.error, 'url': reverse('blog:upload_chunk', args=[upload.pk])}
+
+
+@require_POST
+def upload_create(request):
+    """
+        Начинает возобновляемую загрузку изображения по частям.
+
+        Args:
+            request (HttpRequest): JSON с полями filename, size и kind (image - по умолчанию, или file).
+
+        Returns:
+            JsonResponse: Состояние загрузки с адресом для отправки частей (201).
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Требуется вход'}, status=401)
+    try:
+        data = json.loads(request.body)
+        filename, size = str(data['filename'])[:255], int(data['size'])
+        kind = data.get('kind', ChunkedUpload.KIND_IMAGE)
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return JsonResponse({'error': 'Ожидается JSON с полями filename и size'}, status=400)
+    if kind not in dict(ChunkedUpload.KINDS):
+        return JsonResponse({'error': 'Неизвестный тип загрузки'}, status=400)
+
+    limits = upload_limits()
+    max_size = limits['max_image_size' if kind == ChunkedUpload.KIND_IMAGE else 'max_attachment_size']
+    if not 0 < size <= max_size:
+        return JsonResponse({'error': f'Размер файла превышает {max_size // (1024 * 1024)} МБ'}, status=400)
+
+    upload = ChunkedUpload.objects.create(user=request.user, filename=filename, kind=kind, size=size)
+    return JsonResponse(upload_state(upload), status=201)
+
+
+def upload_chunk(request, pk):
+    """
+        Состояние загрузки (GET) или прием очередной части (POST).
+
+        Часть передается телом запроса, ее смещение - заголовком Upload-Offset. Если смещение не совпадает
+        с уже полученным количеством байт, возвращается 409 с текущим смещением, и клиент продолжает с него.
+
+        Returns:
+            JsonResponse: Состояние загрузки.
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Требуется вход'}, status=401)
+    if request.method == 'GET':
+        return JsonResponse(upload_state(get_object_or_404(ChunkedUpload, pk=pk, user=request.user)))
+    if request.method != 'POST':
+        return HttpResponse(status=405)
+
+    try:
+        offset = int(request.headers['Upload-Offset'])
+        length = int(request.headers['Content-Length'])
+    except (KeyError, ValueError):
+        return JsonResponse({'error': 'Нужны заголовки Upload-Offset и Content-Length'}, status=400)
+    if length > getattr(settings, 'UPLOAD_CHUNK_MAX_SIZE', 8 * 1024 * 1024):
+        return JsonResponse({'error': 'Слишком большая часть'}, status=413)
+
+    with transaction.atomic():
+        upload = get_object_or_404(ChunkedUpload.objects.select_for_update(), pk=pk, user=request.user)
+        if upload.status != ChunkedUpload.STATUS_UPLOADING:
+            return JsonResponse(upload_state(upload), status=409)
+        if offset != upload.offset:
+            return JsonResponse(upload_state(upload), status=409)
+        try:
+            receive_chunk(upload, request, length)
+        except forms.ValidationError:
+            return JsonResponse(upload_state(upload), status=400)
+    return JsonResponse(upload_state(upload))
+
+
+def protected_media(request, path):
+    """
+        Отдает медиафайл после проверки прав.
+
+        Изображение платного блога доступно автору, персоналу и подписчикам, изображение бесплатного блога
+        и аватары - всем. Если один и тот же файл используется несколькими записями, достаточно доступа
+        к любой из них. Сама передача файла выполняется nginx (X-Accel-Redirect).
+
+        Args:
+            request (HttpRequest): Объект HTTP-запроса.
+            path (str): Имя файла в хранилище.
+
+        Returns:
+            HttpResponse: Файл, 403 без доступа или 404 для неизвестного файла.
+    """
+    blogs = list(Blog.objects.filter(image=path).only('pk', 'user_id', 'published_on', 'is_paid', 'price')[:20])
+    if blogs:
+        if not any(has_blog_access(request.user, blog) for blog in blogs):
+            return HttpResponse(status=403)
+        return serve_file(request, path, public=all(blog.is_free and blog.published_on for blog in blogs))
+    if User.objects.filter(avatar=path).exists():
+        return serve_file(request, path, public=True)
+    raise Http404
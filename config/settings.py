@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 import os
+import tempfile
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -25,7 +26,7 @@ load_dotenv(BASE_DIR / '.env')
 SECRET_KEY = 'django-insecure-7aes6(xq6%m4md$h+&-sbs=duj=d9%a@cf4p1v#)&yv)$r8e*_'
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = os.getenv('DEBUG', '1') == '1'
 
 ALLOWED_HOSTS = ['*']
 
@@ -42,7 +43,8 @@ INSTALLED_APPS = [
     'corsheaders',
     'blog',
     'users',
-    'subscriptions'
+    'subscriptions',
+    'monitoring',
 ]
 
 CORS_ALLOWED_ORIGINS = [
@@ -64,12 +66,16 @@ CSRF_TRUSTED_ORIGINS = [
 
 
 MIDDLEWARE = [
+    'monitoring.middleware.MetricsMiddleware',
+    'monitoring.middleware.MemoryWatchdogMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'users.middleware.CachedAuthenticationMiddleware',
+    'monitoring.middleware.ProfilerMiddleware',
+    'blog.ratelimit.RateLimitMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -82,8 +88,14 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Скомпилированные шаблоны хранятся в памяти процесса; при DEBUG сбрасываются автоперезагрузкой
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -111,6 +123,17 @@ DATABASES = {
     }
 }
 
+# Реплика только для чтения, на которую уходят долгие выгрузки
+if os.getenv('POSTGRES_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': os.getenv('POSTGRES_REPLICA_HOST'),
+        'PORT': os.getenv('POSTGRES_REPLICA_PORT', os.getenv('POSTGRES_PORT')),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+EXPORT_DATABASE = 'replica' if 'replica' in DATABASES else 'default'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -161,6 +184,8 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
 AUTH_USER_MODEL = 'users.User'
+AUTHENTICATION_BACKENDS = ['users.backends.PhoneBackend']
+PHONE_DEFAULT_COUNTRY_CODE = os.getenv('PHONE_DEFAULT_COUNTRY_CODE', '7')
 LOGIN_URL = '/users/'
 LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/'
@@ -182,7 +207,129 @@ CACHE_ENABLED = os.getenv('CACHE_ENABLED')
 if CACHE_ENABLED:
     CACHES = {
         "default": {
-            "BACKEND": "django.core.cache.backends.redis.RedisCache",
-            "LOCATION": os.getenv('CACHE_LOCATION')
+            # Мелкие горячие ключи (версии таблиц и объектов, выборки) дублируются в LRU процесса,
+            # согласованность между воркерами поддерживается инвалидацией через Redis pub/sub
+            "BACKEND": "blog.tiered_cache.TieredRedisCache",
+            "LOCATION": os.getenv('CACHE_LOCATION'),
+            "LOCAL": {
+                "TIMEOUT": int(os.getenv('CACHE_LOCAL_TIMEOUT') or 5),
+                "MAX_ENTRIES": int(os.getenv('CACHE_LOCAL_MAX_ENTRIES') or 10000),
+                "MAX_BYTES": int(os.getenv('CACHE_LOCAL_MAX_BYTES') or 16 * 1024 * 1024),
+                "MAX_ITEM_SIZE": 16 * 1024,
+                "KEY_PREFIXES": ('qc:', 'version:', 'auth:'),
+            },
         }
     }
+
+# Пакетные операции админки: размер пачки (одна транзакция) и синхронный режим для тестов и отладки
+BULK_ACTION_CHUNK_SIZE = int(os.getenv('BULK_ACTION_CHUNK_SIZE', 500))
+BULK_ACTIONS_INLINE = bool(os.getenv('BULK_ACTIONS_INLINE'))
+# Исполнитель операции раз в BULK_ACTION_HEARTBEAT_INTERVAL с отмечается в базе; операцию без отметки дольше
+# BULK_ACTION_STALE_AFTER с (воркер перезапущен) продолжает фоновая проверка любого воркера
+BULK_ACTION_HEARTBEAT_INTERVAL = 30
+BULK_ACTION_STALE_AFTER = 120
+
+# Ограничение частоты запросов: token bucket в Redis, при его отсутствии - в памяти процесса.
+# Ключи: ip, user (id из сессии), phone (номер из формы). Применяется к методам RATELIMIT_METHODS.
+RATELIMIT_ENABLED = (os.getenv('RATELIMIT_ENABLED') or '1') == '1'
+RATELIMIT_REDIS_URL = os.getenv('RATELIMIT_REDIS_URL') or os.getenv('CACHE_LOCATION')
+# Число доверенных прокси перед приложением (nginx - 1): адрес клиента берется из X-Forwarded-For с конца
+RATELIMIT_PROXY_COUNT = int(os.getenv('RATELIMIT_PROXY_COUNT') or 0)
+RATELIMIT_METHODS = ('POST',)
+RATELIMITS = {
+    'users:login': [('ip', '30/m'), ('phone', '10/m')],
+    'users:register': [('ip', '10/m')],
+    'users:password_reset': [('ip', '10/m'), ('phone', '5/m')],
+    'blog:blog_detail': [('user', '20/m'), ('ip', '60/m')],
+    'blog:comment_create': [('user', '20/m'), ('ip', '60/m')],
+    'subscriptions:create-checkout-session': [('user', '10/m'), ('ip', '30/m')],
+}
+
+# Живые комментарии (SSE): Redis pub/sub для нескольких процессов, без него - брокер в памяти процесса
+PUBSUB_REDIS_URL = os.getenv('PUBSUB_REDIS_URL', os.getenv('CACHE_LOCATION'))
+COMMENT_STREAM_KEEPALIVE = 15
+COMMENT_STREAM_MAX_SECONDS = 300
+
+# Импорт записей блога из архивов JSONL/ZIP
+BLOG_IMPORT_BATCH_SIZE = int(os.getenv('BLOG_IMPORT_BATCH_SIZE', 1000))
+BLOG_IMPORT_DIR = os.getenv('BLOG_IMPORT_DIR', tempfile.gettempdir())
+
+# Загрузка файлов: потоковая запись во временный файл с ранней проверкой размера и разрешения изображений
+FILE_UPLOAD_HANDLERS = ['blog.uploads.LimitedUploadHandler']
+UPLOAD_MAX_IMAGE_SIZE = int(os.getenv('UPLOAD_MAX_IMAGE_SIZE', 10 * 1024 * 1024))
+UPLOAD_MAX_FILE_SIZE = int(os.getenv('UPLOAD_MAX_FILE_SIZE', 512 * 1024 * 1024))
+UPLOAD_MAX_ATTACHMENT_SIZE = int(os.getenv('UPLOAD_MAX_ATTACHMENT_SIZE', 2 * 1024 * 1024 * 1024))
+UPLOAD_MAX_IMAGE_PIXELS = int(os.getenv('UPLOAD_MAX_IMAGE_PIXELS', 40_000_000))
+UPLOAD_MAX_IMAGE_SIDE = int(os.getenv('UPLOAD_MAX_IMAGE_SIDE', 10_000))
+UPLOAD_CHUNK_MAX_SIZE = 8 * 1024 * 1024
+UPLOAD_CHUNK_DIR = os.getenv('UPLOAD_CHUNK_DIR')
+
+# Защищенная раздача медиа: Django проверяет права, nginx отдает файл из внутреннего location
+MEDIA_ACCEL_REDIRECT = bool(os.getenv('MEDIA_ACCEL_REDIRECT'))
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+
+# Кэширование фрагментов шаблонов по версиям объектов
+FRAGMENT_CACHE_TIMEOUT = 24 * 60 * 60
+
+# Кэширование выборок QuerySet.cached() для Blog, Subscription и User с версиями таблиц
+QUERYSET_CACHE_ENABLED = os.getenv('QUERYSET_CACHE_ENABLED', '1' if CACHE_ENABLED else '0') == '1'
+QUERYSET_CACHE_TIMEOUT = int(os.getenv('QUERYSET_CACHE_TIMEOUT', 300))
+
+# Кэш страниц с защитой от лавины пересчетов: устаревшая страница отдается, пока один воркер ее перестраивает
+PAGE_CACHE_STALE_TIMEOUT = int(os.getenv('PAGE_CACHE_STALE_TIMEOUT', 300))
+PAGE_CACHE_BETA = float(os.getenv('PAGE_CACHE_BETA', 1.0))
+PAGE_CACHE_LOCK_TIMEOUT = 30
+
+# Кэш пользователя запроса (без хеша пароля), сбрасывается при сохранении пользователя.
+# Сброс должен быть виден всем воркерам, поэтому по умолчанию кэш включен только с общим кэшем Redis
+AUTH_USER_CACHE_ENABLED = (os.getenv('AUTH_USER_CACHE_ENABLED') or ('1' if CACHE_ENABLED else '0')) == '1'
+AUTH_USER_CACHE_TIMEOUT = int(os.getenv('AUTH_USER_CACHE_TIMEOUT', 300))
+
+# Метрики Prometheus (/metrics). Процессы gunicorn сохраняют снимки в METRICS_DIR, /metrics их суммирует;
+# каталог очищается хуком gunicorn при старте. Без каталога (runserver) /metrics показывает только свой процесс,
+# поэтому для нескольких воркеров gunicorn он обязателен (задан в docker-compose.yml)
+METRICS_DIR = os.getenv('METRICS_DIR')
+METRICS_FLUSH_INTERVAL = 5
+# Без токена /metrics закрыт: Prometheus передает его в Authorization: Bearer
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+# Журнал медленных запросов к базе: отпечаток SQL, время, строки, представление, шаблон и строка кода
+SLOW_QUERY_THRESHOLD_MS = int(os.getenv('SLOW_QUERY_THRESHOLD_MS') or 200)
+SLOW_QUERY_SAMPLE_RATE = float(os.getenv('SLOW_QUERY_SAMPLE_RATE') or 1.0)
+SLOW_QUERY_LOG = os.getenv('SLOW_QUERY_LOG')
+
+# Профилирование запроса по требованию: ?_profile= для персонала или заголовок X-Profile с токеном profile_token
+PROFILER_INTERVAL = float(os.getenv('PROFILER_INTERVAL') or 0.005)
+PROFILER_MAX_DEPTH = 200
+PROFILER_TOKEN_MAX_AGE = 60 * 60
+PROFILER_TOKEN_MAX_USES = 10
+PROFILER_REPORT_MAX_AGE = 7 * 24 * 60 * 60
+PROFILER_MAX_REPORTS = 500
+PROFILER_DIR = os.getenv('PROFILER_DIR') or os.path.join(tempfile.gettempdir(), 'profiles')
+
+# Компиляция всех шаблонов при запуске процесса (по умолчанию без DEBUG): ошибка в шаблоне не дает запуститься
+TEMPLATE_PRECOMPILE = (os.getenv('TEMPLATE_PRECOMPILE') or ('0' if DEBUG else '1')) == '1'
+
+# Память воркеров: плавный перезапуск воркера gunicorn выше MEMORY_RECYCLE_RSS_MB (0 - выключено)
+# и отчеты tracemalloc по сигналу (kill -USR2 <pid>) или через /monitoring/memory/
+MEMORY_RECYCLE_RSS_MB = int(os.getenv('MEMORY_RECYCLE_RSS_MB') or 0)
+MEMORY_TRACE_FRAMES = 10
+MEMORY_SNAPSHOT_SIGNAL = 'SIGUSR2'
+MEMORY_SNAPSHOT_DIR = os.getenv('MEMORY_SNAPSHOT_DIR') or os.path.join(tempfile.gettempdir(), 'memory')
+
+# Запуск контейнера (manage.py startup): фикстуры загружаются только при изменении содержимого,
+# страницы STARTUP_WARM_URLS запрашиваются при прогреве каждого воркера до приема трафика (/readyz)
+STARTUP_FIXTURES = [BASE_DIR / 'fixtures.json']
+STARTUP_WARM_URLS = ['/', '/blog/']
+# Ключ кэша страниц включает адрес сайта: страницы прогреваются с заголовком Host публичного адреса
+# (по умолчанию первый конкретный адрес из ALLOWED_HOSTS), без него общий кэш страниц не заполняется
+STARTUP_WARM_HOST = os.getenv('STARTUP_WARM_HOST')
+# Неудавшийся прогрев повторяется проверкой /readyz не чаще, чем раз в интервал, удваивающийся до максимума
+STARTUP_WARM_RETRY_INTERVAL = 5
+STARTUP_WARM_RETRY_MAX_INTERVAL = 300
+
+# Бюджет времени холодного старта воркера (импорт приложения и всех представлений); stripe, transliterate
+# и Pillow импортируются только при использовании. Точно бюджет проверяет команда importtime, тест
+# ImportTimeTest - с запасом IMPORT_TIME_TEST_MARGIN раз, чтобы не падать от нагрузки на машине с тестами
+IMPORT_TIME_BUDGET_MS = int(os.getenv('IMPORT_TIME_BUDGET_MS') or 600)
+IMPORT_TIME_TEST_MARGIN = float(os.getenv('IMPORT_TIME_TEST_MARGIN') or 2)
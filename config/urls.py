@@ -14,14 +14,16 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
-from django.conf import settings
-from django.conf.urls.static import static
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
+from blog.views import protected_media
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('blog.urls', namespace='blog')),
     path('users/', include('users.urls', namespace='users')),
-    path('subscriptions/', include('subscriptions.urls', namespace='subscriptions'))
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    path('subscriptions/', include('subscriptions.urls', namespace='subscriptions')),
+    path('', include('monitoring.urls', namespace='monitoring')),
+    # Медиа отдается только после проверки прав, байты передает nginx
+    re_path(r'^media/(?P<path>.+)$', protected_media, name='protected_media'),
+]
@@ -0,0 +1,18 @@
+import os
+import shutil
+
+
+def on_starting(server):
+    # Снимки метрик процессов прошлого запуска: pid могли достаться новым воркерам
+    directory = os.getenv('METRICS_DIR')
+    if directory:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def post_worker_init(worker):
+    # Воркер прогревается до приема запросов; при ошибке прогрев повторит проверка /readyz
+    from monitoring.startup import ensure_warm
+    ensure_warm()
+    # Пакетные операции выполняются в потоках воркеров: операции перезапущенных воркеров продолжаются здесь
+    from blog.bulk_actions import start_stale_job_watcher
+    start_stale_job_watcher()
@@ -0,0 +1,19 @@
+from django.apps import AppConfig
+
+
+class MonitoringConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'monitoring'
+    verbose_name = 'мониторинг'
+
+    def ready(self):
+        from django.conf import settings
+
+        from monitoring.instrumentation import install
+        from monitoring.memory import install_signal_handler
+        from monitoring.templating import compile_templates
+        install()
+        install_signal_handler()
+        # Процесс не запустится с неразбираемым шаблоном, а запросы получат уже скомпилированные шаблоны
+        if getattr(settings, 'TEMPLATE_PRECOMPILE', False):
+            compile_templates()
@@ -0,0 +1,91 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.apps import apps
+from django.conf import settings
+
+# Тяжелые модули, которые импортируются только при использовании (оплата, slug, загрузка изображений)
+LAZY_MODULES = ('stripe', 'transliterate', 'PIL')
+
+# Что импортирует воркер до первого ответа: ASGI-приложение с middleware и все представления из URLconf
+COLD_START_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+import config.asgi
+from django.urls import get_resolver
+get_resolver().url_patterns
+elapsed = time.perf_counter() - started
+print(json.dumps({'seconds': elapsed, 'modules': sorted(sys.modules)}))
+"""
+
+
+def run_cold_start(importtime=False):
+    """
+        Запускает холодный старт воркера в отдельном интерпретаторе с текущими настройками.
+
+        Returns:
+            subprocess.CompletedProcess: Результат; в stdout - время и список модулей, в stderr - -X importtime.
+    """
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings.SETTINGS_MODULE)
+    command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', COLD_START_SCRIPT]
+    return subprocess.run(command, capture_output=True, text=True, env=env, cwd=settings.BASE_DIR, check=True)
+
+
+def cold_start(runs=3):
+    """
+        Время холодного старта (лучшее из нескольких запусков, чтобы не учитывать шум) и загруженные модули.
+
+        Returns:
+            tuple: (секунды, множество имен модулей).
+    """
+    results = [json.loads(run_cold_start().stdout.splitlines()[-1]) for _ in range(runs)]
+    return min(result['seconds'] for result in results), set(results[-1]['modules'])
+
+
+def parse_importtime(output):
+    """
+        Разбирает вывод python -X importtime.
+
+        Returns:
+            list: Словари module, self_us, cumulative_us, depth в порядке завершения импорта.
+    """
+    entries = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        entries.append({
+            'module': name.strip(),
+            'self_us': int(self_us),
+            'cumulative_us': int(cumulative_us),
+            'depth': (len(name) - len(name.lstrip())) // 2,
+        })
+    return entries
+
+
+def top_level_packages(entries):
+    """
+        Суммирует время импорта по пакетам верхнего уровня (django, stripe, blog, ...).
+    """
+    packages = {}
+    for entry in entries:
+        package = entry['module'].split('.', 1)[0]
+        packages[package] = packages.get(package, 0) + entry['self_us']
+    return sorted(packages.items(), key=lambda item: item[1], reverse=True)
+
+
+def project_packages():
+    """
+        Пакеты проекта: приложения из BASE_DIR и пакет настроек.
+    """
+    base_dir = str(settings.BASE_DIR)
+    packages = {app_config.name.split('.', 1)[0] for app_config in apps.get_app_configs()
+                if app_config.path.startswith(base_dir)}
+    packages.add(settings.ROOT_URLCONF.split('.', 1)[0])
+    return packages
+
+
+def loaded_lazy_modules(modules):
+    return sorted(name for name in LAZY_MODULES if name in modules)
@@ -0,0 +1,112 @@
+import time
+from contextvars import ContextVar
+
+from django.core.cache import caches
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from monitoring.metrics import CACHE_REQUESTS, DB_QUERY_DURATION, DB_QUERY_ERRORS, GAUGE, registry
+from monitoring.slowqueries import record_slow_query, threshold
+from monitoring.templating import instrument_templates
+
+# Счетчик запросов к базе текущего HTTP-запроса (None вне запроса)
+request_queries = ContextVar('request_queries', default=None)
+
+MISSING = object()
+
+
+def db_wrapper(execute, sql, params, many, context):
+    """
+        Обертка выполнения запросов (connection.execute_wrapper): время, ошибки, число запросов за HTTP-запрос
+        и журнал запросов дольше SLOW_QUERY_THRESHOLD_MS.
+    """
+    counter = request_queries.get()
+    if counter is not None:
+        counter[0] += 1
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    except Exception:
+        DB_QUERY_ERRORS.inc(context['connection'].alias)
+        raise
+    finally:
+        duration = time.perf_counter() - started
+        DB_QUERY_DURATION.observe(duration, context['connection'].alias)
+        if duration >= threshold():
+            record_slow_query(sql, duration, context)
+
+
+def add_db_wrapper(connection):
+    if db_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(db_wrapper)
+
+
+def connection_opened(sender, connection, **kwargs):
+    add_db_wrapper(connection)
+
+
+def instrument_cache(backend, alias):
+    """
+        Подменяет у экземпляра бэкенда кэша get и get_many, считая попадания и промахи по псевдониму.
+    """
+    get, get_many = backend.get, backend.get_many
+
+    def counted_get(key, default=None, version=None):
+        value = get(key, MISSING, version=version)
+        if value is MISSING:
+            CACHE_REQUESTS.inc(alias, 'miss')
+            return default
+        CACHE_REQUESTS.inc(alias, 'hit')
+        return value
+
+    def counted_get_many(keys, version=None):
+        keys = list(keys)
+        found = get_many(keys, version=version)
+        if found:
+            CACHE_REQUESTS.inc(alias, 'hit', value=len(found))
+        if len(found) < len(keys):
+            CACHE_REQUESTS.inc(alias, 'miss', value=len(keys) - len(found))
+        return found
+
+    backend.get, backend.get_many = counted_get, counted_get_many
+    return backend
+
+
+def queue_depth():
+    """
+        Глубина фоновых очередей на момент чтения метрик.
+    """
+    from django.db.models import Count
+
+    from blog.models import BulkActionJob, ChunkedUpload
+
+    jobs = dict.fromkeys((BulkActionJob.STATUS_PENDING, BulkActionJob.STATUS_RUNNING), 0)
+    jobs.update(BulkActionJob.objects.filter(status__in=list(jobs)).values('status')
+                .annotate(total=Count('pk')).values_list('status', 'total'))
+    uploads = ChunkedUpload.objects.filter(status=ChunkedUpload.STATUS_UPLOADING).count()
+    return [
+        ('bulk_action_jobs', GAUGE, 'Пакетные операции в очереди и в работе',
+         [({'status': status}, total) for status, total in jobs.items()]),
+        ('chunked_uploads_in_progress', GAUGE, 'Незавершенные загрузки по частям', [({}, uploads)]),
+    ]
+
+
+def install():
+    """
+        Подключает сбор метрик базы, кэша и шаблонов. Вызывается из MonitoringConfig.ready.
+    """
+    connection_created.connect(connection_opened, dispatch_uid='monitoring-db')
+    for connection in connections.all(initialized_only=True):
+        add_db_wrapper(connection)
+
+    # Экземпляры бэкендов кэша создаются для каждого потока; оборачиваем каждый новый экземпляр
+    create_connection = caches.create_connection
+    if not getattr(create_connection, 'instrumented', False):
+        def instrumented_create_connection(alias):
+            return instrument_cache(create_connection(alias), alias)
+
+        instrumented_create_connection.instrumented = True
+        caches.create_connection = instrumented_create_connection
+
+    instrument_templates()
+    registry.collector(queue_depth)
@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+
+from monitoring.importtime import (cold_start, loaded_lazy_modules, parse_importtime, project_packages,
+                                   run_cold_start, top_level_packages)
+
+
+class Command(BaseCommand):
+    """Команда для отчета о времени импорта при холодном старте воркера"""
+    help = 'Показывает время импорта модулей при запуске воркера и сравнивает его с IMPORT_TIME_BUDGET_MS'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=25, help='Количество модулей в отчете')
+        parser.add_argument('--all', action='store_true', help='Показывать и модули библиотек, не только проекта')
+        parser.add_argument('--budget', type=int, default=settings.IMPORT_TIME_BUDGET_MS,
+                            help='Допустимое время холодного старта, мс')
+
+    def handle(self, *args, **options):
+        entries = parse_importtime(run_cold_start(importtime=True).stderr)
+        seconds, modules = cold_start()
+        elapsed_ms = seconds * 1000
+
+        self.stdout.write('Пакеты (собственное время импорта, мс):')
+        for package, self_us in top_level_packages(entries)[:10]:
+            self.stdout.write(f'{self_us / 1000:10.1f}  {package}')
+
+        packages = project_packages()
+        if not options['all']:
+            entries = [entry for entry in entries if entry['module'].split('.', 1)[0] in packages]
+        self.stdout.write('\nМодули (с вложенными импортами, мс / собственное, мс):')
+        for entry in sorted(entries, key=lambda entry: entry['cumulative_us'], reverse=True)[:options['limit']]:
+            self.stdout.write(f'{entry["cumulative_us"] / 1000:10.1f}  {entry["self_us"] / 1000:8.1f}  '
+                              f'{entry["module"]}')
+
+        self.stdout.write(f'\nХолодный старт: {elapsed_ms:.0f} мс, бюджет {options["budget"]} мс')
+        lazy = loaded_lazy_modules(modules)
+        if lazy:
+            raise CommandError(f'При запуске импортированы отложенные модули: {", ".join(lazy)}')
+        if elapsed_ms > options['budget']:
+            raise CommandError(f'Холодный старт превышает бюджет: {elapsed_ms:.0f} > {options["budget"]} мс')
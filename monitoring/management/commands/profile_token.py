@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.core.management import BaseCommand
+
+from monitoring.profiler import make_token
+
+
+class Command(BaseCommand):
+    """Команда для выдачи токена профилирования запросов"""
+    help = 'Выводит подписанный токен для заголовка X-Profile'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--uses', type=int, default=settings.PROFILER_TOKEN_MAX_USES,
+                            help='Сколько запросов можно профилировать по токену')
+
+    def handle(self, *args, **options):
+        self.stdout.write(make_token(options['uses']))
+        self.stderr.write(f'Токен действует {settings.PROFILER_TOKEN_MAX_AGE} с для {options["uses"]} запросов')
@@ -0,0 +1,47 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError, call_command
+
+from monitoring.startup import load_fixture, pending_migrations, warm_up
+from users.models import backfill_normalized_phones
+
+
+class Command(BaseCommand):
+    """Команда подготовки к запуску контейнера"""
+    help = 'Применяет недостающие миграции, загружает измененные фикстуры, компилирует шаблоны и прогревает кэш'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Только проверить миграции: ошибка, если есть непримененные')
+        parser.add_argument('--no-warm', action='store_true', help='Не прогревать кэш')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+
+        pending = pending_migrations()
+        if options['check']:
+            if pending:
+                raise CommandError('Непримененные миграции: ' + ', '.join(f'{app}.{name}' for app, name in pending))
+            self.stdout.write('Миграции применены')
+            return
+        if pending:
+            self.stdout.write(f'Непримененных миграций: {len(pending)}')
+            call_command('migrate', interactive=False, verbosity=options['verbosity'])
+
+        for path in settings.STARTUP_FIXTURES:
+            loaded = load_fixture(path)
+            self.stdout.write(f'{os.path.basename(path)}: {"загружена" if loaded else "не изменилась"}')
+        # loaddata сохраняет объекты без вызова save(), номер в формате E.164 заполняется отдельно
+        filled = backfill_normalized_phones()
+        if filled:
+            self.stdout.write(f'Заполнено номеров E.164: {filled}')
+
+        if not options['no_warm']:
+            # Кэш процессов воркеров прогревается хуком gunicorn; здесь заполняется общий кэш в Redis
+            # и проверяются шаблоны и страницы до запуска сервера
+            for url, duration in warm_up().items():
+                self.stdout.write(f'Прогрев {url}: {duration} мс')
+
+        self.stdout.write(self.style.SUCCESS(f'Готово за {time.perf_counter() - started:.1f} с'))
@@ -0,0 +1,163 @@
+import json
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+import tracemalloc
+
+from django.conf import settings
+
+from monitoring.metrics import WORKER_RECYCLES, registry
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+# Снимок, с которым сравниваются следующие (в пределах процесса)
+_baseline = None
+_lock = threading.Lock()
+_recycling = False
+
+TRACE_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+)
+
+
+def rss_bytes():
+    """
+        Текущая резидентная память процесса. Вне Linux - пиковая (ru_maxrss), так как текущая недоступна.
+    """
+    try:
+        with open('/proc/self/statm', 'rb') as file:
+            return int(file.read().split()[1]) * PAGE_SIZE
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def recycle_threshold():
+    return getattr(settings, 'MEMORY_RECYCLE_RSS_MB', 0) * 1024 * 1024
+
+
+def should_recycle(rss):
+    """
+        Перезапуск возможен только в воркере gunicorn: мастер-процесс поднимет вместо него новый.
+    """
+    threshold = recycle_threshold()
+    return bool(threshold) and rss > threshold and not _recycling and sys.modules.get('gunicorn') is not None
+
+
+def is_recycling():
+    return _recycling
+
+
+def recycle(rss):
+    """
+        Плавно завершает воркер: по SIGTERM gunicorn и uvicorn дообрабатывают текущие запросы и выходят.
+    """
+    global _recycling
+    _recycling = True
+    WORKER_RECYCLES.inc('rss')
+    logger.warning('Воркер %s перезапускается: резидентная память %.0f МБ', os.getpid(), rss / 1024 / 1024)
+    if registry.directory():
+        registry.flush()
+    os.kill(os.getpid(), signal.SIGTERM)
+
+
+def start_tracing():
+    """
+        Включает tracemalloc и запоминает базовый снимок. Пока трассировка включена,
+        выделения памяти замедляются, поэтому она включается только на время поиска утечки.
+    """
+    global _baseline
+    with _lock:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(getattr(settings, 'MEMORY_TRACE_FRAMES', 10))
+        _baseline = take_snapshot()
+
+
+def stop_tracing():
+    global _baseline
+    with _lock:
+        _baseline = None
+        tracemalloc.stop()
+
+
+def take_snapshot():
+    return tracemalloc.take_snapshot().filter_traces(TRACE_FILTERS)
+
+
+def diff_report(limit=20, reset=False):
+    """
+        Сравнивает текущий снимок с базовым и возвращает места выделения памяти с наибольшим ростом.
+
+        Args:
+            limit (int): Количество мест выделения в отчете.
+            reset (bool): Сделать текущий снимок базовым для следующего сравнения.
+
+        Returns:
+            dict: pid, резидентная память, общий объем отслеживаемой памяти и места выделения
+            (файл:строка, прирост, текущий объем, число блоков и стек вызовов).
+    """
+    global _baseline
+    with _lock:
+        if _baseline is None:
+            return {'pid': os.getpid(), 'rss_bytes': rss_bytes(), 'tracing': False, 'top': []}
+        snapshot = take_snapshot()
+        stats = snapshot.compare_to(_baseline, 'traceback')[:limit]
+        if reset:
+            _baseline = snapshot
+    traced, peak = tracemalloc.get_traced_memory()
+    return {
+        'pid': os.getpid(),
+        'rss_bytes': rss_bytes(),
+        'tracing': True,
+        'traced_bytes': traced,
+        'traced_peak_bytes': peak,
+        'top': [{
+            'site': f'{stat.traceback[-1].filename}:{stat.traceback[-1].lineno}',
+            'size_diff': stat.size_diff,
+            'size': stat.size,
+            'count_diff': stat.count_diff,
+            'traceback': stat.traceback.format(most_recent_first=True),
+        } for stat in stats],
+    }
+
+
+def handle_snapshot_signal():
+    """
+        По сигналу в первый раз включает трассировку, в следующие - сохраняет отчет о росте памяти
+        в MEMORY_SNAPSHOT_DIR/<pid>-<время>.json.
+    """
+    if not tracemalloc.is_tracing():
+        start_tracing()
+        logger.info('Воркер %s: трассировка выделений памяти включена', os.getpid())
+        return
+    report = diff_report(reset=True)
+    directory = settings.MEMORY_SNAPSHOT_DIR
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'{os.getpid()}-{int(time.time())}.json')
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(report, file, ensure_ascii=False, indent=2)
+    logger.info('Воркер %s: отчет о памяти сохранен в %s', os.getpid(), path)
+
+
+def install_signal_handler():
+    """
+        Подключает сигнал MEMORY_SNAPSHOT_SIGNAL (по умолчанию SIGUSR2) для снимков памяти
+        конкретного воркера: kill -USR2 <pid>.
+    """
+    name = getattr(settings, 'MEMORY_SNAPSHOT_SIGNAL', None)
+    if not name or threading.current_thread() is not threading.main_thread():
+        return
+
+    def handler(signum, frame):
+        # Снимок занимает время: обработчик сигнала не должен останавливать цикл событий воркера
+        threading.Thread(target=handle_snapshot_signal, name='memory-snapshot', daemon=True).start()
+
+    signal.signal(getattr(signal, name), handler)
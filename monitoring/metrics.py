@@ -0,0 +1,366 @@
+import fcntl
+import json
+import logging
+import math
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from django.conf import settings
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+COUNTER, GAUGE, HISTOGRAM = 'counter', 'gauge', 'histogram'
+
+logger = logging.getLogger(__name__)
+
+
+class Metric:
+    """
+        Метрика в памяти процесса: значения по наборам меток.
+
+        Метки передаются позиционно в порядке labelnames - так запись стоит несколько микросекунд.
+
+        Attributes:
+            name (str): Имя метрики в формате Prometheus.
+            documentation (str): Описание для строки HELP.
+            labelnames (tuple): Имена меток.
+    """
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def samples(self):
+        with self._lock:
+            return [[list(labels), value if not isinstance(value, list) else list(value)]
+                    for labels, value in self._values.items()]
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(Metric):
+    kind = COUNTER
+
+    def inc(self, *labels, value=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + value
+
+
+class Gauge(Metric):
+    """
+        Значение процесса. При нескольких процессах выводится с меткой pid только для живых процессов.
+    """
+    kind = GAUGE
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(Metric):
+    """
+        Гистограмма с фиксированными границами; значение - [счетчики корзин..., сумма, количество].
+    """
+    kind = HISTOGRAM
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        super().__init__(name, documentation, labelnames)
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(labels)
+            if counts is None:
+                counts = self._values[labels] = [0] * (len(self.buckets) + 3)
+            counts[index] += 1
+            counts[-2] += value
+            counts[-1] += 1
+
+    @contextmanager
+    def time(self, *labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+
+class Registry:
+    """
+        Реестр метрик процесса и сборщиков, вычисляемых при чтении /metrics.
+
+        Несколько процессов gunicorn объединяются через каталог METRICS_DIR: каждый процесс
+        периодически (METRICS_FLUSH_INTERVAL) и при чтении /metrics записывает свой снимок в файл <pid>.json,
+        а представление суммирует файлы всех процессов. Снимки завершившихся процессов сворачиваются
+        в один файл, чтобы счетчики не уменьшались после перезапуска воркеров.
+    """
+
+    def __init__(self):
+        self.metrics = {}
+        self.collectors = []
+        self._flusher_pid = None
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+
+    def collector(self, func):
+        """
+            Регистрирует функцию, возвращающую метрики на момент чтения: [(имя, тип, описание, [(метки, значение)])].
+        """
+        self.collectors.append(func)
+        return func
+
+    def snapshot(self):
+        return {
+            name: {'type': metric.kind, 'help': metric.documentation, 'labelnames': list(metric.labelnames),
+                   'buckets': list(getattr(metric, 'buckets', ())), 'samples': metric.samples()}
+            for name, metric in self.metrics.items()
+        }
+
+    # Несколько процессов
+
+    @staticmethod
+    def directory():
+        return getattr(settings, 'METRICS_DIR', None)
+
+    def start_flusher(self):
+        """
+            Запускает в текущем процессе поток, периодически сохраняющий снимок метрик.
+        """
+        if not self.directory() or self._flusher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+            threading.Thread(target=self._flush_loop, name='metrics-flush', daemon=True).start()
+
+    def _flush_loop(self):
+        interval = getattr(settings, 'METRICS_FLUSH_INTERVAL', 5)
+        while True:
+            time.sleep(interval)
+            try:
+                self.flush()
+            except OSError:
+                pass
+
+    def flush(self):
+        directory = self.directory()
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'{os.getpid()}.json')
+        with open(path + '.tmp', 'w') as file:
+            json.dump(self.snapshot(), file)
+        os.replace(path + '.tmp', path)
+
+    def collect(self):
+        """
+            Возвращает метрики всех процессов (или только текущего, если METRICS_DIR не задан).
+        """
+        directory = self.directory()
+        if not directory:
+            return merge_snapshots([(self.snapshot(), None)])
+        self.flush()
+        with open(os.path.join(directory, '.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            entries = read_snapshots(directory)
+            dead = [(path, snapshot) for pid, path, snapshot in entries if pid and not pid_alive(int(pid))]
+            if dead:
+                compact(directory, [snapshot for _, snapshot in dead])
+                for path, _ in dead:
+                    os.remove(path)
+                entries = read_snapshots(directory)
+        return merge_snapshots([(snapshot, pid) for pid, _, snapshot in entries])
+
+    def render(self):
+        """
+            Возвращает метрики в текстовом формате Prometheus.
+
+            Ошибка сборщика (например, недоступная база) не мешает выводу остальных метрик:
+            она записывается в журнал и считается в collector_errors_total.
+        """
+        collected = []
+        for func in self.collectors:
+            try:
+                collected.extend(func())
+            except Exception:
+                logger.warning('Сборщик метрик %s завершился ошибкой', func.__name__, exc_info=True)
+                COLLECTOR_ERRORS.inc(func.__name__)
+        merged = self.collect()
+        for name, kind, documentation, samples in collected:
+            merged[name] = {'type': kind, 'help': documentation, 'buckets': [],
+                            'samples': {tuple(sorted(labels.items())): value for labels, value in samples}}
+        return render_text(merged)
+
+
+def read_snapshots(directory):
+    """
+        Читает снимки процессов из каталога.
+
+        Returns:
+            list: [(pid или None для архива, путь, снимок)].
+    """
+    entries = []
+    for name in os.listdir(directory):
+        if not name.endswith('.json'):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            with open(path) as file:
+                snapshot = json.load(file)
+        except (OSError, ValueError):
+            continue
+        pid = name[:-len('.json')]
+        entries.append((pid if pid.isdigit() else None, path, snapshot))
+    return entries
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def compact(directory, snapshots):
+    """
+        Добавляет счетчики и гистограммы завершившихся процессов в файл archive.json.
+    """
+    path = os.path.join(directory, 'archive.json')
+    if os.path.exists(path):
+        with open(path) as file:
+            snapshots.append(json.load(file))
+    archive = {}
+    for snapshot in snapshots:
+        for name, metric in snapshot.items():
+            if metric['type'] == GAUGE:
+                continue
+            target = archive.setdefault(name, dict(metric, samples=[]))
+            target['samples'].extend(metric['samples'])
+    for metric in archive.values():
+        summed = {}
+        for labels, value in metric['samples']:
+            add_value(summed, tuple(labels), value)
+        metric['samples'] = [[list(labels), value] for labels, value in summed.items()]
+    with open(path + '.tmp', 'w') as file:
+        json.dump(archive, file)
+    os.replace(path + '.tmp', path)
+
+
+def add_value(target, key, value):
+    current = target.get(key)
+    if current is None:
+        target[key] = list(value) if isinstance(value, list) else value
+    elif isinstance(value, list):
+        target[key] = [a + b for a, b in zip(current, value)]
+    else:
+        target[key] = current + value
+
+
+def merge_snapshots(snapshots):
+    """
+        Суммирует снимки процессов [(снимок, pid)]. Значения метрик-показателей получают метку pid.
+
+        Returns:
+            dict: {имя: {'type', 'help', 'buckets', 'samples': {((метка, значение), ...): значение}}}.
+    """
+    merged = {}
+    for snapshot, pid in snapshots:
+        for name, metric in snapshot.items():
+            target = merged.setdefault(name, {'type': metric['type'], 'help': metric['help'],
+                                              'buckets': metric['buckets'], 'samples': {}})
+            for labels, value in metric['samples']:
+                key = list(zip(metric['labelnames'], labels))
+                if metric['type'] == GAUGE and pid is not None:
+                    key.append(('pid', pid))
+                add_value(target['samples'], tuple(key), value)
+    return merged
+
+
+def escape(value):
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in labels) + '}'
+
+
+def format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_text(merged):
+    lines = []
+    for name in sorted(merged):
+        metric = merged[name]
+        lines.append(f'# HELP {name} {escape(metric["help"])}')
+        lines.append(f'# TYPE {name} {metric["type"]}')
+        for labels, value in sorted(metric['samples'].items()):
+            if metric['type'] != HISTOGRAM:
+                lines.append(f'{name}{format_labels(labels)} {format_value(value)}')
+                continue
+            cumulative = 0
+            for bound, count in zip(list(metric['buckets']) + [math.inf], value):
+                cumulative += count
+                bucket_labels = labels + (('le', format_value(bound)),)
+                lines.append(f'{name}_bucket{format_labels(bucket_labels)} {cumulative}')
+            lines.append(f'{name}_sum{format_labels(labels)} {format_value(value[-2])}')
+            lines.append(f'{name}_count{format_labels(labels)} {value[-1]}')
+    return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+REQUEST_LATENCY = Histogram('http_request_duration_seconds', 'Время обработки запроса',
+                            ('view', 'method', 'status'))
+REQUEST_QUERIES = Histogram('http_request_db_queries', 'Количество запросов к базе за HTTP-запрос', ('view',),
+                            buckets=(0, 1, 2, 5, 10, 20, 50, 100))
+DB_QUERY_DURATION = Histogram('db_query_duration_seconds', 'Время выполнения запроса к базе', ('alias',),
+                              buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5))
+DB_QUERY_ERRORS = Counter('db_query_errors_total', 'Ошибки запросов к базе', ('alias',))
+CACHE_REQUESTS = Counter('cache_requests_total', 'Обращения к кэшу', ('alias', 'result'))
+STRIPE_LATENCY = Histogram('stripe_request_duration_seconds', 'Время вызовов API Stripe', ('operation',))
+STRIPE_ERRORS = Counter('stripe_errors_total', 'Ошибки вызовов API Stripe', ('operation', 'error'))
+WEBHOOK_LAG = Histogram('stripe_webhook_lag_seconds', 'Задержка обработки события Stripe с момента его создания',
+                        ('event_type',), buckets=(1, 5, 15, 30, 60, 300, 900, 3600, 86400))
+TEMPLATE_RENDER_DURATION = Histogram('template_render_duration_seconds',
+                                     'Время отрисовки шаблонов, блоков и включений', ('template', 'kind'),
+                                     buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1))
+PROCESS_RSS = Gauge('process_resident_memory_bytes', 'Резидентная память процесса')
+REQUEST_MEMORY_GROWTH = Counter('http_request_memory_growth_bytes_total',
+                                'Рост резидентной памяти процесса во время обработки запросов', ('view',))
+WORKER_RECYCLES = Counter('worker_recycles_total', 'Плановые перезапуски воркеров', ('reason',))
+COLLECTOR_ERRORS = Counter('collector_errors_total', 'Ошибки сборщиков метрик при чтении /metrics', ('collector',))
+
+
+@contextmanager
+def observe_stripe(operation):
+    """
+        Измеряет вызов API Stripe и учитывает ошибки по классу исключения.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as error:
+        STRIPE_ERRORS.inc(operation, type(error).__name__)
+        raise
+    finally:
+        STRIPE_LATENCY.observe(time.perf_counter() - started, operation)
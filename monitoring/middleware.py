@@ -0,0 +1,112 @@
+import time
+
+from django.http import HttpResponse, JsonResponse
+from django.urls import reverse
+
+from monitoring.instrumentation import request_queries
+from monitoring.memory import recycle, rss_bytes, should_recycle
+from monitoring.metrics import PROCESS_RSS, REQUEST_LATENCY, REQUEST_MEMORY_GROWTH, REQUEST_QUERIES, registry
+from monitoring.profiler import Sampler, check_token, store_report
+from monitoring.slowqueries import current_request
+
+
+class MetricsMiddleware:
+    """
+        Измеряет время обработки и число запросов к базе для каждого HTTP-запроса.
+
+        Ставится первым в MIDDLEWARE, чтобы учитывать и остальные middleware. Метка view - имя маршрута,
+        а не путь, чтобы число рядов метрики не зависело от slug и идентификаторов.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        registry.start_flusher()
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        counter = [0]
+        token = request_queries.set(counter)
+        request_token = current_request.set(request)
+        status = 500
+        try:
+            response = self.get_response(request)
+            status = response.status_code
+            return response
+        finally:
+            request_queries.reset(token)
+            current_request.reset(request_token)
+            match = request.resolver_match
+            view = match.view_name if match else 'unresolved'
+            REQUEST_LATENCY.observe(time.perf_counter() - started, view, request.method, status)
+            REQUEST_QUERIES.observe(counter[0], view)
+
+
+class MemoryWatchdogMiddleware:
+    """
+        Следит за резидентной памятью воркера: публикует ее в метриках, относит рост памяти
+        к представлению запроса и плавно перезапускает воркер выше MEMORY_RECYCLE_RSS_MB.
+
+        При нескольких одновременных запросах в процессе рост делится между ними неточно,
+        но представление с утечкой со временем выделяется.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        before = rss_bytes()
+        response = self.get_response(request)
+        rss = rss_bytes()
+        PROCESS_RSS.set(rss)
+        if rss > before:
+            match = request.resolver_match
+            REQUEST_MEMORY_GROWTH.inc(match.view_name if match else 'unresolved', value=rss - before)
+        if should_recycle(rss):
+            # Обработчик SIGTERM только отмечает завершение: текущий ответ будет отправлен
+            recycle(rss)
+        return response
+
+
+class ProfilerMiddleware:
+    """
+        Профилирование отдельного запроса по требованию.
+
+        Включается параметром ?_profile= для персонала или заголовком X-Profile с подписанным токеном
+        (команда profile_token), например для API и страниц без сессии:
+            _profile=folded - вместо страницы возвращаются стеки в свернутом формате для flame graph;
+            _profile=json - вместо страницы возвращается сводка по SQL, кэшу, шаблонам и функциям;
+            _profile=store и заголовок X-Profile - страница возвращается как обычно, отчет сохраняется,
+            а ссылка на него передается в заголовке X-Profile-Url.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mode = self.profile_mode(request)
+        if mode is None:
+            return self.get_response(request)
+
+        with Sampler() as sampler:
+            response = self.get_response(request)
+            if hasattr(response, 'render') and callable(response.render) and not response.is_rendered:
+                response.render()
+        report = sampler.report()
+
+        if mode == 'folded':
+            return HttpResponse(report['folded'], content_type='text/plain; charset=utf-8')
+        if mode == 'json':
+            return JsonResponse(report)
+        profile_id = store_report(report, request)
+        response['X-Profile-Url'] = reverse('monitoring:profile_detail', args=[profile_id])
+        return response
+
+    @staticmethod
+    def profile_mode(request):
+        token = request.headers.get('X-Profile')
+        if token:
+            return 'store' if check_token(token) else None
+        mode = request.GET.get('_profile')
+        if mode is None or not (request.user.is_authenticated and request.user.is_staff):
+            return None
+        return mode if mode in ('folded', 'json') else 'store'
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.4 on 2026-10-19 13:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LoadedFixture',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name='Фикстура')),
+                ('digest', models.CharField(max_length=64, verbose_name='SHA-256 содержимого')),
+                ('loaded_at', models.DateTimeField(auto_now=True, verbose_name='Загружена')),
+            ],
+            options={
+                'verbose_name': 'Загруженная фикстура',
+                'verbose_name_plural': 'Загруженные фикстуры',
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+from django.db import models
+
+
+class LoadedFixture(models.Model):
+    """
+        Загруженная при запуске фикстура и хеш ее содержимого: неизмененная фикстура повторно не загружается.
+    """
+    name = models.CharField(max_length=255, unique=True, verbose_name='Фикстура')
+    digest = models.CharField(max_length=64, verbose_name='SHA-256 содержимого')
+    loaded_at = models.DateTimeField(auto_now=True, verbose_name='Загружена')
+
+    class Meta:
+        verbose_name = 'Загруженная фикстура'
+        verbose_name_plural = 'Загруженные фикстуры'
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,194 @@
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+
+TOKEN_SALT = 'monitoring.profiler'
+
+# Категория выборки определяется по первому совпадению в стеке, от вызова к вызывающему
+CATEGORIES = (
+    ('sql', (os.path.join('django', 'db', 'backends'), 'psycopg2')),
+    ('cache', (os.path.join('django', 'core', 'cache'), os.path.join('site-packages', 'redis'))),
+    ('template', (os.path.join('django', 'template'),)),
+)
+
+
+def make_token(uses=None):
+    """
+        Создает подписанный токен для заголовка X-Profile, действующий PROFILER_TOKEN_MAX_AGE секунд.
+
+        Токен содержит случайный идентификатор, по которому в кэше считаются его использования:
+        профилировать можно не больше uses (по умолчанию PROFILER_TOKEN_MAX_USES) запросов.
+    """
+    uses = uses or getattr(settings, 'PROFILER_TOKEN_MAX_USES', 10)
+    return signing.dumps({'nonce': uuid.uuid4().hex, 'uses': uses}, salt=TOKEN_SALT)
+
+
+def check_token(token):
+    """
+        Проверяет подпись и срок токена и засчитывает его использование.
+
+        Returns:
+            bool: Токен действителен и лимит использований не исчерпан.
+    """
+    max_age = getattr(settings, 'PROFILER_TOKEN_MAX_AGE', 3600)
+    try:
+        payload = signing.loads(token, salt=TOKEN_SALT, max_age=max_age)
+        key, uses = f'profiler:token:{payload["nonce"]}', int(payload['uses'])
+    except (signing.BadSignature, KeyError, TypeError, ValueError):
+        return False
+    cache.add(key, 0, max_age)
+    try:
+        return cache.incr(key) <= uses
+    except ValueError:
+        return False
+
+
+def frame_label(code):
+    filename = code.co_filename
+    base_dir = str(settings.BASE_DIR)
+    if filename.startswith(base_dir):
+        filename = os.path.relpath(filename, base_dir)
+    elif 'site-packages' in filename:
+        filename = filename.split('site-packages' + os.sep, 1)[1]
+    return f'{code.co_name} ({filename}:{code.co_firstlineno})'
+
+
+class Sampler:
+    """
+        Выборочный профилировщик одного потока: отдельный поток раз в interval секунд
+        снимает стек профилируемого потока через sys._current_frames().
+
+        В отличие от cProfile, профилируемый код не замедляется на каждом вызове функции,
+        а точность определяется частотой выборок.
+
+        Attributes:
+            stacks (Counter): Число выборок по стекам (кортежи кодов от корня к листу).
+            samples (int): Общее число выборок.
+    """
+
+    def __init__(self, thread_id=None, interval=None):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval or getattr(settings, 'PROFILER_INTERVAL', 0.005)
+        self.stacks = Counter()
+        self.samples = 0
+        self.duration = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self._started
+
+    def _run(self):
+        max_depth = getattr(settings, 'PROFILER_MAX_DEPTH', 200)
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None and len(stack) < max_depth:
+                stack.append(frame.f_code)
+                frame = frame.f_back
+            if stack:
+                self.stacks[tuple(reversed(stack))] += 1
+                self.samples += 1
+
+    def folded(self):
+        """
+            Стеки в свернутом формате (flamegraph.pl, speedscope, inferno): 'корень;...;лист число'.
+        """
+        lines = {}
+        for stack, count in self.stacks.items():
+            key = ';'.join(frame_label(code) for code in stack)
+            lines[key] = lines.get(key, 0) + count
+        return ''.join(f'{key} {count}\n' for key, count in sorted(lines.items()))
+
+    def report(self):
+        """
+            Сводка: длительность, время по категориям (SQL, кэш, шаблоны, остальное), самые частые функции и стеки.
+        """
+        per_sample = self.duration / self.samples * 1000 if self.samples else 0
+        categories, own = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            categories[categorize(stack)] += count
+            own[frame_label(stack[-1])] += count
+        return {
+            'duration_ms': round(self.duration * 1000, 2),
+            'samples': self.samples,
+            'interval_ms': self.interval * 1000,
+            'categories_ms': {name: round(categories[name] * per_sample, 2)
+                              for name in ('sql', 'cache', 'template', 'other')},
+            'top_functions': [{'function': label, 'ms': round(count * per_sample, 2)}
+                              for label, count in own.most_common(20)],
+            'folded': self.folded(),
+        }
+
+
+def categorize(stack):
+    for code in reversed(stack):
+        for name, markers in CATEGORIES:
+            if any(marker in code.co_filename for marker in markers):
+                return name
+    return 'other'
+
+
+def store_report(report, request):
+    """
+        Сохраняет отчет в PROFILER_DIR и возвращает его идентификатор, удаляя устаревшие отчеты.
+    """
+    profile_id = uuid.uuid4().hex
+    directory = settings.PROFILER_DIR
+    os.makedirs(directory, exist_ok=True)
+    report = dict(report, path=request.get_full_path(), method=request.method, created=time.time())
+    with open(os.path.join(directory, f'{profile_id}.json'), 'w', encoding='utf-8') as file:
+        json.dump(report, file, ensure_ascii=False)
+    prune_reports(directory)
+    return profile_id
+
+
+def prune_reports(directory, max_age=None, max_count=None):
+    """
+        Удаляет отчеты старше PROFILER_REPORT_MAX_AGE секунд и самые старые сверх PROFILER_MAX_REPORTS.
+
+        Returns:
+            int: Количество удаленных отчетов.
+    """
+    max_age = max_age or getattr(settings, 'PROFILER_REPORT_MAX_AGE', 7 * 24 * 60 * 60)
+    max_count = max_count or getattr(settings, 'PROFILER_MAX_REPORTS', 500)
+    reports = []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.name.endswith('.json'):
+                try:
+                    reports.append((entry.stat().st_mtime, entry.path))
+                except FileNotFoundError:
+                    continue
+    reports.sort(reverse=True)
+    deadline = time.time() - max_age
+    removed = 0
+    for index, (mtime, path) in enumerate(reports):
+        if index >= max_count or mtime < deadline:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            removed += 1
+    return removed
+
+
+def load_report(profile_id):
+    path = os.path.join(settings.PROFILER_DIR, f'{profile_id}.json')
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
@@ -0,0 +1,176 @@
+import hashlib
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+
+from django.conf import settings
+
+# Текущий HTTP-запрос, чтобы привязать медленный запрос к представлению
+current_request = ContextVar('current_request', default=None)
+
+recent = deque(maxlen=1000)
+_write_lock = threading.Lock()
+
+STRING_RE = re.compile(r"'(?:[^']|'')*'")
+NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+IN_LIST_RE = re.compile(r'\bIN \((?:\s*(?:%s|\?)\s*,)*\s*(?:%s|\?)\s*\)', re.IGNORECASE)
+SPACE_RE = re.compile(r'\s+')
+
+DJANGO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__import__('django').__file__)))
+MONITORING_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def threshold():
+    return getattr(settings, 'SLOW_QUERY_THRESHOLD_MS', 200) / 1000
+
+
+def normalize_sql(sql):
+    """
+        Приводит SQL к отпечатку: литералы и параметры заменяются на ?, списки IN (...) сворачиваются.
+    """
+    sql = STRING_RE.sub('?', sql)
+    sql = NUMBER_RE.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = IN_LIST_RE.sub('IN (...)', sql)
+    return SPACE_RE.sub(' ', sql).strip()
+
+
+def fingerprint(normalized):
+    return hashlib.sha1(normalized.encode()).hexdigest()[:12]
+
+
+def template_frame(frame):
+    """
+        Ищет в стеке узел шаблона Django, во время отрисовки которого выполнен запрос.
+
+        Returns:
+            str | None: 'шаблон:строка'.
+    """
+    while frame is not None:
+        node = frame.f_locals.get('self') if frame.f_code.co_name in ('render', 'render_annotated') else None
+        origin = getattr(node, 'origin', None)
+        token = getattr(node, 'token', None)
+        if origin is not None and token is not None:
+            return f'{origin.template_name}:{token.lineno}'
+        frame = frame.f_back
+    return None
+
+
+def code_frame(frame):
+    """
+        Ищет ближайший к запросу кадр кода проекта (вне Django, библиотек и мониторинга).
+
+        Returns:
+            str | None: 'файл:строка в функции'.
+    """
+    base_dir = str(settings.BASE_DIR)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(base_dir) and not filename.startswith((DJANGO_DIR, MONITORING_DIR)) \
+                and 'site-packages' not in filename:
+            return f'{os.path.relpath(filename, base_dir)}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return None
+
+
+def record_slow_query(sql, duration, context):
+    """
+        Сохраняет медленный запрос (с вероятностью SLOW_QUERY_SAMPLE_RATE) в память процесса и в журнал JSONL.
+
+        Стек разбирается только здесь, для запросов дольше порога, поэтому обычные запросы
+        платят лишь за сравнение времени.
+    """
+    if random.random() >= getattr(settings, 'SLOW_QUERY_SAMPLE_RATE', 1.0):
+        return
+    cursor = context.get('cursor')
+    request = current_request.get()
+    match = getattr(request, 'resolver_match', None) if request is not None else None
+    frame = sys._getframe(2)
+    normalized = normalize_sql(sql)
+    entry = {
+        'time': time.time(),
+        'fingerprint': fingerprint(normalized),
+        'sql': normalized,
+        'duration_ms': round(duration * 1000, 2),
+        'rows': getattr(cursor, 'rowcount', -1),
+        'alias': context['connection'].alias,
+        'view': match.view_name if match else (request.path if request is not None else None),
+        'template': template_frame(frame),
+        'frame': code_frame(frame),
+        'pid': os.getpid(),
+    }
+    recent.append(entry)
+    path = getattr(settings, 'SLOW_QUERY_LOG', None)
+    if path:
+        line = json.dumps(entry, ensure_ascii=False) + '\n'
+        with _write_lock, open(path, 'a', encoding='utf-8') as file:
+            file.write(line)
+
+
+def read_log(path, max_bytes=None):
+    """
+        Читает последние записи журнала медленных запросов (всех процессов).
+    """
+    max_bytes = max_bytes or getattr(settings, 'SLOW_QUERY_REPORT_BYTES', 5 * 1024 * 1024)
+    try:
+        with open(path, 'rb') as file:
+            file.seek(0, os.SEEK_END)
+            size = file.tell()
+            file.seek(max(size - max_bytes, 0))
+            data = file.read()
+    except FileNotFoundError:
+        return []
+    lines = data.decode('utf-8', 'replace').splitlines()
+    if size > max_bytes:
+        # Первая строка обрезана по границе чтения
+        lines = lines[1:]
+    entries = []
+    for line in lines:
+        try:
+            entries.append(json.loads(line))
+        except ValueError:
+            continue
+    return entries
+
+
+def aggregate(entries):
+    """
+        Группирует медленные запросы по отпечатку SQL.
+
+        Returns:
+            list: Словари с количеством, суммарным, средним и максимальным временем, числом строк
+            и местами вызова, по убыванию суммарного времени.
+    """
+    groups = {}
+    for entry in entries:
+        group = groups.get(entry['fingerprint'])
+        if group is None:
+            group = groups[entry['fingerprint']] = {
+                'fingerprint': entry['fingerprint'], 'sql': entry['sql'], 'count': 0, 'total_ms': 0,
+                'max_ms': 0, 'rows': 0, 'views': set(), 'templates': set(), 'frames': set(),
+            }
+        group['count'] += 1
+        group['total_ms'] += entry['duration_ms']
+        group['max_ms'] = max(group['max_ms'], entry['duration_ms'])
+        group['rows'] = max(group['rows'], entry['rows'])
+        for field, key in (('views', 'view'), ('templates', 'template'), ('frames', 'frame')):
+            if entry.get(key):
+                group[field].add(entry[key])
+    result = sorted(groups.values(), key=lambda group: group['total_ms'], reverse=True)
+    for group in result:
+        group['avg_ms'] = round(group['total_ms'] / group['count'], 2)
+        group['total_ms'] = round(group['total_ms'], 2)
+        for field in ('views', 'templates', 'frames'):
+            group[field] = sorted(group[field])
+    return result
+
+
+def report_entries():
+    path = getattr(settings, 'SLOW_QUERY_LOG', None)
+    return read_log(path) if path else list(recent)
@@ -0,0 +1,193 @@
+import hashlib
+import importlib.util
+import logging
+import os
+import threading
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.migrations.loader import MigrationLoader
+from django.db.migrations.recorder import MigrationRecorder
+
+from monitoring.memory import is_recycling
+from monitoring.templating import compile_templates
+
+logger = logging.getLogger(__name__)
+
+# Состояние прогрева текущего процесса
+state = {'warm': False, 'error': None, 'warmed_at': None, 'failures': 0, 'retry_at': None}
+_warm_lock = threading.Lock()
+
+
+def migration_names(app_label):
+    """
+        Имена миграций приложения по файлам в каталоге, без импорта модулей миграций.
+    """
+    module_name, _ = MigrationLoader.migrations_module(app_label)
+    if module_name is None:
+        return []
+    try:
+        spec = importlib.util.find_spec(module_name)
+    except ImportError:
+        return []
+    if spec is None or not spec.submodule_search_locations:
+        return []
+    names = []
+    for directory in spec.submodule_search_locations:
+        for filename in os.listdir(directory):
+            name, extension = os.path.splitext(filename)
+            if extension == '.py' and name != '__init__' and not name.startswith(('_', '~')):
+                names.append(name)
+    return names
+
+
+def pending_migrations(using=DEFAULT_DB_ALIAS):
+    """
+        Сравнивает файлы миграций с таблицей django_migrations.
+
+        В отличие от migrate --check граф миграций не строится: это одно чтение таблицы и список файлов.
+        Сжатая миграция, заменившая уже примененные, считается непримененной - тогда migrate просто ничего не сделает.
+
+        Returns:
+            list: [(приложение, миграция)] без записи о применении.
+    """
+    recorder = MigrationRecorder(connections[using])
+    applied = set(recorder.applied_migrations()) if recorder.has_table() else set()
+    return sorted((app_config.label, name) for app_config in apps.get_app_configs()
+                  for name in migration_names(app_config.label) if (app_config.label, name) not in applied)
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_fixture(path):
+    """
+        Загружает фикстуру, только если ее содержимое изменилось с прошлой загрузки.
+
+        Returns:
+            bool: Была ли фикстура загружена.
+    """
+    from monitoring.models import LoadedFixture
+
+    name, digest = os.path.basename(path), file_digest(path)
+    if LoadedFixture.objects.filter(name=name, digest=digest).exists():
+        return False
+    call_command('loaddata', str(path), verbosity=0)
+    LoadedFixture.objects.update_or_create(name=name, defaults={'digest': digest})
+    return True
+
+
+def warm_host():
+    """
+        Публичный адрес сайта для запросов прогрева: STARTUP_WARM_HOST или первый конкретный адрес
+        из ALLOWED_HOSTS (не шаблон '*' и не '.домен').
+
+        Returns:
+            str | None: Адрес или None, если он неизвестен.
+    """
+    host = getattr(settings, 'STARTUP_WARM_HOST', None)
+    if host:
+        return host
+    return next((host for host in settings.ALLOWED_HOSTS if host != '*' and not host.startswith('.')), None)
+
+
+def warm_up():
+    """
+        Прогревает текущий процесс: компилирует шаблоны и запрашивает STARTUP_WARM_URLS внутри процесса,
+        заполняя кэш выборок, локальный уровень кэша и отложенные импорты.
+
+        Страницы запрашиваются с адресом warm_host(), под которым их запрашивают клиенты, поэтому
+        заполняется и общий кэш страниц; если адрес неизвестен, записи кэша страниц прогрева
+        настоящим запросам не подойдут.
+
+        Raises:
+            RuntimeError: Если страница прогрева ответила ошибкой сервера.
+
+        Returns:
+            dict: Время прогрева страниц {адрес: мс}.
+    """
+    from django.test import Client
+
+    compile_templates()
+    host = warm_host()
+    client = Client(raise_request_exception=False, **({'HTTP_HOST': host} if host else {}))
+    timings = {}
+    for url in getattr(settings, 'STARTUP_WARM_URLS', ()):
+        started = time.perf_counter()
+        response = client.get(url)
+        timings[url] = round((time.perf_counter() - started) * 1000, 1)
+        if response.status_code >= 500:
+            raise RuntimeError(f'{url} при прогреве ответил {response.status_code}')
+    state.update(warm=True, error=None, warmed_at=time.time(), failures=0, retry_at=None)
+    return timings
+
+
+def ensure_warm():
+    """
+        Прогревает процесс, если этого еще не сделал хук gunicorn (например, под runserver).
+        Пока прогрев выполняется в другом потоке, сразу возвращает False.
+
+        После неудачи прогрев повторяется не раньше чем через STARTUP_WARM_RETRY_INTERVAL секунд,
+        с каждой следующей неудачей интервал удваивается до STARTUP_WARM_RETRY_MAX_INTERVAL:
+        частые проверки /readyz не должны раз за разом запускать прогрев при недоступной базе.
+    """
+    if state['warm']:
+        return True
+    if state['retry_at'] and time.monotonic() < state['retry_at']:
+        return False
+    if not _warm_lock.acquire(blocking=False):
+        return False
+    try:
+        if not state['warm']:
+            warm_up()
+    except Exception as error:
+        state['error'] = f'{type(error).__name__}: {error}'
+        state['failures'] += 1
+        interval = min(getattr(settings, 'STARTUP_WARM_RETRY_INTERVAL', 5) * 2 ** (state['failures'] - 1),
+                       getattr(settings, 'STARTUP_WARM_RETRY_MAX_INTERVAL', 300))
+        state['retry_at'] = time.monotonic() + interval
+        logger.exception('Прогрев процесса %s не удался, повтор через %s с', os.getpid(), interval)
+    finally:
+        _warm_lock.release()
+    return state['warm']
+
+
+def check_database():
+    with connections[DEFAULT_DB_ALIAS].cursor() as cursor:
+        cursor.execute('SELECT 1')
+
+
+def check_cache():
+    key = f'readiness:{os.getpid()}'
+    cache.set(key, 1, 10)
+    if cache.get(key) != 1:
+        raise RuntimeError('значение не прочитано из кэша')
+
+
+def readiness():
+    """
+        Проверки готовности воркера принимать трафик.
+
+        Returns:
+            tuple: (готов ли, {проверка: 'ok' или описание ошибки}).
+    """
+    checks = {}
+    for name, check in (('database', check_database), ('cache', check_cache)):
+        try:
+            check()
+            checks[name] = 'ok'
+        except Exception as error:
+            checks[name] = f'{type(error).__name__}: {error}'
+    checks['warm'] = 'ok' if ensure_warm() else (state['error'] or 'прогревается')
+    # Воркер, уходящий на перезапуск по памяти, новых запросов принимать не должен
+    checks['memory'] = 'перезапускается' if is_recycling() else 'ok'
+    return all(value == 'ok' for value in checks.values()), checks
@@ -0,0 +1,92 @@
+import os
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+from django.template import TemplateSyntaxError, engines
+from django.template.backends.django import DjangoTemplates
+from django.template.base import Template
+from django.template.loader_tags import BlockNode, IncludeNode
+
+from monitoring.metrics import TEMPLATE_RENDER_DURATION
+
+
+def timed(method, kind, label):
+    """
+        Оборачивает метод отрисовки, записывая время в TEMPLATE_RENDER_DURATION с меткой label(self, context).
+    """
+    def render(self, context):
+        started = time.perf_counter()
+        try:
+            return method(self, context)
+        finally:
+            TEMPLATE_RENDER_DURATION.observe(time.perf_counter() - started, label(self, context), kind)
+
+    render.instrumented = True
+    return render
+
+
+def template_label(template, context):
+    return template.name or '<string>'
+
+
+def block_label(block, context):
+    # Блок родительского шаблона подписывается отрисовываемым шаблоном страницы, который его переопределяет
+    return f'{context.template_name or "<string>"}:{block.name}'
+
+
+def include_label(node, context):
+    name = getattr(node.template, 'var', node.template)
+    return name if isinstance(name, str) else '<variable>'
+
+
+def instrument_templates():
+    """
+        Измеряет отрисовку шаблонов, {% block %} и {% include %}.
+
+        Время вложенных узлов входит во время внешних: шаблон с {% extends %} включает отрисовку родителя,
+        включаемый шаблон учитывается и как include, и как template.
+    """
+    if getattr(Template.render, 'instrumented', False):
+        return
+    Template.render = timed(Template.render, 'template', template_label)
+    BlockNode.render = timed(BlockNode.render, 'block', block_label)
+    IncludeNode.render = timed(IncludeNode.render, 'include', include_label)
+
+
+def template_names(backend):
+    """
+        Имена всех шаблонов из каталогов загрузчиков движка Django.
+    """
+    names = set()
+    for loader in backend.engine.template_loaders:
+        for directory in loader.get_dirs():
+            for root, _, files in os.walk(directory):
+                names.update(os.path.relpath(os.path.join(root, file), directory).replace(os.sep, '/')
+                             for file in files)
+    return sorted(names)
+
+
+def compile_templates():
+    """
+        Компилирует все шаблоны: кэширующий загрузчик сохраняет их, и на запросах разбор шаблонов не выполняется.
+
+        Raises:
+            ImproperlyConfigured: Если хотя бы один шаблон не компилируется (перечисляются все ошибки).
+
+        Returns:
+            int: Число скомпилированных шаблонов.
+    """
+    compiled, errors = 0, []
+    for backend in engines.all():
+        if not isinstance(backend, DjangoTemplates):
+            continue
+        for name in template_names(backend):
+            try:
+                backend.get_template(name)
+            except (TemplateSyntaxError, UnicodeDecodeError) as error:
+                errors.append(f'{name}: {error}')
+            else:
+                compiled += 1
+    if errors:
+        raise ImproperlyConfigured('Шаблоны с ошибками:\n' + '\n'.join(errors))
+    return compiled
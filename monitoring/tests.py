@@ -0,0 +1,405 @@
+import json
+import os
+import shutil
+import signal
+import sys
+import tempfile
+import time
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.core.signals import request_started
+from django.db import connection
+from django.db.migrations.recorder import MigrationRecorder
+from django.conf import settings
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from django.urls import reverse
+
+from blog.models import Blog
+from monitoring import memory
+from monitoring.importtime import cold_start, loaded_lazy_modules, parse_importtime
+from monitoring.metrics import PROCESS_RSS, STRIPE_ERRORS, TEMPLATE_RENDER_DURATION, WORKER_RECYCLES, Counter, Gauge, observe_stripe, registry
+from monitoring.middleware import MetricsMiddleware
+from monitoring.profiler import Sampler, make_token, prune_reports
+from monitoring.slowqueries import normalize_sql, read_log, recent
+from monitoring.startup import ensure_warm, load_fixture, pending_migrations, state, warm_up
+from monitoring.templating import compile_templates
+from users.models import User
+from users.tests import SetupTestCase
+
+
+class MetricsEndpointTest(SetupTestCase):
+
+    def test_metrics_include_requests_queries_and_cache(self):
+        self.client.login(phone='123456789', password='testpass123')
+        self.client.get(reverse('blog:home'))
+        cache.get('metrics-test-missing')
+
+        with override_settings(METRICS_TOKEN='secret'):
+            body = self.client.get(reverse('monitoring:metrics'), HTTP_AUTHORIZATION='Bearer secret').content.decode()
+        self.assertIn('http_request_duration_seconds_bucket{view="blog:home",method="GET",status="200",le="+Inf"}', body)
+        self.assertIn('# TYPE db_query_duration_seconds histogram', body)
+        self.assertIn('cache_requests_total{alias="default",result="miss"}', body)
+        self.assertIn('bulk_action_jobs{status="pending"} 0', body)
+
+    def test_token_is_required(self):
+        url = reverse('monitoring:metrics')
+        with override_settings(METRICS_TOKEN=None):
+            self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer ').status_code, 403)
+        with override_settings(METRICS_TOKEN='secret'):
+            self.assertEqual(self.client.get(url).status_code, 403)
+            self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+
+    def test_stripe_errors_are_counted_by_type(self):
+        with self.assertRaises(ValueError), observe_stripe('test_operation'):
+            raise ValueError
+        self.assertEqual(STRIPE_ERRORS._values[('test_operation', 'ValueError')], 1)
+
+    def test_middleware_overhead_is_small(self):
+        middleware = MetricsMiddleware(lambda request: HttpResponse())
+        request = RequestFactory().get('/')
+        request.resolver_match = None
+        started = time.perf_counter()
+        for _ in range(2000):
+            middleware(request)
+        self.assertLess((time.perf_counter() - started) / 2000, 50e-6)
+
+
+class MultiProcessMetricsTest(SetupTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.counter = Counter('test_events_total', 'Тестовый счетчик', ('kind',))
+        self.gauge = Gauge('test_level', 'Тестовый показатель')
+        self.addCleanup(registry.metrics.pop, 'test_events_total')
+        self.addCleanup(registry.metrics.pop, 'test_level')
+
+    def write_snapshot(self, name, events, level):
+        snapshot = {
+            'test_events_total': {'type': 'counter', 'help': '', 'labelnames': ['kind'], 'buckets': [],
+                                  'samples': [[['a'], events]]},
+            'test_level': {'type': 'gauge', 'help': '', 'labelnames': [], 'buckets': [], 'samples': [[[], level]]},
+        }
+        with open(os.path.join(self.directory, name), 'w') as file:
+            json.dump(snapshot, file)
+
+    def test_worker_snapshots_are_summed_and_dead_workers_archived(self):
+        self.counter.inc('a', value=2)
+        self.gauge.set(7)
+        # Процесс с таким pid заведомо не существует
+        self.write_snapshot('999999999.json', events=3, level=100)
+        with override_settings(METRICS_DIR=self.directory):
+            body = registry.render()
+            self.assertIn('test_events_total{kind="a"} 5', body)
+            self.assertIn(f'test_level{{pid="{os.getpid()}"}} 7', body)
+            self.assertNotIn('100', body.split('test_level')[-1])
+            self.assertEqual(set(os.listdir(self.directory)), {'.lock', 'archive.json', f'{os.getpid()}.json'})
+
+            self.counter.inc('a')
+            self.assertIn('test_events_total{kind="a"} 6', registry.render())
+
+    def test_failing_collector_does_not_hide_other_metrics(self):
+        def broken_collector():
+            raise RuntimeError('база недоступна')
+
+        registry.collector(broken_collector)
+        self.addCleanup(registry.collectors.remove, broken_collector)
+        self.counter.inc('a')
+        with self.assertLogs('monitoring.metrics', 'WARNING'):
+            body = registry.render()
+        self.assertIn('test_events_total{kind="a"} 1', body)
+        self.assertIn('collector_errors_total{collector="broken_collector"}', body)
+        self.assertIn('bulk_action_jobs', body)
+
+
+class SlowQueryLogTest(SetupTestCase):
+
+    def setUp(self):
+        super().setUp()
+        recent.clear()
+        self.log = os.path.join(tempfile.mkdtemp(), 'slow.jsonl')
+        self.addCleanup(shutil.rmtree, os.path.dirname(self.log))
+        self.client.login(phone='123456789', password='testpass123')
+
+    def test_fingerprint_ignores_literals_and_in_lists(self):
+        first = normalize_sql('SELECT * FROM "blog_blog" WHERE "id" IN (%s, %s, %s) AND "title" = \'a\'')
+        second = normalize_sql('SELECT *  FROM "blog_blog" WHERE "id" IN (%s) AND "title" = \'b\'')
+        self.assertEqual(first, 'SELECT * FROM "blog_blog" WHERE "id" IN (...) AND "title" = ?')
+        self.assertEqual(first, second)
+
+    def test_slow_queries_are_attributed_and_reported(self):
+        blog = Blog.objects.create(title='Медленный', user=self.user, published_on=True)
+        with override_settings(SLOW_QUERY_THRESHOLD_MS=0, SLOW_QUERY_LOG=self.log):
+            self.client.get(reverse('blog:blog_detail', args=[blog.slug]))
+            entries = read_log(self.log)
+            self.assertTrue(entries)
+            self.assertTrue(all(entry['view'] == 'blog:blog_detail' for entry in entries))
+            self.assertTrue(any(entry['template'] and entry['template'].startswith('blog/blog_detail.html:')
+                                for entry in entries))
+            self.assertTrue(any(entry['frame'] and entry['frame'].startswith('blog/views.py:') for entry in entries))
+
+            response = self.client.get(reverse('monitoring:slow_queries'))
+        self.assertContains(response, 'blog:blog_detail')
+
+    def test_fast_queries_are_not_recorded(self):
+        with override_settings(SLOW_QUERY_THRESHOLD_MS=10_000):
+            self.client.get(reverse('blog:home'))
+        self.assertEqual(len(recent), 0)
+
+
+def busy_wait(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        time.sleep(0.001)
+
+
+class ProfilerTest(SetupTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        settings_override = override_settings(PROFILER_DIR=self.directory)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_sampler_attributes_time_to_functions(self):
+        with Sampler(interval=0.001) as sampler:
+            busy_wait(0.05)
+        report = sampler.report()
+        self.assertGreater(report['samples'], 0)
+        self.assertGreater(report['categories_ms']['other'], 0)
+        self.assertTrue(report['top_functions'][0]['function'].startswith('busy_wait (monitoring/tests.py:'))
+        self.assertIn('busy_wait (monitoring/tests.py:', report['folded'])
+
+    def test_staff_gets_report_instead_of_page(self):
+        self.client.login(phone='123456789', password='testpass123')
+        response = self.client.get(reverse('blog:home'), {'_profile': 'json'})
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(set(response.json()['categories_ms']), {'sql', 'cache', 'template', 'other'})
+
+        response = self.client.get(reverse('blog:home'), {'_profile': 'folded'})
+        self.assertEqual(response['Content-Type'], 'text/plain; charset=utf-8')
+
+    def test_parameter_is_ignored_for_other_users(self):
+        user = User(phone='987654321', avatar='avatar.jpg', is_active=True)
+        user.set_password('testpass123')
+        user.save()
+        self.client.login(phone='987654321', password='testpass123')
+        response = self.client.get(reverse('blog:home'), {'_profile': 'json'})
+        self.assertEqual(response['Content-Type'], 'text/html; charset=utf-8')
+        self.assertNotIn('X-Profile-Url', response)
+
+    def test_signed_header_stores_report(self):
+        response = self.client.get(reverse('blog:home'), HTTP_X_PROFILE=make_token())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(os.listdir(self.directory)), 1)
+
+        self.client.login(phone='123456789', password='testpass123')
+        report = self.client.get(response['X-Profile-Url']).json()
+        self.assertEqual(report['path'], reverse('blog:home'))
+        folded = self.client.get(response['X-Profile-Url'], {'format': 'folded'})
+        self.assertEqual(folded.content.decode(), report['folded'])
+
+    def test_token_use_limit(self):
+        token = make_token(uses=2)
+        for expected in (True, True, False):
+            response = self.client.get(reverse('blog:home'), HTTP_X_PROFILE=token)
+            self.assertEqual('X-Profile-Url' in response, expected)
+        self.assertEqual(len(os.listdir(self.directory)), 2)
+
+    def test_old_and_excess_reports_are_pruned(self):
+        for name, age in (('old', 10), ('a', 3), ('b', 2), ('c', 1)):
+            path = os.path.join(self.directory, f'{name}.json')
+            open(path, 'w').close()
+            os.utime(path, (time.time() - age, time.time() - age))
+        self.assertEqual(prune_reports(self.directory, max_age=5, max_count=2), 2)
+        self.assertEqual(sorted(os.listdir(self.directory)), ['b.json', 'c.json'])
+
+    def test_invalid_token_is_ignored(self):
+        response = self.client.get(reverse('blog:home'), HTTP_X_PROFILE='forged')
+        self.assertNotIn('X-Profile-Url', response)
+        self.assertEqual(os.listdir(self.directory), [])
+
+
+class TemplateRenderingTest(SetupTestCase):
+
+    def test_templates_and_blocks_are_timed(self):
+        TEMPLATE_RENDER_DURATION.clear()
+        blog = Blog.objects.create(title='Шаблон', user=self.user, published_on=True)
+        self.client.login(phone='123456789', password='testpass123')
+        self.client.get(reverse('blog:blog_detail', args=[blog.slug]))
+        observed = TEMPLATE_RENDER_DURATION._values
+        self.assertIn(('blog/blog_detail.html', 'template'), observed)
+        self.assertIn(('blog/blog_detail.html:content', 'block'), observed)
+        self.assertIn(('blog/includes/inc_main_menu.html', 'include'), observed)
+        self.assertIn(('blog/includes/inc_main_menu.html', 'template'), observed)
+
+    def test_all_project_templates_compile(self):
+        self.assertGreater(compile_templates(), 0)
+
+    def test_broken_template_fails_compilation(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        with open(os.path.join(directory, 'broken.html'), 'w') as file:
+            file.write('{% if %}')
+        templates = [{'BACKEND': 'django.template.backends.django.DjangoTemplates', 'DIRS': [directory]}]
+        with override_settings(TEMPLATES=templates), self.assertRaisesMessage(ImproperlyConfigured, 'broken.html'):
+            compile_templates()
+
+
+class MemoryWatchdogTest(SetupTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(memory.stop_tracing)
+        self.addCleanup(setattr, memory, '_recycling', False)
+        self.client.login(phone='123456789', password='testpass123')
+
+    def test_rss_is_published_per_worker(self):
+        self.client.get(reverse('blog:home'))
+        self.assertGreater(PROCESS_RSS._values[()], 0)
+
+    @override_settings(MEMORY_RECYCLE_RSS_MB=1)
+    def test_worker_over_threshold_is_recycled_once(self):
+        recycles = WORKER_RECYCLES._values.get(('rss',), 0)
+        with mock.patch.dict(sys.modules, {'gunicorn': mock.Mock()}), \
+                mock.patch('monitoring.memory.os.kill') as kill:
+            self.client.get(reverse('blog:home'))
+            self.client.get(reverse('blog:home'))
+        kill.assert_called_once_with(os.getpid(), signal.SIGTERM)
+        self.assertEqual(WORKER_RECYCLES._values[('rss',)], recycles + 1)
+
+    @override_settings(MEMORY_RECYCLE_RSS_MB=1)
+    def test_recycling_requires_gunicorn(self):
+        with mock.patch.dict(sys.modules, {'gunicorn': None}), mock.patch('monitoring.memory.os.kill') as kill:
+            self.client.get(reverse('blog:home'))
+        kill.assert_not_called()
+
+    def test_endpoint_reports_allocation_sites(self):
+        url = reverse('monitoring:memory')
+        self.assertFalse(self.client.get(url).json()['tracing'])
+        self.client.post(url, {'action': 'start'})
+        leak = [bytearray(1024) for _ in range(1000)]
+        report = self.client.get(url).json()
+        self.assertTrue(report['tracing'])
+        self.assertEqual(report['pid'], os.getpid())
+        sites = [entry for entry in report['top'] if os.path.join('monitoring', 'tests.py') in entry['site']]
+        self.assertTrue(sites, report['top'][:3])
+        self.assertGreaterEqual(sites[0]['size_diff'], len(leak) * 1024)
+        self.assertEqual(self.client.post(url, {'action': 'unknown'}).status_code, 400)
+
+    def test_signal_saves_report(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        with override_settings(MEMORY_SNAPSHOT_DIR=directory):
+            memory.handle_snapshot_signal()
+            self.assertEqual(os.listdir(directory), [])
+            memory.handle_snapshot_signal()
+        [name] = os.listdir(directory)
+        self.assertTrue(name.startswith(f'{os.getpid()}-'))
+
+
+class StartupTest(SetupTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(state.update, warm=False, error=None, failures=0, retry_at=None)
+
+    def test_pending_migrations_are_found_without_loading_graph(self):
+        self.assertEqual(pending_migrations(), [])
+        MigrationRecorder(connection).migration_qs.filter(app='monitoring', name='0001_initial').delete()
+        self.assertEqual(pending_migrations(), [('monitoring', '0001_initial')])
+        with self.assertRaisesMessage(CommandError, 'monitoring.0001_initial'):
+            call_command('startup', check=True, stdout=StringIO())
+
+    def test_fixture_is_loaded_only_when_changed(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'users.json')
+        fixture = [{'model': 'users.user', 'pk': 100, 'fields': {'phone': '5550001', 'password': '',
+                                                                 'avatar': 'avatar.jpg'}}]
+        with open(path, 'w') as file:
+            json.dump(fixture, file)
+        self.assertTrue(load_fixture(path))
+        User.objects.filter(pk=100).update(phone='5550002')
+        self.assertFalse(load_fixture(path))
+        self.assertEqual(User.objects.get(pk=100).phone, '5550002')
+
+        fixture[0]['fields']['phone'] = '5550003'
+        with open(path, 'w') as file:
+            json.dump(fixture, file)
+        self.assertTrue(load_fixture(path))
+        self.assertEqual(User.objects.get(pk=100).phone, '5550003')
+
+    def test_liveness_does_not_touch_dependencies(self):
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('monitoring:liveness'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_readiness_warms_worker_first(self):
+        self.assertFalse(state['warm'])
+        response = self.client.get(reverse('monitoring:readiness'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['checks'], {'database': 'ok', 'cache': 'ok', 'warm': 'ok', 'memory': 'ok'})
+        self.assertTrue(state['warm'])
+
+    @override_settings(STARTUP_WARM_URLS=['/blog/'], STARTUP_WARM_HOST='blog.example.com')
+    def test_pages_are_warmed_with_public_host(self):
+        hosts = []
+        handler = lambda sender, environ, **kwargs: hosts.append(environ.get('HTTP_HOST'))  # noqa: E731
+        request_started.connect(handler)
+        self.addCleanup(request_started.disconnect, handler)
+        warm_up()
+        self.assertEqual(hosts, ['blog.example.com'])
+
+    @override_settings(STARTUP_WARM_RETRY_INTERVAL=5, STARTUP_WARM_RETRY_MAX_INTERVAL=8)
+    def test_failed_warm_up_is_retried_with_backoff(self):
+        failing = mock.patch('monitoring.startup.warm_up', side_effect=RuntimeError('нет базы'))
+        with self.assertLogs('monitoring.startup', 'ERROR'), failing as warm:
+            with mock.patch('monitoring.startup.time.monotonic', return_value=100):
+                self.assertFalse(ensure_warm())
+                self.assertFalse(ensure_warm())
+            self.assertEqual(warm.call_count, 1)
+            self.assertEqual(state['retry_at'], 105)
+
+            with mock.patch('monitoring.startup.time.monotonic', return_value=106):
+                self.assertFalse(ensure_warm())
+            self.assertEqual(warm.call_count, 2)
+            self.assertEqual(state['retry_at'], 114)
+        self.assertEqual(state['error'], 'RuntimeError: нет базы')
+
+    def test_recycling_worker_is_not_ready(self):
+        state['warm'] = True
+        self.addCleanup(setattr, memory, '_recycling', False)
+        memory._recycling = True
+        response = self.client.get(reverse('monitoring:readiness'))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()['checks']['memory'], 'перезапускается')
+
+
+class ImportTimeTest(SetupTestCase):
+
+    def test_parse_importtime(self):
+        output = (
+            'import time: self [us] | cumulative | imported package\n'
+            'import time:       120 |        120 |   stripe._util\n'
+            'import time:      2000 |       2120 | stripe\n'
+        )
+        self.assertEqual(parse_importtime(output), [
+            {'module': 'stripe._util', 'self_us': 120, 'cumulative_us': 120, 'depth': 1},
+            {'module': 'stripe', 'self_us': 2000, 'cumulative_us': 2120, 'depth': 0},
+        ])
+
+    def test_worker_cold_start_is_within_budget(self):
+        # Время в наборе тестов зависит от нагрузки на машину, поэтому бюджет проверяется с запасом
+        # IMPORT_TIME_TEST_MARGIN (точно - командой importtime)
+        seconds, modules = cold_start()
+        self.assertEqual(loaded_lazy_modules(modules), [])
+        self.assertLess(seconds * 1000, settings.IMPORT_TIME_BUDGET_MS * settings.IMPORT_TIME_TEST_MARGIN)
@@ -0,0 +1,16 @@
+from django.urls import path
+
+from monitoring.apps import MonitoringConfig
+from monitoring.views import liveness, memory, metrics, profile_detail, readiness_view, slow_queries
+
+app_name = MonitoringConfig.name
+
+
+urlpatterns = [
+    path('metrics', metrics, name='metrics'),
+    path('healthz', liveness, name='liveness'),
+    path('readyz', readiness_view, name='readiness'),
+    path('monitoring/slow-queries/', slow_queries, name='slow_queries'),
+    path('monitoring/memory/', memory, name='memory'),
+    path('monitoring/profiles/<slug:profile_id>/', profile_detail, name='profile_detail'),
+]
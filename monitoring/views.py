@@ -0,0 +1,126 @@
+import os
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import Http404, HttpResponse, HttpResponseForbidden, JsonResponse
+from django.shortcuts import render
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.http import require_http_methods
+
+from monitoring.memory import diff_report, start_tracing, stop_tracing
+from monitoring.metrics import registry
+from monitoring.profiler import load_report
+from monitoring.slowqueries import aggregate, report_entries
+from monitoring.startup import readiness
+
+
+def metrics(request):
+    """
+        Отдает метрики всех процессов в текстовом формате Prometheus.
+
+        Требуется заголовок Authorization: Bearer <METRICS_TOKEN>; без настроенного токена метрики не отдаются,
+        так как порт приложения может быть доступен в обход nginx. Prometheus обращается к приложению напрямую.
+
+        Args:
+            request (HttpRequest): Объект HTTP-запроса.
+
+        Returns:
+            HttpResponse: Метрики или 403.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if not token or not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@staff_member_required
+def slow_queries(request):
+    """
+        Отчет о медленных запросах к базе, сгруппированных по отпечатку SQL.
+
+        При заданном SLOW_QUERY_LOG отчет строится по журналу всех процессов, иначе - по памяти текущего процесса.
+
+        Args:
+            request (HttpRequest): Объект HTTP-запроса.
+
+        Returns:
+            HttpResponse: Страница отчета.
+    """
+    entries = report_entries()
+    return render(request, 'monitoring/slow_queries.html', {
+        'groups': aggregate(entries),
+        'total': len(entries),
+        'threshold_ms': getattr(settings, 'SLOW_QUERY_THRESHOLD_MS', 200),
+    })
+
+
+@staff_member_required
+def profile_detail(request, profile_id):
+    """
+        Сохраненный отчет профилировщика: JSON или, с ?format=folded, стеки для flame graph.
+
+        Args:
+            request (HttpRequest): Объект HTTP-запроса.
+            profile_id (str): Идентификатор отчета из заголовка X-Profile-Url.
+
+        Returns:
+            HttpResponse: Отчет или 404.
+    """
+    try:
+        report = load_report(profile_id)
+    except (OSError, ValueError):
+        raise Http404
+    if request.GET.get('format') == 'folded':
+        return HttpResponse(report['folded'], content_type='text/plain; charset=utf-8')
+    return JsonResponse(report)
+
+
+@staff_member_required
+@require_http_methods(['GET', 'POST'])
+def memory(request):
+    """
+        Трассировка выделений памяти в воркере, обработавшем запрос (его pid указан в ответе).
+
+        POST action=start включает tracemalloc и запоминает базовый снимок, action=stop выключает;
+        GET возвращает места выделения с наибольшим ростом с момента базового снимка
+        (?reset=1 делает текущий снимок базовым). Для конкретного воркера есть сигнал MEMORY_SNAPSHOT_SIGNAL.
+
+        Args:
+            request (HttpRequest): Объект HTTP-запроса.
+
+        Returns:
+            JsonResponse: Отчет о памяти.
+    """
+    if request.method == 'POST':
+        action = request.POST.get('action')
+        if action == 'start':
+            start_tracing()
+        elif action == 'stop':
+            stop_tracing()
+        else:
+            return JsonResponse({'error': 'action должен быть start или stop'}, status=400)
+    limit = request.GET.get('limit', '20')
+    limit = min(int(limit), 100) if limit.isdigit() else 20
+    return JsonResponse(diff_report(limit=limit, reset=request.GET.get('reset') == '1'))
+
+
+def liveness(request):
+    """
+        Проверка жизни процесса для оркестратора: не обращается ни к базе, ни к кэшу,
+        чтобы сбой зависимостей не приводил к перезапуску здоровых воркеров.
+    """
+    return HttpResponse('ok', content_type='text/plain')
+
+
+def readiness_view(request):
+    """
+        Проверка готовности принимать трафик: база, кэш, прогрев процесса и отсутствие перезапуска по памяти.
+
+        Args:
+            request (HttpRequest): Объект HTTP-запроса.
+
+        Returns:
+            JsonResponse: Результаты проверок, статус 200 или 503.
+    """
+    ready, checks = readiness()
+    return JsonResponse({'ready': ready, 'pid': os.getpid(), 'checks': checks}, status=200 if ready else 503)
@@ -1,11 +1,25 @@
 from django.contrib import admin
-from subscriptions.models import Subscription
+from blog.admin import PerformanceAdminMixin
+from subscriptions.models import RevenueDaily, Subscription
 
 
 @admin.register(Subscription)
-class SubscriptionAdmin(admin.ModelAdmin):
+class SubscriptionAdmin(PerformanceAdminMixin, admin.ModelAdmin):
     """
         Административное представление для модели Subscription.
         Определено поле list_display для отображения в списке записей модели.
     """
     list_display = ('id', 'blog', 'user', 'status', 'payment_status', 'payment_date',)
+    list_select_related = ('blog', 'user',)
+    autocomplete_fields = ('blog', 'user',)
+
+
+@admin.register(RevenueDaily)
+class RevenueDailyAdmin(PerformanceAdminMixin, admin.ModelAdmin):
+    """
+        Административное представление для агрегатов выручки.
+    """
+    list_display = ('day', 'blog', 'author', 'currency', 'amount', 'subscriptions_count',)
+    list_select_related = ('blog', 'author',)
+    list_filter = ('currency',)
+    date_hierarchy = 'day'
@@ -0,0 +1,21 @@
+from django.db.models import F
+from blog.api import api_view, paginated_response, select_fields
+from subscriptions.models import Subscription
+
+SUBSCRIPTION_FIELDS = {
+    'id': None,
+    'status': None,
+    'payment_status': None,
+    'payment_date': None,
+    'blog_slug': F('blog__slug'),
+    'blog_title': F('blog__title'),
+}
+
+
+@api_view
+def subscription_list(request):
+    """
+        Подписки текущего пользователя, от новых к старым.
+    """
+    queryset = Subscription.objects.filter(user=request.user)
+    return paginated_response(request, queryset, select_fields(request, SUBSCRIPTION_FIELDS))
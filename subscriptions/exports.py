@@ -0,0 +1,91 @@
+import csv
+import json
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+from subscriptions.models import Subscription
+
+EXPORT_FIELDS = (
+    ('id', 'id'),
+    ('user_phone', 'user__phone'),
+    ('blog_title', 'blog__title'),
+    ('blog_price', 'blog__price'),
+    ('amount', 'amount'),
+    ('currency', 'currency'),
+    ('status', 'status'),
+    ('payment_status', 'payment_status'),
+    ('payment_date', 'payment_date'),
+)
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+
+
+def export_rows(date_from=None, date_to=None, chunk_size=2000):
+    """
+        Построчно читает подписки для выгрузки.
+
+        Строки читаются кортежами из values_list() через серверный курсор iterator(chunk_size),
+        поэтому память не растет с размером выгрузки. Запрос идет в базу EXPORT_DATABASE
+        (реплика, если она настроена), чтобы долгая выгрузка не нагружала основную базу.
+
+        Args:
+            date_from (date, optional): Начало периода по дате оплаты (включительно).
+            date_to (date, optional): Конец периода по дате оплаты (включительно).
+            chunk_size (int): Количество строк, получаемых из курсора за раз.
+    """
+    queryset = Subscription.objects.using(getattr(settings, 'EXPORT_DATABASE', 'default'))
+    if date_from:
+        queryset = queryset.filter(payment_date__gte=date_from)
+    if date_to:
+        queryset = queryset.filter(payment_date__lte=date_to)
+    return queryset.order_by('pk').values_list(*(path for _, path in EXPORT_FIELDS)).iterator(chunk_size=chunk_size)
+
+
+class _Echo:
+    """
+        Псевдофайл для csv.writer: возвращает записанную строку вместо буферизации.
+    """
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow([name for name, _ in EXPORT_FIELDS])
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def jsonl_lines(rows):
+    names = [name for name, _ in EXPORT_FIELDS]
+    for row in rows:
+        yield json.dumps(dict(zip(names, row)), cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+def export_lines(export_format, rows):
+    """
+        Возвращает генератор строк выгрузки в формате csv или jsonl.
+    """
+    return csv_lines(rows) if export_format == 'csv' else jsonl_lines(rows)
+
+
+async def aexport_lines(lines, chunk_size=500):
+    """
+        Асинхронно отдает строки выгрузки пачками по chunk_size для ответа под ASGI.
+
+        Синхронное содержимое StreamingHttpResponse Django под ASGI сначала собирает в список целиком,
+        поэтому строки (и строки курсора за ними) читаются в потоке через sync_to_async по одной пачке.
+    """
+    next_chunk = sync_to_async(lambda: ''.join(islice(lines, chunk_size)))
+    try:
+        while chunk := await next_chunk():
+            yield chunk
+    finally:
+        await sync_to_async(lines.close)()
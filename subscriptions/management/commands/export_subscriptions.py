@@ -0,0 +1,35 @@
+from django.core.management import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from subscriptions.exports import FORMATS, export_lines, export_rows
+
+
+class Command(BaseCommand):
+    """Команда для потоковой выгрузки подписок и оплат"""
+    help = 'Выгружает подписки и оплаты в CSV или JSONL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(FORMATS), default='csv')
+        parser.add_argument('--from', dest='date_from', help='Начало периода по дате оплаты, ГГГГ-ММ-ДД')
+        parser.add_argument('--to', dest='date_to', help='Конец периода по дате оплаты, ГГГГ-ММ-ДД')
+        parser.add_argument('--output', help='Файл выгрузки, по умолчанию стандартный вывод')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        try:
+            date_from = parse_date(options['date_from']) if options['date_from'] else None
+            date_to = parse_date(options['date_to']) if options['date_to'] else None
+        except ValueError as e:
+            raise CommandError(e)
+        # Строку не в формате даты parse_date не отклоняет, а возвращает None
+        if (options['date_from'] and date_from is None) or (options['date_to'] and date_to is None):
+            raise CommandError('Даты указываются в формате ГГГГ-ММ-ДД')
+
+        rows = export_rows(date_from, date_to, chunk_size=options['chunk_size'])
+        lines = export_lines(options['format'], rows)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+                output.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
@@ -0,0 +1,15 @@
+from django.core.management import BaseCommand
+
+from subscriptions.revenue import rebuild_revenue
+
+
+class Command(BaseCommand):
+    """Команда для пересчета агрегатов выручки по истории подписок"""
+    help = 'Пересчитывает агрегаты выручки по истории подписок'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000, help='Размер пачки подписок')
+
+    def handle(self, *args, **options):
+        rows = rebuild_revenue(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Агрегаты выручки пересчитаны: {rows} строк'))
@@ -0,0 +1,48 @@
+# Generated by Django 4.2.4 on 2026-10-19 12:14
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0008_remove_blog_comments_blog_comments'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('subscriptions', '0003_subscription_payment_date_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subscription',
+            name='amount',
+            field=models.IntegerField(blank=True, null=True, verbose_name='Сумма оплаты'),
+        ),
+        migrations.AddField(
+            model_name='subscription',
+            name='currency',
+            field=models.CharField(default='usd', max_length=3, verbose_name='Валюта'),
+        ),
+        migrations.CreateModel(
+            name='RevenueDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='День')),
+                ('currency', models.CharField(default='usd', max_length=3, verbose_name='Валюта')),
+                ('amount', models.BigIntegerField(default=0, verbose_name='Выручка')),
+                ('subscriptions_count', models.IntegerField(default=0, verbose_name='Количество оплат')),
+                ('author', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='revenue', to=settings.AUTH_USER_MODEL, verbose_name='Автор контента')),
+                ('blog', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='revenue', to='blog.blog', verbose_name='Контент')),
+            ],
+            options={
+                'verbose_name': 'Выручка за день',
+                'verbose_name_plural': 'Выручка по дням',
+                'indexes': [models.Index(fields=['author', 'day'], name='revenue_author_day_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='revenuedaily',
+            constraint=models.UniqueConstraint(fields=('blog', 'day', 'currency'), name='unique_revenue_blog_day_currency'),
+        ),
+    ]
@@ -1,7 +1,10 @@
 from django.db import models
 from blog.models import Blog, NULLABLE
+from blog.querycache import CachingManager
 from users.models import User
 
+DEFAULT_CURRENCY = 'usd'
+
 
 class Subscription(models.Model):
     """
@@ -12,6 +15,10 @@ class Subscription(models.Model):
     status = models.BooleanField(default=False, verbose_name='Статус подписки')
     payment_status = models.BooleanField(default=False, verbose_name='Статус оплаты')
     payment_date = models.DateField(**NULLABLE, verbose_name='Дата оплаты')
+    amount = models.IntegerField(**NULLABLE, verbose_name='Сумма оплаты')
+    currency = models.CharField(max_length=3, default=DEFAULT_CURRENCY, verbose_name='Валюта')
+
+    objects = CachingManager()
 
     class Meta:
         verbose_name = 'Подписка'
@@ -19,3 +26,41 @@ class Subscription(models.Model):
 
     def __str__(self):
         return f'{self.user} - {self.blog}: {self.status}'
+
+    def save(self, *args, **kwargs):
+        """
+            Переопределение метода сохранения объекта.
+            Фиксирует стоимость контента на момент оплаты, чтобы выручка не менялась вслед за ценой блога.
+        """
+        if self.payment_status and self.amount is None:
+            self.amount = self.blog.price
+        super().save(*args, **kwargs)
+
+
+class RevenueDaily(models.Model):
+    """
+        Агрегат выручки за день по блогу и валюте.
+
+        Поддерживается инкрементально сигналами модели Subscription,
+        сводки по автору и по валюте строятся суммированием этой таблицы.
+    """
+    blog = models.ForeignKey(Blog, related_name='revenue', on_delete=models.CASCADE, verbose_name='Контент')
+    author = models.ForeignKey(User, related_name='revenue', on_delete=models.CASCADE, **NULLABLE,
+                               verbose_name='Автор контента')
+    day = models.DateField(verbose_name='День')
+    currency = models.CharField(max_length=3, default=DEFAULT_CURRENCY, verbose_name='Валюта')
+    amount = models.BigIntegerField(default=0, verbose_name='Выручка')
+    subscriptions_count = models.IntegerField(default=0, verbose_name='Количество оплат')
+
+    class Meta:
+        verbose_name = 'Выручка за день'
+        verbose_name_plural = 'Выручка по дням'
+        constraints = [
+            models.UniqueConstraint(fields=['blog', 'day', 'currency'], name='unique_revenue_blog_day_currency'),
+        ]
+        indexes = [
+            models.Index(fields=['author', 'day'], name='revenue_author_day_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.blog_id} {self.day}: {self.amount} {self.currency}'
@@ -0,0 +1,119 @@
+import datetime
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from blog.models import Blog
+from subscriptions.models import RevenueDaily, Subscription
+
+
+def as_day(value):
+    """
+        Приводит дату оплаты к дате.
+        Контроллеры передают в payment_date timezone.now(), поэтому до сохранения в объекте может лежать datetime.
+    """
+    if isinstance(value, datetime.datetime):
+        return timezone.localdate(value) if timezone.is_aware(value) else value.date()
+    return value
+
+
+# Поля подписки, от которых зависит выручка, в порядке снимка revenue_state
+REVENUE_FIELDS = ('payment_status', 'payment_date', 'blog_id', 'currency', 'amount')
+
+
+def revenue_state(subscription):
+    """
+        Снимок полей подписки (REVENUE_FIELDS), от которых зависит выручка. Не обращается к связанному блогу.
+    """
+    return (
+        subscription.payment_status,
+        as_day(subscription.payment_date),
+        subscription.blog_id,
+        subscription.currency,
+        subscription.amount,
+    )
+
+
+def contribution(subscription, state=None):
+    """
+        Вклад подписки в агрегаты выручки.
+
+        Args:
+            subscription (Subscription): Подписка.
+            state (tuple, optional): Снимок полей, по умолчанию текущие значения подписки.
+
+        Returns:
+            tuple | None: (blog_id, author_id, day, currency, amount) или None, если подписка не оплачена.
+    """
+    payment_status, day, blog_id, currency, amount = state or revenue_state(subscription)
+    if not payment_status or day is None or blog_id is None:
+        return None
+    if subscription.blog_id == blog_id:
+        author_id, price = subscription.blog.user_id, subscription.blog.price
+    else:
+        author_id, price = Blog.objects.filter(pk=blog_id).values_list('user_id', 'price').first() or (None, 0)
+    return blog_id, author_id, day, currency, price if amount is None else amount
+
+
+def apply_revenue(blog_id, author_id, day, currency, amount, count):
+    """
+        Атомарно добавляет сумму и количество оплат к дневному агрегату, создавая строку при необходимости.
+    """
+    lookup = {'blog_id': blog_id, 'day': day, 'currency': currency}
+    changes = {'amount': F('amount') + amount, 'subscriptions_count': F('subscriptions_count') + count}
+
+    # Вычитать из отсутствующей строки нечего: так же ведет себя каскадное удаление блога или автора
+    if RevenueDaily.objects.filter(**lookup).update(**changes) or count < 0:
+        return
+    try:
+        with transaction.atomic():
+            RevenueDaily.objects.create(author_id=author_id, amount=amount, subscriptions_count=count, **lookup)
+    except IntegrityError:
+        # Строку успел создать параллельный запрос
+        RevenueDaily.objects.filter(**lookup).update(**changes)
+
+
+def rebuild_revenue(batch_size=10000):
+    """
+        Пересчитывает агрегаты выручки по истории подписок.
+
+        Подписки читаются диапазонами первичного ключа и агрегируются в базе по частям,
+        поэтому в памяти держатся только итоговые строки агрегата, а не сами подписки.
+
+        Args:
+            batch_size (int): Размер диапазона первичных ключей одной пачки.
+
+        Returns:
+            int: Количество записанных строк агрегата.
+    """
+    totals = {}
+    paid = Subscription.objects.filter(payment_status=True, payment_date__isnull=False)
+    last_pk = 0
+
+    while True:
+        batch_pks = list(paid.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not batch_pks:
+            break
+        rows = (
+            paid.filter(pk__gte=batch_pks[0], pk__lte=batch_pks[-1])
+            .values('blog_id', 'blog__user_id', 'payment_date', 'currency')
+            .annotate(total=Sum(Coalesce('amount', 'blog__price')), paid_count=Count('pk'))
+            .order_by()
+        )
+        for row in rows:
+            key = (row['blog_id'], row['payment_date'], row['currency'])
+            amount, count, _ = totals.get(key, (0, 0, None))
+            totals[key] = (amount + row['total'], count + row['paid_count'], row['blog__user_id'])
+        last_pk = batch_pks[-1]
+
+    aggregates = (
+        RevenueDaily(blog_id=blog_id, author_id=author_id, day=day, currency=currency,
+                     amount=amount, subscriptions_count=count)
+        for (blog_id, day, currency), (amount, count, author_id) in totals.items()
+    )
+    with transaction.atomic():
+        RevenueDaily.objects.all().delete()
+        RevenueDaily.objects.bulk_create(aggregates, batch_size=1000)
+    return len(totals)
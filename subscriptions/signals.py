@@ -0,0 +1,68 @@
+from django.db.models import DEFERRED
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.dispatch import receiver
+
+from subscriptions.models import Subscription
+from subscriptions.revenue import REVENUE_FIELDS, apply_revenue, as_day, contribution, revenue_state
+
+
+@receiver(post_init, sender=Subscription)
+def subscription_loaded(sender, instance, **kwargs):
+    """
+        Запоминает состояние загруженной подписки, чтобы при сохранении применить к агрегатам только разницу.
+
+        Отложенные поля (only/defer) не читаются: каждое чтение загружало бы объект заново и снова вызывало
+        этот обработчик. Снимок такой подписки неизвестен (DEFERRED) и читается из базы перед сохранением.
+    """
+    if not instance.pk:
+        instance._revenue_state = None
+    elif any(name not in instance.__dict__ for name in REVENUE_FIELDS):
+        instance._revenue_state = DEFERRED
+    else:
+        instance._revenue_state = revenue_state(instance)
+
+
+@receiver(pre_save, sender=Subscription)
+def subscription_saving(sender, instance, **kwargs):
+    """
+        Читает из базы снимок подписки, загруженной с отложенными полями.
+    """
+    if getattr(instance, '_revenue_state', None) is not DEFERRED:
+        return
+    stored = Subscription.objects.filter(pk=instance.pk).values_list(*REVENUE_FIELDS).first()
+    if stored is None:
+        instance._revenue_state = None
+        return
+    # Незагруженные поля не сохраняются и остаются такими же, как в базе
+    for name, value in zip(REVENUE_FIELDS, stored):
+        instance.__dict__.setdefault(name, value)
+    instance._revenue_state = (stored[0], as_day(stored[1]), *stored[2:])
+
+
+@receiver(post_save, sender=Subscription)
+def subscription_saved(sender, instance, created, **kwargs):
+    """
+        Обновляет агрегаты выручки после сохранения подписки.
+    """
+    previous_state = getattr(instance, '_revenue_state', None)
+    current_state = revenue_state(instance)
+    if previous_state == current_state:
+        return
+
+    previous = contribution(instance, previous_state) if previous_state else None
+    current = contribution(instance, current_state)
+    if previous:
+        apply_revenue(*previous[:4], amount=-previous[4], count=-1)
+    if current:
+        apply_revenue(*current[:4], amount=current[4], count=1)
+    instance._revenue_state = current_state
+
+
+@receiver(post_delete, sender=Subscription)
+def subscription_deleted(sender, instance, **kwargs):
+    """
+        Вычитает удаленную подписку из агрегатов выручки.
+    """
+    current = contribution(instance)
+    if current:
+        apply_revenue(*current[:4], amount=-current[4], count=-1)
@@ -1,8 +1,16 @@
+import datetime
 import json
+import time
+from io import StringIO
+from asgiref.sync import async_to_sync, sync_to_async
+from django.core.management import call_command
+from django.test import AsyncClient
 from django.urls import reverse
+from django.utils import timezone
 from blog.models import Blog
+from monitoring.metrics import WEBHOOK_LAG
 from subscriptions.forms import SubscriptionForm
-from subscriptions.models import Subscription
+from subscriptions.models import RevenueDaily, Subscription
 from users.tests import SetupTestCase
 
 
@@ -100,6 +108,19 @@ class CreateCheckoutSessionViewTest(SetupTestCase):
         self.assertEqual(response.status_code, 302)
 
 
+class StripeWebhookTest(SetupTestCase):
+
+    def test_unknown_event_types_share_one_metric_series(self):
+        url = reverse('subscriptions:stripe-webhook')
+        before = WEBHOOK_LAG._values.get(('other',), [0])[-1]
+        for event_type in ('spam.1', 'spam.2'):
+            event = {'id': 'evt_1', 'object': 'event', 'type': event_type, 'created': int(time.time()), 'data': {}}
+            response = self.client.post(url, json.dumps(event), content_type='application/json')
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(WEBHOOK_LAG._values[('other',)][-1] - before, 2)
+        self.assertNotIn(('spam.1',), WEBHOOK_LAG._values)
+
+
 class SuccessViewTest(SetupTestCase):
     def setUp(self):
         super().setUp()
@@ -115,3 +136,145 @@ class SuccessViewTest(SetupTestCase):
         subscription = Subscription.objects.get(user=self.user, blog=self.blog)
         self.assertTrue(subscription.status)
         self.assertTrue(subscription.payment_status)
+
+
+class RevenueAggregatesTest(SetupTestCase):
+    def setUp(self):
+        super().setUp()
+        self.blog = Blog.objects.create(title='Paid blog', price=15, is_paid=True, user=self.user)
+
+    def pay(self):
+        return Subscription.objects.create(user=self.user, blog=self.blog, status=True,
+                                           payment_status=True, payment_date=timezone.now())
+
+    def test_paid_subscription_updates_aggregates(self):
+        self.pay()
+        self.pay()
+        revenue = RevenueDaily.objects.get(blog=self.blog)
+        self.assertEqual(revenue.author, self.user)
+        self.assertEqual(revenue.amount, 30)
+        self.assertEqual(revenue.subscriptions_count, 2)
+
+    def test_unpaid_subscription_is_ignored(self):
+        Subscription.objects.create(user=self.user, blog=self.blog, status=True)
+        self.assertFalse(RevenueDaily.objects.exists())
+
+    def test_price_is_fixed_at_payment(self):
+        self.pay()
+        self.blog.price = 100
+        self.blog.save()
+        self.pay()
+        self.assertEqual(RevenueDaily.objects.get(blog=self.blog).amount, 115)
+
+    def test_delete_subtracts_revenue(self):
+        sub = self.pay()
+        self.pay()
+        sub.delete()
+        revenue = RevenueDaily.objects.get(blog=self.blog)
+        self.assertEqual(revenue.amount, 15)
+        self.assertEqual(revenue.subscriptions_count, 1)
+
+    def test_deferred_subscription_updates_aggregates(self):
+        sub = Subscription.objects.create(user=self.user, blog=self.blog, status=True)
+        self.pay()
+        self.assertEqual(len(Subscription.objects.only('id')), 2)
+
+        deferred = Subscription.objects.only('id', 'payment_status').get(pk=sub.pk)
+        deferred.payment_status = True
+        deferred.payment_date = timezone.now()
+        deferred.save()
+        revenue = RevenueDaily.objects.get(blog=self.blog)
+        self.assertEqual(revenue.amount, 30)
+        self.assertEqual(revenue.subscriptions_count, 2)
+
+        # Сохранение без изменения полей выручки агрегаты не меняет
+        Subscription.objects.defer('amount').get(pk=sub.pk).save()
+        self.assertEqual(RevenueDaily.objects.get(blog=self.blog).subscriptions_count, 2)
+
+    def test_rebuild_matches_incremental(self):
+        for _ in range(3):
+            self.pay()
+        expected = list(RevenueDaily.objects.values_list('blog_id', 'day', 'currency', 'amount', 'subscriptions_count'))
+        RevenueDaily.objects.all().delete()
+        call_command('rebuild_revenue', batch_size=2, stdout=StringIO())
+        rebuilt = list(RevenueDaily.objects.values_list('blog_id', 'day', 'currency', 'amount', 'subscriptions_count'))
+        self.assertEqual(rebuilt, expected)
+
+    def test_revenue_report_view(self):
+        self.pay()
+        self.client.login(phone='123456789', password='testpass123')
+        response = self.client.get(reverse('subscriptions:revenue_report'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Paid blog')
+
+    def test_staff_revenue_report_requires_staff(self):
+        self.user.is_staff = False
+        self.user.save()
+        self.client.login(phone='123456789', password='testpass123')
+        response = self.client.get(reverse('subscriptions:staff_revenue_report'))
+        self.assertEqual(response.status_code, 403)
+
+
+class SubscriptionApiTest(SetupTestCase):
+
+    def test_subscription_list(self):
+        blog = Blog.objects.create(title='Test Blog')
+        Subscription.objects.create(user=self.user, blog=blog, status=True)
+        self.client.login(phone='123456789', password='testpass123')
+        data = self.client.get(reverse('subscriptions:api_subscription_list')).json()
+        self.assertEqual(data['results'][0]['blog_slug'], blog.slug)
+        self.assertIsNone(data['next'])
+
+
+class SubscriptionExportTest(SetupTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.blog = Blog.objects.create(title='Export blog', price=7)
+        Subscription.objects.create(user=self.user, blog=self.blog, status=True, payment_status=True,
+                                    payment_date=datetime.date(2023, 9, 1))
+        Subscription.objects.create(user=self.user, blog=self.blog, status=True, payment_status=True,
+                                    payment_date=datetime.date(2023, 10, 1))
+        self.url = reverse('subscriptions:subscription_export')
+
+    def test_csv_export_with_date_range(self):
+        self.client.login(phone='123456789', password='testpass123')
+        response = self.client.get(self.url, {'from': '2023-09-15'})
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(',')[:3], ['id', 'user_phone', 'blog_title'])
+        self.assertEqual(len(lines), 2)
+        self.assertIn('2023-10-01', lines[1])
+
+    def test_malformed_dates_are_rejected(self):
+        self.client.login(phone='123456789', password='testpass123')
+        for params in ({'from': 'yesterday'}, {'to': '2023-02-30'}, {'from': '2023-9-1x'}):
+            self.assertEqual(self.client.get(self.url, params).status_code, 400)
+
+    def test_jsonl_export(self):
+        self.client.login(phone='123456789', password='testpass123')
+        response = self.client.get(self.url, {'format': 'jsonl'})
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row['blog_price'] for row in rows], [7, 7])
+
+    def test_asgi_export_is_async_iterator(self):
+        async def export():
+            client = AsyncClient()
+            await sync_to_async(client.login)(phone='123456789', password='testpass123')
+            response = await client.get(self.url, {'format': 'jsonl'})
+            return response, b''.join([chunk async for chunk in response.streaming_content])
+
+        response, content = async_to_sync(export)()
+        self.assertTrue(response.is_async)
+        self.assertEqual(len(content.decode().splitlines()), 2)
+
+    def test_export_requires_staff(self):
+        self.user.is_staff = False
+        self.user.save()
+        self.client.login(phone='123456789', password='testpass123')
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    def test_export_command(self):
+        out = StringIO()
+        call_command('export_subscriptions', '--format', 'jsonl', '--to', '2023-09-30', stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 1)
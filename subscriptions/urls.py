@@ -1,10 +1,11 @@
 from django.urls import path
-from django.views.decorators.cache import cache_page
 
+from blog.pagecache import stampede_cache_page
+from subscriptions import api
 from subscriptions.apps import SubscriptionsConfig
 from subscriptions.views import SubscriptionDeleteView, SubscriptionListView, CancelView, \
     SuccessView, CreateCheckoutSessionView, BlogCheckoutPageView, StripeIntentView, stripe_webhook, \
-    SubscriptionCreateView
+    SubscriptionCreateView, RevenueReportView, StaffRevenueReportView, SubscriptionExportView
 
 app_name = SubscriptionsConfig.name
 
@@ -12,11 +13,15 @@ app_name = SubscriptionsConfig.name
 urlpatterns = [
     path('subscription-create/<slug:slug>/', SubscriptionCreateView.as_view(), name='subscription_create'),
     path('subscription-cancel/<slug:slug>/', SubscriptionDeleteView.as_view(), name='subscription_delete'),
-    path('subscription-list/', cache_page(60)(SubscriptionListView.as_view()), name='subscription_list'),
+    path('subscription-list/', stampede_cache_page(60)(SubscriptionListView.as_view()), name='subscription_list'),
     path('cancel/', CancelView.as_view(), name='cancel'),
     path('success/<slug:slug>/', SuccessView.as_view(), name='success'),
     path('create-checkout-session/<slug:slug>/', CreateCheckoutSessionView.as_view(), name='create-checkout-session'),
     path('', BlogCheckoutPageView.as_view(), name='checkout-page'),
     path('create-payment-intent/<int:pk>/', StripeIntentView.as_view(), name='create-payment-intent'),
     path('webhooks/stripe/', stripe_webhook, name='stripe-webhook'),
+    path('revenue/', RevenueReportView.as_view(), name='revenue_report'),
+    path('revenue/all/', StaffRevenueReportView.as_view(), name='staff_revenue_report'),
+    path('api/subscriptions/', api.subscription_list, name='api_subscription_list'),
+    path('export/', SubscriptionExportView.as_view(), name='subscription_export'),
 ]
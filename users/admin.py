@@ -2,6 +2,7 @@ from django import forms
 from django.contrib import admin
 from django.contrib.auth.forms import UserChangeForm
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from blog.admin import PerformanceAdminMixin
 from users.models import User
 
 
@@ -58,7 +59,7 @@ class UserCreationForm(forms.ModelForm):
         return user
 
 
-class UserAdmin(BaseUserAdmin):
+class UserAdmin(PerformanceAdminMixin, BaseUserAdmin):
     """
         Администратор пользователей.
 
@@ -68,7 +69,7 @@ class UserAdmin(BaseUserAdmin):
             list_display (tuple): Отображаемые поля в списке.
             fieldsets (tuple): Набор полей.
             add_fieldsets (tuple): Набор полей для создания.
-            search_fields (tuple): Поля для поиска.
+            search_fields (tuple): Поля для поиска по префиксу (покрыты индексами уникальных полей).
             ordering (tuple): Поля для сортировки.
             filter_horizontal (tuple): Поля для фильтрации.
     """
@@ -89,7 +90,7 @@ class UserAdmin(BaseUserAdmin):
 
         ('Права доступа', {'fields': ('is_superuser', 'is_staff', 'is_active', 'user_permissions')}),
     )
-    search_fields = ('username', 'phone',)
+    search_fields = ('phone__startswith', 'phone_normalized__startswith', 'username__startswith',)
     ordering = ('id', 'phone',)
     filter_horizontal = ()
 
@@ -5,3 +5,9 @@ class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'users'
     verbose_name = 'пользователи'
+
+    def ready(self):
+        from blog.storage import track_references
+        from users.models import User
+        track_references(User, 'avatar')
+        import users.signals  # noqa: F401
@@ -0,0 +1,26 @@
+from django.contrib.auth.backends import ModelBackend
+from users.models import User
+
+
+class PhoneBackend(ModelBackend):
+    """
+        Бэкенд аутентификации по номеру телефона.
+
+        Пользователь ищется сначала по точному совпадению номера, затем по индексированному номеру
+        в формате E.164, поэтому вход работает при любом написании номера (см. UserManager.find_by_phone).
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        phone = username or kwargs.get(User.USERNAME_FIELD)
+        if phone is None or password is None:
+            return None
+
+        user = User.objects.find_by_phone(phone)
+        if user is None:
+            # Хешируем пароль и для несуществующего пользователя, чтобы время ответа не выдавало номер
+            User().set_password(password)
+            return None
+
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
@@ -6,23 +6,26 @@ from django.utils.encoding import force_bytes
 from django.utils.http import urlsafe_base64_encode
 from django.utils.translation import gettext_lazy as _
 from blog.forms import StyleFormMixin
-from users.models import User
+from blog.uploads import ChunkedUploadFormMixin, LimitedImageField
+from users.models import User, normalize_phone
 
 
-class CustomUserChangeForm(StyleFormMixin, UserChangeForm):
+class CustomUserChangeForm(StyleFormMixin, ChunkedUploadFormMixin, UserChangeForm):
     """
         Переопределенная форма для изменения данных пользователя.
 
         Attributes:
             model (User): Модель пользователя.
             fields (tuple): Поля формы (номер телефона, аватар).
-            field_classes (dict): Классы полей (номер телефона).
+            field_classes (dict): Классы полей (номер телефона, аватар с ограничениями размера и разрешения).
+            chunked_upload_fields (tuple): Поля, которые можно загрузить заранее по частям.
     """
+    chunked_upload_fields = ('avatar',)
 
     class Meta:
         model = User
         fields = ('phone', 'avatar')
-        field_classes = {'username': UsernameField}
+        field_classes = {'username': UsernameField, 'avatar': LimitedImageField}
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -50,10 +53,13 @@ class CustomUserRegisterForm(StyleFormMixin, UserCreationForm):
 
     def clean_phone(self):
         """
-            Проверка номера телефона на уникальность.
+            Проверка номера телефона на корректность и уникальность после нормализации.
         """
         phone = self.cleaned_data.get('phone')
-        if User.objects.filter(phone=phone).exists():
+        normalized = normalize_phone(phone)
+        if not normalized:
+            raise forms.ValidationError("Некорректный номер телефона")
+        if User.objects.filter(phone_normalized=normalized).exists():
             raise forms.ValidationError("Пользователь с таким номером уже существует")
         return phone
 
@@ -110,11 +116,13 @@ class CustomPasswordResetForm(StyleFormMixin, PasswordResetForm):
 
     def clean_phone(self):
         """
-            Проверка номера телефона на существование.
+            Проверка номера телефона на существование. Пользователь ищется так же, как при входе в PhoneBackend:
+            по точному совпадению, затем по номеру в формате E.164.
         """
 
         phone = self.cleaned_data.get('phone')
-        if not User.objects.filter(phone=phone).exists():
+        self.user = User.objects.find_by_phone(phone)
+        if self.user is None:
             raise forms.ValidationError("Пользователь с таким номером не найден")
         return phone
 
@@ -123,8 +131,7 @@ class CustomPasswordResetForm(StyleFormMixin, PasswordResetForm):
            Сохранение токена сброса пароля.
         """
 
-        phone = self.cleaned_data["phone"]
-        user = User.objects.get(phone=phone)
+        user = self.user
 
         # Генерируем токен сброса пароля
         token_generator = kwargs.get('token_generator', default_token_generator)
@@ -0,0 +1,25 @@
+from collections import defaultdict
+
+from django.core.management import BaseCommand
+
+from users.models import User, normalize_phone
+
+
+class Command(BaseCommand):
+    """Команда для поиска пользователей, номера которых совпадают после нормализации"""
+    help = 'Показывает пользователей, номера телефонов которых совпадают в формате E.164'
+
+    def handle(self, *args, **options):
+        groups = defaultdict(list)
+        for pk, phone in User.objects.order_by('pk').values_list('pk', 'phone').iterator(chunk_size=2000):
+            normalized = normalize_phone(phone)
+            if normalized:
+                groups[normalized].append((pk, phone))
+
+        duplicates = {normalized: users for normalized, users in groups.items() if len(users) > 1}
+        for normalized, users in duplicates.items():
+            listed = ', '.join(f'id={pk} ({phone})' for pk, phone in users)
+            self.stdout.write(f'{normalized}: {listed}')
+
+        invalid = User.objects.filter(phone_normalized__isnull=True).count()
+        self.stdout.write(f'Совпадающих номеров: {len(duplicates)}, пользователей без номера E.164: {invalid}')
@@ -0,0 +1,102 @@
+import uuid
+
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.core.cache import cache
+from django.db import router
+from django.utils.crypto import constant_time_compare
+from django.utils.functional import SimpleLazyObject
+
+from users.models import User
+
+# Хеш пароля в кэш не попадает: у восстановленного объекта поле отложено и загрузится из базы при обращении
+CACHED_FIELDS = [field.attname for field in User._meta.concrete_fields if field.attname != 'password']
+
+
+def user_cache_key(user_id):
+    return f'auth:user:{user_id}'
+
+
+def user_version_key(user_id):
+    return f'auth:user:{user_id}:version'
+
+
+def invalidate_cached_user(user_id):
+    """
+        Сбрасывает запись пользователя и меняет его версию.
+
+        Запрос, прочитавший пользователя из базы до изменения, запишет в кэш запись со старой версией,
+        и она не будет принята при чтении. Версия хранится вдвое дольше записи, чтобы пережить любую такую запись;
+        после ее истечения записи со старыми версиями тоже не совпадут с пустой версией.
+    """
+    cache.set(user_version_key(user_id), uuid.uuid4().hex, 2 * getattr(settings, 'AUTH_USER_CACHE_TIMEOUT', 300))
+    cache.delete(user_cache_key(user_id))
+
+
+def cache_user(user, version):
+    """
+        Сохраняет поля пользователя (без хеша пароля) вместе с хешем сессии для его текущего пароля.
+
+        Args:
+            user (User): Пользователь, загруженный из базы.
+            version (str | None): Версия пользователя, прочитанная до загрузки из базы.
+    """
+    if cache.get(user_version_key(user.pk)) != version:
+        return
+    cache.set(user_cache_key(user.pk), {
+        'version': version,
+        'auth_hash': user.get_session_auth_hash(),
+        'values': [getattr(user, name) for name in CACHED_FIELDS],
+    }, getattr(settings, 'AUTH_USER_CACHE_TIMEOUT', 300))
+
+
+def get_cached_user(request):
+    """
+        Возвращает пользователя сессии из кэша, без запроса к базе.
+
+        Запись кэша проверяется хешем сессии, который зависит от хеша пароля: после смены пароля
+        старые сессии не совпадут с ним и пройдут обычную проверку django.contrib.auth.get_user
+        (которая их завершит). Запись принимается, только если ее версия совпадает с текущей версией
+        пользователя (см. invalidate_cached_user). Во всех неоднозначных случаях используется обычная загрузка.
+
+        Returns:
+            User | AnonymousUser: Пользователь запроса.
+    """
+    session = request.session
+    user_id, backend_path, session_hash = session.get(SESSION_KEY), session.get(BACKEND_SESSION_KEY), \
+        session.get(HASH_SESSION_KEY)
+    if user_id is None or not session_hash or backend_path not in settings.AUTHENTICATION_BACKENDS:
+        return auth.get_user(request)
+
+    found = cache.get_many([user_cache_key(user_id), user_version_key(user_id)])
+    entry, version = found.get(user_cache_key(user_id)), found.get(user_version_key(user_id))
+    if entry is not None and entry.get('version') == version and \
+            constant_time_compare(session_hash, entry['auth_hash']):
+        user = User.from_db(router.db_for_read(User), CACHED_FIELDS, entry['values'])
+        if user.is_active:
+            user.backend = backend_path
+            return user
+
+    user = auth.get_user(request)
+    if user.is_authenticated and user.is_active:
+        cache_user(user, version)
+    return user
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    """
+        Замена AuthenticationMiddleware, загружающая request.user из кэша по id пользователя.
+
+        Запись сбрасывается при любом сохранении или удалении пользователя: изменении профиля,
+        смене пароля, правке в админке, обновлении last_login. Сброс виден другим воркерам только
+        в общем кэше, поэтому без AUTH_USER_CACHE_ENABLED (по умолчанию включен вместе с CACHE_ENABLED)
+        middleware работает как AuthenticationMiddleware.
+    """
+
+    def process_request(self, request):
+        super().process_request(request)
+        if not getattr(settings, 'AUTH_USER_CACHE_ENABLED', False):
+            return
+        request.user = SimpleLazyObject(lambda: get_cached_user(request))
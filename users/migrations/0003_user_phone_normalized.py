@@ -0,0 +1,18 @@
+# Generated by Django 4.2.4 on 2026-10-19 12:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_alter_user_email'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='phone_normalized',
+            field=models.CharField(blank=True, editable=False, max_length=16, null=True, unique=True, verbose_name='Номер телефона в формате E.164'),
+        ),
+    ]
@@ -0,0 +1,67 @@
+import re
+
+from django.conf import settings
+from django.db import migrations
+
+BATCH_SIZE = 1000
+PHONE_ALLOWED_RE = re.compile(r'^\+?[\d\s().\-]+$')
+
+
+def normalize_phone(phone):
+    """
+        Копия users.models.normalize_phone на момент миграции: миграция не должна зависеть от модуля моделей.
+    """
+    phone = (phone or '').strip()
+    if not PHONE_ALLOWED_RE.match(phone):
+        return ''
+
+    digits = re.sub(r'\D', '', phone)
+    country_code = getattr(settings, 'PHONE_DEFAULT_COUNTRY_CODE', '7')
+    if phone.startswith('+'):
+        pass
+    elif digits.startswith('00'):
+        digits = digits[2:]
+    elif len(digits) == 11 and digits.startswith('8') and country_code == '7':
+        digits = '7' + digits[1:]
+    elif len(digits) == 10:
+        digits = country_code + digits
+
+    if not 6 <= len(digits) <= 15 or digits.startswith('0'):
+        return ''
+    return '+' + digits
+
+
+def normalize_phones(apps, schema_editor):
+    """
+        Заполняет номер в формате E.164 у существующих пользователей пачками.
+        Номер, совпавший после нормализации с номером пользователя с меньшим id, остается пустым:
+        такие записи показывает команда phone_duplicates.
+    """
+    User = apps.get_model('users', 'User')
+    taken = set()
+    last_pk = 0
+
+    while True:
+        batch = list(User.objects.filter(pk__gt=last_pk).order_by('pk').only('pk', 'phone')[:BATCH_SIZE])
+        if not batch:
+            break
+        for user in batch:
+            normalized = normalize_phone(user.phone)
+            if normalized and normalized not in taken:
+                taken.add(normalized)
+                user.phone_normalized = normalized
+            else:
+                user.phone_normalized = None
+        User.objects.bulk_update(batch, ['phone_normalized'])
+        last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_user_phone_normalized'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_phones, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.4 on 2026-10-19 12:41
+
+import blog.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_avatar_storage'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='avatar',
+            field=models.ImageField(blank=True, db_index=True, null=True, storage=blog.storage.ContentAddressedStorage(), upload_to='users/', verbose_name='Аватар'),
+        ),
+    ]
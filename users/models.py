@@ -1,20 +1,77 @@
+import re
+from django.conf import settings
 from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import AbstractUser, UserManager as BaseUserManager
+from django.core.exceptions import ValidationError
 from django.db import models
 from blog.models import NULLABLE
+from blog.querycache import CachingManager
+from blog.storage import media_storage
 
+PHONE_ALLOWED_RE = re.compile(r'^\+?[\d\s().\-]+$')
 
-class UserManager(BaseUserManager):
+
+def normalize_phone(phone):
+    """
+        Приводит номер телефона к формату E.164 (+ и от 6 до 15 цифр).
+
+        Номер без кода страны дополняется кодом PHONE_DEFAULT_COUNTRY_CODE,
+        российский префикс 8 заменяется на +7, префикс 00 - на +.
+
+        Args:
+            phone (str): Номер телефона в произвольном формате.
+
+        Returns:
+            str: Номер в формате E.164 или пустая строка, если номер некорректен.
+    """
+    phone = (phone or '').strip()
+    if not PHONE_ALLOWED_RE.match(phone):
+        return ''
+
+    digits = re.sub(r'\D', '', phone)
+    country_code = getattr(settings, 'PHONE_DEFAULT_COUNTRY_CODE', '7')
+    if phone.startswith('+'):
+        pass
+    elif digits.startswith('00'):
+        digits = digits[2:]
+    elif len(digits) == 11 and digits.startswith('8') and country_code == '7':
+        digits = '7' + digits[1:]
+    elif len(digits) == 10:
+        digits = country_code + digits
+
+    if not 6 <= len(digits) <= 15 or digits.startswith('0'):
+        return ''
+    return '+' + digits
+
+
+class UserManager(CachingManager, BaseUserManager):
     """
-        Кастомный менеджер пользователей.
+        Кастомный менеджер пользователей с кэшированием выборок.
 
         Methods:
+            find_by_phone(phone): Находит пользователя по номеру телефона.
             _create_user(phone, password, **extra_fields): Создает и сохраняет пользователя.
             create_superuser(phone, password, **extra_fields): Создает и сохраняет суперпользователя.
     """
 
     use_in_migrations = True
 
+    def find_by_phone(self, phone):
+        """
+            Находит пользователя по номеру телефона в любом написании.
+
+            Сначала ищется точное совпадение: у записи, номер которой совпал после нормализации с номером
+            другого пользователя, номер E.164 не заполнен, и по нему она нашла бы чужую учетную запись.
+
+            Returns:
+                User: Пользователь или None.
+        """
+        user = self.filter(phone=phone).first()
+        if user is None:
+            normalized = normalize_phone(phone)
+            user = self.filter(phone_normalized=normalized).first() if normalized else None
+        return user
+
     def _create_user(self, phone, password, **extra_fields):
         """
             Создает и сохраняет пользователя с указанным номером телефона и паролем.
@@ -47,7 +104,10 @@ class User(AbstractUser):
     """
     username = models.CharField(max_length=50, unique=True, **NULLABLE, verbose_name='Никнейм')
     phone = models.CharField(max_length=25, unique=True, verbose_name='Номер телефона')
-    avatar = models.ImageField(upload_to='users/', verbose_name='Аватар', **NULLABLE)
+    phone_normalized = models.CharField(max_length=16, unique=True, **NULLABLE, editable=False,
+                                        verbose_name='Номер телефона в формате E.164')
+    avatar = models.ImageField(upload_to='users/', storage=media_storage, db_index=True, verbose_name='Аватар',
+                               **NULLABLE)
 
     USERNAME_FIELD = 'phone'
     REQUIRED_FIELDS = []
@@ -60,3 +120,63 @@ class User(AbstractUser):
 
     def __str__(self):
         return f'{self.username}: {self.email} - {self.phone}'
+
+    def save(self, *args, **kwargs):
+        """
+            Переопределение метода сохранения объекта.
+            Номер в формате E.164 пересчитывается при записи номера, введенный номер хранится как есть.
+            Если после нормализации номер совпадает с номером другого пользователя, номер E.164 остается пустым,
+            как в миграции заполнения (такие записи показывает команда phone_duplicates).
+        """
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'phone' in update_fields:
+            normalized = normalize_phone(self.phone)
+            if normalized and User.objects.filter(phone_normalized=normalized).exclude(pk=self.pk).exists():
+                normalized = ''
+            self.phone_normalized = normalized or None
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'phone_normalized'}
+        super().save(*args, **kwargs)
+
+    def clean(self):
+        """
+            Проверяет, что номер не совпадает с номером другого пользователя после нормализации.
+        """
+        super().clean()
+        normalized = normalize_phone(self.phone)
+        if normalized and User.objects.filter(phone_normalized=normalized).exclude(pk=self.pk).exists():
+            # Запись, совпавшую с чужим номером до появления проверки, можно сохранять, пока номер не меняется
+            if self.pk is not None and User.objects.filter(pk=self.pk, phone=self.phone).exists():
+                return
+            raise ValidationError({'phone': 'Пользователь с таким номером уже существует'})
+
+
+def backfill_normalized_phones(batch_size=1000):
+    """
+        Заполняет номер в формате E.164 у пользователей, записанных без него, например загруженных
+        loaddata (он сохраняет объекты без вызова save()). Номер, уже принадлежащий другому пользователю,
+        остается пустым.
+
+        Returns:
+            int: Количество заполненных номеров.
+    """
+    filled = 0
+    last_pk = 0
+    while True:
+        batch = list(User.objects.filter(phone_normalized__isnull=True, pk__gt=last_pk)
+                     .order_by('pk').only('pk', 'phone')[:batch_size])
+        if not batch:
+            return filled
+        last_pk = batch[-1].pk
+        candidates = {user.pk: normalize_phone(user.phone) for user in batch}
+        taken = set(User.objects.filter(phone_normalized__in={phone for phone in candidates.values() if phone})
+                    .values_list('phone_normalized', flat=True))
+        updated = []
+        for user in batch:
+            normalized = candidates[user.pk]
+            if normalized and normalized not in taken:
+                taken.add(normalized)
+                user.phone_normalized = normalized
+                updated.append(user)
+        User.objects.bulk_update(updated, ['phone_normalized'])
+        filled += len(updated)
@@ -0,0 +1,14 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from users.middleware import invalidate_cached_user
+from users.models import User
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    """
+        Сбрасывает закэшированного пользователя запроса после изменения профиля, пароля или правки в админке.
+    """
+    invalidate_cached_user(instance.pk)
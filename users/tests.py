@@ -1,9 +1,18 @@
 import os
+from io import StringIO
+from unittest import mock
 import django
-from django.test import TestCase
+from django.contrib.auth import get_user as auth_get_user
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from users.forms import CustomPasswordResetForm
-from users.models import User
+from blog.ratelimit import client_ip, limiter
+from users.forms import CustomPasswordResetForm, CustomUserRegisterForm
+from users.middleware import user_cache_key
+from users.models import User, backfill_normalized_phones, normalize_phone
 
 os.environ['DJANGO_SETTINGS_MODULE'] = 'config.settings'
 
@@ -132,3 +141,184 @@ class CustomPasswordResetViewTest(SetupTestCase):
         url = reverse('users:password_reset_complete')
         response = self.client.get(url)
         self.assertEqual(response.status_code, 200)
+
+
+class PhoneNormalizationTest(SetupTestCase):
+
+    def create_user(self, phone):
+        user = User(phone=phone)
+        user.set_password('testpass123')
+        user.save()
+        return user
+
+    def reset_form_user(self, phone):
+        form = CustomPasswordResetForm(data={'phone': phone})
+        self.assertTrue(form.is_valid())
+        return form.user
+
+    def test_normalize_phone(self):
+        self.assertEqual(normalize_phone('8 (999) 123-45-67'), '+79991234567')
+        self.assertEqual(normalize_phone('+7 999 123 45 67'), '+79991234567')
+        self.assertEqual(normalize_phone('9991234567'), '+79991234567')
+        self.assertEqual(normalize_phone('0044 20 7946 0958'), '+442079460958')
+        self.assertEqual(normalize_phone('invalidphone'), '')
+
+    def test_normalized_phone_saved(self):
+        self.assertEqual(self.user.phone_normalized, '+123456789')
+
+    def test_login_with_differently_formatted_phone(self):
+        user = self.create_user('+7 999 123-45-67')
+        self.assertEqual(user.phone_normalized, '+79991234567')
+        self.assertTrue(self.client.login(username='89991234567', password='testpass123'))
+
+    def test_register_rejects_normalized_duplicate(self):
+        self.create_user('+79991234567')
+        form = CustomUserRegisterForm(data={'phone': '8 999 123 45 67', 'password1': 'Sup3rPass!23',
+                                            'password2': 'Sup3rPass!23'})
+        self.assertFalse(form.is_valid())
+        self.assertIn('phone', form.errors)
+
+    def test_password_reset_finds_formatted_phone(self):
+        self.create_user('+79991234567')
+        form = CustomPasswordResetForm(data={'phone': '8 (999) 123-45-67'})
+        self.assertTrue(form.is_valid())
+
+    def test_password_reset_for_unnormalized_duplicate(self):
+        user = self.create_user('+79991234567')
+        User.objects.filter(pk=user.pk).update(phone_normalized=None)
+        form = CustomPasswordResetForm(data={'phone': '+79991234567'})
+        self.assertTrue(form.is_valid())
+        self.assertEqual(form.user, user)
+
+    def test_saving_unnormalized_duplicate(self):
+        # Как после loaddata: номера совпадают после нормализации, номер E.164 не заполнен ни у кого
+        first = self.create_user('89623701887')
+        second = self.create_user('+7(962)370-18-87')
+        User.objects.update(phone_normalized=None)
+        first.save()
+        self.assertEqual(first.phone_normalized, '+79623701887')
+
+        second.set_password('newpass123')
+        second.save()
+        second.full_clean()
+        self.assertIsNone(second.phone_normalized)
+        self.assertTrue(self.client.login(username='+7(962)370-18-87', password='newpass123'))
+        self.assertEqual(int(self.client.session['_auth_user_id']), second.pk)
+        self.assertEqual(self.reset_form_user('+7(962)370-18-87'), second)
+        self.assertEqual(self.reset_form_user('8 962 370 18 87'), first)
+
+    def test_backfill_normalized_phones(self):
+        first = self.create_user('89623701887')
+        self.create_user('+7(962)370-18-87')
+        User.objects.update(phone_normalized=None)
+        self.assertEqual(backfill_normalized_phones(), 2)
+        first.refresh_from_db()
+        self.assertEqual(first.phone_normalized, '+79623701887')
+        self.assertTrue(User.objects.filter(phone='+7(962)370-18-87', phone_normalized__isnull=True).exists())
+        self.assertEqual(backfill_normalized_phones(), 0)
+
+    def test_duplicates_command(self):
+        self.create_user('+79991234567')
+        User.objects.filter(phone='+79991234567').update(phone_normalized=None)
+        User.objects.create(phone='89991234567')
+        out = StringIO()
+        call_command('phone_duplicates', stdout=out)
+        self.assertIn('+79991234567', out.getvalue())
+
+
+@override_settings(RATELIMITS={'users:login': [('ip', '100/m'), ('phone', '2/m')]}, RATELIMIT_REDIS_URL=None)
+class LoginRateLimitTest(SetupTestCase):
+
+    def setUp(self):
+        super().setUp()
+        limiter.local.reset()
+        self.url = reverse('users:login')
+
+    def tearDown(self):
+        limiter.local.reset()
+
+    def test_login_is_throttled_per_phone(self):
+        data = {'username': '123456789', 'password': 'wrong'}
+        self.assertEqual(self.client.post(self.url, data).status_code, 200)
+        self.assertEqual(self.client.post(self.url, data).status_code, 200)
+
+        with mock.patch('users.backends.PhoneBackend.authenticate') as authenticate:
+            response = self.client.post(self.url, {'username': '+123456789', 'password': 'wrong'})
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        authenticate.assert_not_called()
+
+        self.client.login(phone='123456789', password='testpass123')
+        stats = self.client.get(reverse('blog:ratelimit_stats')).json()
+        self.assertGreaterEqual(stats['rejected:users:login'], 1)
+
+    def test_other_phone_is_not_throttled(self):
+        for _ in range(3):
+            self.client.post(self.url, {'username': '123456789', 'password': 'wrong'})
+        response = self.client.post(self.url, {'username': '987654321', 'password': 'wrong'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_get_is_not_throttled(self):
+        for _ in range(5):
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    @override_settings(RATELIMIT_PROXY_COUNT=1)
+    def test_client_ip_ignores_spoofed_forwarded_for(self):
+        request = RequestFactory().post(self.url, HTTP_X_FORWARDED_FOR='1.1.1.1, 10.0.0.7', REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(client_ip(request), '10.0.0.7')
+        with override_settings(RATELIMIT_PROXY_COUNT=0):
+            self.assertEqual(client_ip(request), '10.0.0.2')
+
+
+@override_settings(AUTH_USER_CACHE_ENABLED=True)
+class CachedRequestUserTest(SetupTestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.client.login(phone='123456789', password='testpass123')
+        self.url = reverse('users:profile')
+
+    def user_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.url)
+        return [query['sql'] for query in queries if 'FROM "users_user"' in query['sql']]
+
+    def test_user_is_loaded_from_cache(self):
+        self.assertEqual(len(self.user_queries()), 1)
+        self.assertEqual(self.user_queries(), [])
+        self.assertNotIn('testpass123', str(cache.get(user_cache_key(self.user.pk))))
+
+    def test_cache_is_disabled_without_shared_cache(self):
+        with override_settings(AUTH_USER_CACHE_ENABLED=False):
+            self.assertEqual(len(self.user_queries()), 1)
+            self.assertEqual(len(self.user_queries()), 1)
+        self.assertIsNone(cache.get(user_cache_key(self.user.pk)))
+
+    def test_profile_update_invalidates_cached_user(self):
+        self.user_queries()
+        self.client.post(self.url, {'phone': '987654321'})
+        self.assertEqual(len(self.user_queries()), 1)
+        user = User.objects.get(pk=self.user.pk)
+        self.assertEqual(user.phone, '987654321')
+        self.assertTrue(user.check_password('testpass123'))
+
+    def test_user_changed_during_load_is_not_cached(self):
+        def load_then_deactivate(request):
+            user = auth_get_user(request)
+            User.objects.filter(pk=user.pk).update(is_active=False)
+            User.objects.get(pk=user.pk).save()
+            return user
+
+        with mock.patch('users.middleware.auth.get_user', load_then_deactivate):
+            self.client.get(self.url)
+        self.assertIsNone(cache.get(user_cache_key(self.user.pk)))
+        self.assertEqual(self.client.get(self.url).status_code, 302)
+
+    def test_password_change_ends_other_sessions(self):
+        self.user_queries()
+        user = User.objects.get(pk=self.user.pk)
+        user.set_password('newpass456')
+        user.save()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 302)